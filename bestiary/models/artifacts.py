@@ -333,6 +333,9 @@ class Artifact(ArtifactObjectBase, base.Stars):
     efficiency = models.FloatField(blank=True)
     max_efficiency = models.FloatField(blank=True)
 
+    # Fields set by _update_values() from the artifact's level and effects
+    DERIVED_FIELDS = ['main_stat_value', 'quality', 'efficiency', 'max_efficiency']
+
     class Meta:
         abstract = True
 
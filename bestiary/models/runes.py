@@ -356,6 +356,27 @@ class Rune(models.Model, RuneObjectBase):
         RuneObjectBase.TYPE_TOLERANCE: 2,
     }
 
+    # Fields set by update_fields() from the rune's type, stars, level and stats
+    DERIVED_FIELDS = [
+        'has_hp',
+        'has_atk',
+        'has_def',
+        'has_crit_rate',
+        'has_crit_dmg',
+        'has_speed',
+        'has_resist',
+        'has_accuracy',
+        'quality',
+        'substat_upgrades_remaining',
+        'efficiency',
+        'max_efficiency',
+        'has_grind',
+        'has_gem',
+        'main_stat_value',
+        'innate_stat_value',
+        'substat_values',
+    ]
+
     RUNE_SET_BONUSES = {
         RuneObjectBase.TYPE_ENERGY: {
             'count': 2,
@@ -0,0 +1,157 @@
+import threading
+import uuid
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from bestiary.models import Monster, Dungeon, SecretDungeon, Level, GameItem
+
+VERSION_CACHE_KEY = 'data-log-bestiary-version'
+
+
+class BestiaryCache:
+    # In-process index of the bestiary rows log parsers look up, so steady state log parsing doesn't query them.
+    # Each table is loaded in a single query the first time it is used. Edits to the bestiary clear this process'
+    # index directly and bump a version in the shared cache so other processes reload on their next refresh(). The
+    # version is bumped once the edit commits, and tables read in a thread with uncommitted bestiary edits are not
+    # kept, so no process holds on to rows that were rolled back or older than the commit.
+
+    def __init__(self):
+        self.version = None
+        self._tables = {}
+        # Whether this thread has bestiary edits that haven't been invalidated yet
+        self._edits = threading.local()
+
+    @property
+    def dirty(self):
+        return getattr(self._edits, 'dirty', False)
+
+    @dirty.setter
+    def dirty(self, value):
+        self._edits.dirty = value
+
+    def clear(self):
+        self._tables = {}
+
+    def edited(self):
+        self.dirty = True
+        self.clear()
+
+    def invalidate(self):
+        # Run on commit once per edited row, but only the first call after edits bumps the version
+        if not self.dirty:
+            return
+
+        self.dirty = False
+        self.clear()
+        cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+    def refresh(self):
+        # Called once per parsed log rather than per lookup to keep cache round trips down
+        if not connection.in_atomic_block:
+            # Any edits left over are from a transaction that was rolled back, otherwise invalidate() cleared them
+            self.dirty = False
+
+        version = cache.get(VERSION_CACHE_KEY)
+        if version is None:
+            cache.add(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+            version = cache.get(VERSION_CACHE_KEY)
+
+            if version is None:
+                # Cache backend doesn't store anything. Rely on this process' signals for invalidation.
+                return
+
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+    def _table(self, name):
+        if name in self._tables:
+            return self._tables[name]
+
+        table = getattr(self, f'_load_{name}')()
+        if not self.dirty:
+            self._tables[name] = table
+        return table
+
+    @staticmethod
+    def _get(model, table, key):
+        # Same errors as QuerySet.get() so callers can keep handling them
+        objs = table.get(key, [])
+        if not objs:
+            raise model.DoesNotExist(f'{model.__name__} matching {key} does not exist.')
+        if len(objs) > 1:
+            raise model.MultipleObjectsReturned(f'Found {len(objs)} {model.__name__} matching {key}.')
+        return objs[0]
+
+    def _load_game_items(self):
+        by_id = defaultdict(list)
+        by_name = defaultdict(list)
+        for item in GameItem.objects.all():
+            by_id[item.category, item.com2us_id].append(item)
+            by_name[item.category, item.name].append(item)
+
+        return by_id, by_name
+
+    def _load_monsters(self):
+        monsters = defaultdict(list)
+        for monster in Monster.objects.all():
+            monsters[monster.com2us_id].append(monster)
+
+        return monsters
+
+    def _load_levels(self):
+        # Indexed with and without the dungeon ID for lookups by category and floor alone
+        by_dungeon = defaultdict(list)
+        by_category = defaultdict(list)
+        for level in Level.objects.select_related('dungeon'):
+            by_dungeon[level.dungeon.category, level.dungeon.com2us_id, level.floor].append(level)
+            by_category[level.dungeon.category, level.floor].append(level)
+
+        return by_dungeon, by_category
+
+    def game_item(self, category, com2us_id=None, name=None):
+        by_id, by_name = self._table('game_items')
+        if name is not None:
+            return self._get(GameItem, by_name, (category, name))
+        return self._get(GameItem, by_id, (category, com2us_id))
+
+    def monster(self, com2us_id):
+        return self._get(Monster, self._table('monsters'), com2us_id)
+
+    def level(self, category, floor, dungeon_com2us_id=None, difficulty=None):
+        by_dungeon, by_category = self._table('levels')
+        if dungeon_com2us_id is None:
+            key = (category, floor)
+            levels = by_category.get(key, [])
+        else:
+            key = (category, dungeon_com2us_id, floor)
+            levels = by_dungeon.get(key, [])
+
+        if difficulty is not None:
+            key += (difficulty, )
+            levels = [level for level in levels if level.difficulty == difficulty]
+
+        return self._get(Level, {key: levels}, key)
+
+
+bestiary_cache = BestiaryCache()
+
+
+@receiver(post_save, sender=Monster)
+@receiver(post_save, sender=GameItem)
+@receiver(post_save, sender=Dungeon)
+@receiver(post_save, sender=SecretDungeon)
+@receiver(post_save, sender=Level)
+@receiver(post_delete, sender=Monster)
+@receiver(post_delete, sender=GameItem)
+@receiver(post_delete, sender=Dungeon)
+@receiver(post_delete, sender=SecretDungeon)
+@receiver(post_delete, sender=Level)
+def invalidate_bestiary_cache(sender, using, **kwargs):
+    # Lookups in the same transaction see the edit, but read it from the database until it commits
+    bestiary_cache.edited()
+    transaction.on_commit(bestiary_cache.invalidate, using=using)
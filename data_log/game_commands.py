@@ -1,15 +1,68 @@
 import json
 
+from django.core.mail import mail_admins
+from django.db import transaction
 from jsonschema import Draft4Validator
 
 from bestiary.parse.dungeons import dispatch_dungeon_wave_parse
 from . import models
 from . import schemas
+from .bestiary_cache import bestiary_cache
+
+
+# Draft 4 keywords handled by compile_validator(). Schemas using anything else fall back to Draft4Validator.
+COMPILED_SCHEMA_KEYWORDS = {'$schema', 'id', 'title', 'description', 'type', 'properties', 'required'}
+
+DRAFT4_TYPE_CHECKS = {
+    'array': lambda value: isinstance(value, list),
+    'boolean': lambda value: isinstance(value, bool),
+    'integer': lambda value: isinstance(value, int) and not isinstance(value, bool),
+    'null': lambda value: value is None,
+    'number': lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    'object': lambda value: isinstance(value, dict),
+    'string': lambda value: isinstance(value, str),
+}
+
+
+def compile_validator(schema):
+    # Build a validation function for a schema up front instead of interpreting it on every call.
+    # Accepts and rejects the same data as Draft4Validator(schema).is_valid
+    if set(schema) - COMPILED_SCHEMA_KEYWORDS:
+        return Draft4Validator(schema).is_valid
+
+    checks = []
+
+    if 'type' in schema:
+        types = schema['type'] if isinstance(schema['type'], list) else [schema['type']]
+        type_checks = [DRAFT4_TYPE_CHECKS[t] for t in types]
+        if len(type_checks) == 1:
+            checks.append(type_checks[0])
+        else:
+            checks.append(lambda value: any(check(value) for check in type_checks))
+
+    # required and properties only apply to objects
+    required = tuple(schema.get('required', ()))
+    if required:
+        checks.append(lambda value: not isinstance(value, dict) or all(key in value for key in required))
+
+    properties = [(key, compile_validator(subschema)) for key, subschema in schema.get('properties', {}).items()]
+    if properties:
+        checks.append(lambda value: not isinstance(value, dict) or all(
+            validate(value[key]) for key, validate in properties if key in value
+        ))
+
+    if not checks:
+        return lambda value: True
+    elif len(checks) == 1:
+        return checks[0]
+    else:
+        return lambda value: all(check(value) for check in checks)
 
 
 class GameApiCommand:
     def __init__(self, schema, parse_fns):
         self.validator = Draft4Validator(schema)
+        self.validate_fn = compile_validator(schema)
         self.accepted_commands = {
             key: schema['properties'][key]['properties'].keys() for key in schema['required']
         }
@@ -18,11 +71,15 @@ class GameApiCommand:
         self.parsers = parse_fns
 
     def parse(self, *args, **kwargs):
-        for fn in self.parsers:
-            fn(*args, **kwargs)
+        bestiary_cache.refresh()
+
+        # A log and all of its drops are written together or not at all
+        with transaction.atomic():
+            for fn in self.parsers:
+                fn(*args, **kwargs)
 
     def validate(self, log_data):
-        return self.validator.is_valid(log_data)
+        return self.validate_fn(log_data)
 
 
 # Arbitrator function for BuyShopItem which could be a rune or a magic box
@@ -105,6 +162,23 @@ accepted_api_params = {
 accepted_api_params['__version'] = 9
 
 
+def parse_log(summoner, log_data):
+    # Validate and parse log data for a supported command. Returns False if the data failed validation.
+    api_command = active_log_commands[log_data['request']['command']]
+
+    if not api_command.validate(log_data):
+        models.FullLog.parse(summoner, log_data)
+        return False
+
+    try:
+        api_command.parse(summoner, log_data)
+    except Exception as e:
+        mail_admins('Log server error', f'Request body:\n\n{log_data}')
+        raise e
+
+    return True
+
+
 # Utility functions
 def import_swex_full_log(path, search_commands):
     req = None
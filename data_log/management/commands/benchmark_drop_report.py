@@ -0,0 +1,111 @@
+from datetime import timedelta
+from time import perf_counter
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, Min, Max, Avg, F, Q, StdDev
+from django.db.models.functions import Extract
+from django.test.utils import CaptureQueriesContext
+from django_pivot.histogram import histogram
+
+from bestiary.models import Dungeon
+from data_log.reports.aggregate import CLEAR_TIME_BIN_WIDTH
+from data_log.reports.generate import DROP_TYPES, drop_report, get_drop_querysets, get_report_summary
+from data_log.util import round_timedelta
+
+
+def queryset_drop_report(qs, **kwargs):
+    # Reference implementation that builds the report with separate aggregate queries for every breakdown.
+    # drop_report() must produce the same result in a single pass.
+    report_data = {}
+
+    # Get querysets for each possible drop type
+    drops = get_drop_querysets(qs)
+    report_data['summary'] = get_report_summary(drops, qs.count(), **kwargs)
+
+    # Clear time statistics, if supported by the qs model
+    if hasattr(qs.model, 'clear_time'):
+        successful_runs = qs.filter(
+            Q(success=True) | Q(level__dungeon__category=Dungeon.CATEGORY_RIFT_OF_WORLDS_BEASTS)
+        )
+
+        if successful_runs.count():
+            clear_time_aggs = successful_runs.aggregate(
+                std_dev=StdDev(Extract(F('clear_time'), lookup_name='epoch')),
+                avg=Avg('clear_time'),
+                min=Min('clear_time'),
+                max=Max('clear_time'),
+            )
+
+            # Use +/- 3 std deviations of clear time avg as bounds for time range in case of extreme outliers skewing chart scale
+            min_time = round_timedelta(
+                max(clear_time_aggs['min'], clear_time_aggs['avg'] - timedelta(seconds=clear_time_aggs['std_dev'] * 3)),
+                CLEAR_TIME_BIN_WIDTH,
+                direction='down',
+            )
+            max_time = round_timedelta(
+                min(clear_time_aggs['max'], clear_time_aggs['avg'] + timedelta(seconds=clear_time_aggs['std_dev'] * 3)),
+                CLEAR_TIME_BIN_WIDTH,
+                direction='up',
+            )
+            bins = [min_time + CLEAR_TIME_BIN_WIDTH * x for x in range(0, int((max_time - min_time) / CLEAR_TIME_BIN_WIDTH))]
+
+            # Histogram generates on entire qs, not just successful runs.
+            report_data['clear_time'] = {
+                'min': str(clear_time_aggs['min']),
+                'max': str(clear_time_aggs['max']),
+                'avg': str(clear_time_aggs['avg']),
+                'chart': {
+                    'type': 'histogram',
+                    'width': 5,
+                    'data': histogram(qs, 'clear_time', bins, slice_on='success'),
+                }
+            }
+
+    # Individual drop details
+    for key, qs in drops.items():
+        if DROP_TYPES[key]:
+            report_data[key] = DROP_TYPES[key](qs, qs.count(), **kwargs)
+
+    return report_data
+
+
+class Command(BaseCommand):
+    help = 'Compare query count and wall time of drop_report() against the per-query reference implementation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default='DungeonLog', help='data_log model to report on')
+        parser.add_argument('--levels', type=int, default=5, help='Number of levels to benchmark, by most logs')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per implementation, best time is reported')
+
+    def _run(self, report_fn, qs, repeat):
+        best_time = None
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = perf_counter()
+                report_fn(qs)
+                elapsed = perf_counter() - start
+
+            best_time = elapsed if best_time is None else min(best_time, elapsed)
+
+        return len(queries), best_time
+
+    def handle(self, *args, **options):
+        model = apps.get_model('data_log', options['model'])
+        qs = model.objects.all()
+        if hasattr(model, 'success'):
+            qs = qs.filter(success=True)
+
+        levels = qs.values_list('level', flat=True).annotate(count=Count('pk')).order_by('-count')[:options['levels']]
+
+        self.stdout.write(f"{'level':>8} {'logs':>8} {'queries':>15} {'seconds':>19}")
+        for level_id in levels:
+            level_qs = qs.filter(level_id=level_id)
+            old_queries, old_time = self._run(queryset_drop_report, level_qs, options['repeat'])
+            new_queries, new_time = self._run(drop_report, level_qs, options['repeat'])
+
+            self.stdout.write(
+                f'{level_id:>8} {level_qs.count():>8} {old_queries:>7} -> {new_queries:<5} '
+                f'{old_time:>8.3f} -> {new_time:<8.3f}'
+            )
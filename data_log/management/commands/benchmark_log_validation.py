@@ -0,0 +1,64 @@
+import json
+import os
+from collections import defaultdict
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from data_log.game_commands import active_log_commands, accepted_api_params
+
+GAME_API_DATA_DIR = 'data_log/tests/game_api_data'
+
+
+class Command(BaseCommand):
+    help = 'Compare validations per second of the compiled log validators against Draft4Validator, per game command'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=GAME_API_DATA_DIR, help='Directory of recorded game API data')
+        parser.add_argument('--repeat', type=int, default=2000, help='Validations per recorded log')
+
+    def _load_logs(self, path):
+        logs = defaultdict(list)
+        for dirpath, dirnames, filenames in os.walk(path):
+            for filename in sorted(filenames):
+                with open(os.path.join(dirpath, filename)) as f:
+                    log_data = json.load(f)['data']
+
+                command = log_data['request']['command']
+                if command not in active_log_commands:
+                    continue
+
+                # Trim down to the keys log clients upload
+                logs[command].append({
+                    key: {
+                        param: log_data[key].get(param) for param in accepted_api_params[command][key]
+                    } for key in ('request', 'response')
+                })
+
+        return logs
+
+    def _rate(self, validate, logs, repeat):
+        start = perf_counter()
+        for _ in range(repeat):
+            for log_data in logs:
+                validate(log_data)
+
+        return len(logs) * repeat / (perf_counter() - start)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'command':<40} {'logs':>5} {'draft4/s':>12} {'compiled/s':>12} {'speedup':>8}")
+        for command, logs in sorted(self._load_logs(options['path']).items()):
+            api_command = active_log_commands[command]
+            mismatched = [
+                log_data for log_data in logs
+                if api_command.validator.is_valid(log_data) != api_command.validate_fn(log_data)
+            ]
+            if mismatched:
+                self.stderr.write(f'{command}: {len(mismatched)} logs validated differently')
+
+            draft4_rate = self._rate(api_command.validator.is_valid, logs, options['repeat'])
+            compiled_rate = self._rate(api_command.validate_fn, logs, options['repeat'])
+            self.stdout.write(
+                f'{command:<40} {len(logs):>5} {draft4_rate:>12.0f} {compiled_rate:>12.0f} '
+                f'{compiled_rate / draft4_rate:>7.1f}x'
+            )
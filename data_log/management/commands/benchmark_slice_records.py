@@ -0,0 +1,118 @@
+import random
+from datetime import timedelta
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from bestiary.models import Level
+from data_log.models import DungeonLog
+from data_log.reports.generate import LEVEL_REPORT_MINIMUM_COUNT, LEVEL_REPORT_TIMESPAN
+from data_log.util import slice_records
+
+
+def queryset_slice_records(qs, *args, **kwargs):
+    # Reference implementation of slice_records() with separate count and slicing queries
+    report_timespan = kwargs.get('report_timespan')
+    minimum_count = kwargs.get('minimum_count')
+    maximum_count = kwargs.get('maximum_count')
+
+    if minimum_count and maximum_count:
+        raise ValueError('Cannot use minimum_count and maximum_count at the same time.')
+
+    if qs.count() == 0:
+        return qs
+
+    if report_timespan:
+        result = qs.filter(timestamp__gte=timezone.now() - report_timespan)
+    else:
+        result = qs
+
+    if minimum_count or maximum_count:
+        num_records = result.count()
+
+        if num_records > 0:
+            if minimum_count and num_records < minimum_count:
+                temp_slice = qs[:minimum_count]
+                earliest_record = temp_slice[temp_slice.count() - 1]
+                result = qs.filter(timestamp__gte=earliest_record.timestamp)
+
+            if maximum_count and num_records > maximum_count:
+                temp_slice = qs[:maximum_count]
+                earliest_record = temp_slice[temp_slice.count() - 1]
+                result = qs.filter(timestamp__gte=earliest_record.timestamp)
+
+    return result
+
+
+class Command(BaseCommand):
+    help = 'Compare slice_records() against the count and slice reference implementation on a synthetic DungeonLog ' \
+           'table. All synthetic rows are rolled back afterwards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Synthetic logs to insert')
+        parser.add_argument('--levels', type=int, default=20, help='Levels to spread the logs over')
+        parser.add_argument('--days', type=int, default=120, help='Days to spread the log timestamps over')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per implementation, best time is reported')
+
+    def _insert_logs(self, levels, rows, days):
+        now = timezone.now()
+        batch = []
+        for idx in range(rows):
+            # Skew towards a few popular levels so some fill the timespan and others need extending
+            level = levels[min(int(random.expovariate(0.5)), len(levels) - 1)]
+            batch.append(DungeonLog(
+                wizard_id=random.randint(1, 50000),
+                level=level,
+                success=random.random() < 0.9,
+                timestamp=now - timedelta(seconds=random.randint(0, days * 24 * 60 * 60)),
+            ))
+
+            if len(batch) == 10000:
+                DungeonLog.objects.bulk_create(batch)
+                batch = []
+
+        DungeonLog.objects.bulk_create(batch)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {DungeonLog._meta.db_table}')
+
+    def _run(self, slice_fn, qs, repeat):
+        best_time = None
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = perf_counter()
+                count = slice_fn(qs, minimum_count=LEVEL_REPORT_MINIMUM_COUNT, report_timespan=LEVEL_REPORT_TIMESPAN).count()
+                elapsed = perf_counter() - start
+
+            best_time = elapsed if best_time is None else min(best_time, elapsed)
+
+        return count, len(queries), best_time
+
+    def handle(self, *args, **options):
+        levels = list(Level.objects.all()[:options['levels']])
+        if not levels:
+            raise CommandError('Bestiary levels are required to generate synthetic logs')
+
+        with transaction.atomic():
+            start = perf_counter()
+            self._insert_logs(levels, options['rows'], options['days'])
+            self.stdout.write(f"Inserted {options['rows']} logs in {perf_counter() - start:.1f}s")
+
+            self.stdout.write(f"{'level':>8} {'logs':>8} {'sliced':>8} {'queries':>10} {'seconds':>19}")
+            for level in levels:
+                qs = DungeonLog.objects.filter(level=level, success=True)
+                old_count, old_queries, old_time = self._run(queryset_slice_records, qs, options['repeat'])
+                new_count, new_queries, new_time = self._run(slice_records, qs, options['repeat'])
+
+                if old_count != new_count:
+                    self.stderr.write(f'Level {level.pk}: sliced {new_count} logs, expected {old_count}')
+
+                self.stdout.write(
+                    f'{level.pk:>8} {qs.count():>8} {new_count:>8} {old_queries:>4} -> {new_queries:<3} '
+                    f'{old_time:>8.3f} -> {new_time:<8.3f}'
+                )
+
+            transaction.set_rollback(True)
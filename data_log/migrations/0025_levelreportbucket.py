@@ -0,0 +1,33 @@
+# Generated by Django 2.2.15 on 2026-10-18 03:19
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bestiary', '0027_auto_20200901_0846'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('data_log', '0024_auto_20200808_1642'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LevelReportBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(help_text='Start of the time bucket')),
+                ('start_timestamp', models.DateTimeField(help_text='Timestamp of the earliest log in this bucket')),
+                ('end_timestamp', models.DateTimeField(help_text='Timestamp of the latest log in this bucket')),
+                ('log_count', models.IntegerField()),
+                ('aggregates', django.contrib.postgres.fields.jsonb.JSONField()),
+                ('content_type', models.ForeignKey(help_text='The logging model aggregated', on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType')),
+                ('level', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bestiary.Level')),
+            ],
+            options={
+                'unique_together': {('content_type', 'level', 'bucket')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.15 on 2026-10-18 03:38
+
+from django.conf import settings
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('data_log', '0025_levelreportbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedLog',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('received_on', models.DateTimeField(auto_now_add=True)),
+                ('command', models.CharField(max_length=150)),
+                ('wizard_id', models.BigIntegerField()),
+                ('data', django.contrib.postgres.fields.jsonb.JSONField()),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('pk',),
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.15 on 2026-10-18 03:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_log', '0026_queuedlog'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dungeonlog',
+            index=models.Index(fields=['level', 'success', 'timestamp'], name='dungeonlog_level_success_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='riftdungeonlog',
+            index=models.Index(fields=['level', 'grade', 'timestamp'], name='riftdungeonlog_level_grade_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='riftraidlog',
+            index=models.Index(fields=['level', 'success', 'timestamp'], name='riftraidlog_level_success_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='worldbosslog',
+            index=models.Index(fields=['level', 'grade', 'timestamp'], name='worldbosslog_level_grade_ts'),
+        ),
+    ]
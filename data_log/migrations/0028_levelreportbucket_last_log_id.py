@@ -0,0 +1,25 @@
+# Generated by Django 2.2.15 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+def delete_buckets(apps, schema_editor):
+    # Existing buckets don't know which logs they aggregated. They are rebuilt from the report window on the next
+    # incremental report.
+    apps.get_model('data_log', 'LevelReportBucket').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_log', '0027_log_report_window_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='levelreportbucket',
+            name='last_log_id',
+            field=models.BigIntegerField(default=0, help_text='Primary key of the newest log aggregated for this level, the same for all of its buckets'),
+        ),
+        migrations.RunPython(delete_buckets, migrations.RunPython.noop),
+    ]
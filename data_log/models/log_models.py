@@ -1,12 +1,38 @@
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 import pytz
+from django.contrib.auth.models import User
 from django.contrib.postgres.fields import JSONField
 from django.core.mail import mail_admins
 from django.db import models
 
 from bestiary.models import Monster, Dungeon, Level, GameItem, Rune, RuneCraft, Artifact, ArtifactCraft
 from herders.models import Summoner
+from data_log.bestiary_cache import bestiary_cache
+
+
+def bulk_save(objs):
+    # Write new rows with one INSERT per model instead of one per row. bulk_create() does not call save(), so
+    # derived fields that save() would normally fill in are computed here first.
+    new_objs = defaultdict(list)
+    for obj in objs:
+        if obj is None:
+            continue
+
+        if obj.pk:
+            # Existing row being updated
+            obj.save()
+            continue
+
+        if isinstance(obj, Rune):
+            obj.update_fields()
+        elif isinstance(obj, Artifact):
+            obj._update_values()
+        new_objs[obj.__class__].append(obj)
+
+    for model, model_objs in new_objs.items():
+        model.objects.bulk_create(model_objs)
 
 
 # Abstract models for encapsulating common data like drops and log entry metadata
@@ -35,6 +61,12 @@ class LogEntry(models.Model):
         self.server = LogEntry.TIMEZONE_SERVER_MAP.get(log_data['response']['tzone'])
         self.timestamp = datetime.fromtimestamp(log_data['response']['tvalue'], tz=pytz.timezone('GMT'))
 
+    def save_drops(self, drops):
+        drops = [drop for drop in drops if drop is not None]
+        for drop in drops:
+            drop.log = self
+        bulk_save(drops)
+
 
 class ItemDropManager(models.Manager):
     def get_queryset(self):
@@ -81,13 +113,13 @@ class ItemDrop(models.Model):
         if key and val is not None:
             # Dungeon drop parsing
             if key == 'mana':
-                item = GameItem.objects.get(category=GameItem.CATEGORY_CURRENCY, name='Mana')
+                item = bestiary_cache.game_item(GameItem.CATEGORY_CURRENCY, name='Mana')
                 quantity = val
             elif key == 'energy':
-                item = GameItem.objects.get(category=GameItem.CATEGORY_CURRENCY, name='Energy')
+                item = bestiary_cache.game_item(GameItem.CATEGORY_CURRENCY, name='Energy')
                 quantity = val
             elif key == 'crystal':
-                item = GameItem.objects.get(category=GameItem.CATEGORY_CURRENCY, name='Crystal')
+                item = bestiary_cache.game_item(GameItem.CATEGORY_CURRENCY, name='Crystal')
                 quantity = val
             else:
                 raise ValueError(f"Can't parse item type {key} with {cls.__name__}")
@@ -101,7 +133,7 @@ class ItemDrop(models.Model):
             if master_type not in cls.PARSE_ITEM_TYPES:
                 raise ValueError(f"Can't parse item type {master_type} with {cls.__name__}")
 
-            item = GameItem.objects.get(category=master_type, com2us_id=master_id)
+            item = bestiary_cache.game_item(master_type, master_id)
         else:
             raise ValueError('Must specify either (key, val) kwargs or (item_master_type, item_master_id, quantity) kwargs')
 
@@ -144,7 +176,7 @@ class MonsterDrop(models.Model):
         grade = monster_info.get('class') or monster_info.get('unit_class')
         level = monster_info.get('unit_level') or 1
         return cls(
-                monster=Monster.objects.get(com2us_id=com2us_id),
+                monster=bestiary_cache.monster(com2us_id),
                 grade=grade,
                 level=level,
             )
@@ -297,6 +329,21 @@ class ArtifactDrop(Artifact):
         )
 
 
+# Raw log uploads accepted by the log endpoint in async ingestion mode, waiting for data_log.tasks.process_log_queue
+class QueuedLog(models.Model):
+    received_on = models.DateTimeField(auto_now_add=True)
+    command = models.CharField(max_length=150)
+    wizard_id = models.BigIntegerField()
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
+    data = JSONField()
+
+    class Meta:
+        ordering = ('pk', )
+
+    def __str__(self):
+        return f'{self.received_on} - {self.command}'
+
+
 # Data gathering model to store game API data for development and debugging purposes
 class FullLog(LogEntry):
     command = models.TextField(max_length=150, db_index=True)
@@ -339,9 +386,10 @@ class ShopRefreshLog(LogEntry):
         log.slots_available = log_data['response']['market_info']['open_slots']
         log.save()
 
-        log.parse_items_for_sale(log_data['response']['market_list'])
+        log.save_drops(log.parse_items_for_sale(log_data['response']['market_list']))
 
     def parse_items_for_sale(self, sale_items):
+        item_logs = []
         for item in sale_items:
             master_type = item['item_master_type']
 
@@ -354,9 +402,9 @@ class ShopRefreshLog(LogEntry):
             else:
                 raise ValueError(f"Don't know how to parse {master_type} in {self.__class__.__name__}")
 
-            if item_log:
-                item_log.log = self
-                item_log.save()
+            item_logs.append(item_log)
+
+        return item_logs
 
 
 class ShopRefreshDrop(models.Model):
@@ -428,8 +476,7 @@ class WishLog(LogEntry):
         else:
             raise ValueError(f"Don't know how to parse item type `{master_type}` with {cls.__class__.__name__}")
 
-        reward.log = log
-        reward.save()
+        log.save_drops([reward])
 
 
 class WishLogItemDrop(ItemDrop):
@@ -473,12 +520,15 @@ class CraftRuneLog(LogEntry, RuneDrop):
             # Missing rune data - discard the log
             return
 
+        log_entries = []
         for rune_data in runes_data:
             log_entry = cls.parse(**rune_data)
             log_entry.summoner = summoner
             log_entry.parse_common_log_data(log_data)
             log_entry.craft_level = CraftRuneLog.get_craft_level(log_data['request']['item_id'])
-            log_entry.save()
+            log_entries.append(log_entry)
+
+        bulk_save(log_entries)
 
 
 # Magic Box Crafting
@@ -518,7 +568,7 @@ class MagicBoxCraft(LogEntry):
         log_entry.parse_common_log_data(log_data)
         log_entry.box_type = cls.get_box_type(log_data['request']['item_id'])
         log_entry.save()
-        log_entry.parse_items(log_data['response'].get('view_item_list', []))
+        drops = log_entry.parse_items(log_data['response'].get('view_item_list', []))
 
         try:
             crate = log_data['response']['reward']['crate']
@@ -526,10 +576,13 @@ class MagicBoxCraft(LogEntry):
             # Crate not in data, or reward key missing. Don't try to parse anything in it.
             pass
         else:
-            log_entry.parse_crate(crate)
+            drops += log_entry.parse_crate(crate)
+
+        log_entry.save_drops(drops)
 
     def parse_items(self, item_list):
         # Parse items and ignore runes or grindstones/gems
+        item_logs = []
         for item in item_list:
             master_type = item['item_master_type']
 
@@ -541,24 +594,24 @@ class MagicBoxCraft(LogEntry):
             else:
                 raise ValueError(f"Can't parse item type {master_type} with {self.__class__.__name__}")
 
-            log_entry.log = self
-            log_entry.save()
+            item_logs.append(log_entry)
+
+        return item_logs
 
     def parse_crate(self, crate):
+        item_logs = []
         for key, items in crate.items():
             if key == 'runes':
                 for rune_data in items:
-                    log_entry = MagicBoxCraftRuneDrop.parse(**rune_data)
-                    log_entry.log = self
-                    log_entry.save()
+                    item_logs.append(MagicBoxCraftRuneDrop.parse(**rune_data))
             elif key == 'changestones':
                 for runecraft_data in items:
-                    log_entry = MagicBoxCraftRuneCraftDrop.parse(**runecraft_data)
-                    log_entry.log = self
-                    log_entry.save()
+                    item_logs.append(MagicBoxCraftRuneCraftDrop.parse(**runecraft_data))
             else:
                 raise ValueError(f"Don't know how to parse crate key `{key}` with {self.__class__.__name__}")
 
+        return item_logs
+
 
 class MagicBoxCraftItemDrop(ItemDrop):
     log = models.ForeignKey(MagicBoxCraft, on_delete=models.CASCADE, related_name=ItemDrop.RELATED_NAME)
@@ -591,12 +644,13 @@ class SummonLog(LogEntry, MonsterDrop):
             return
 
         # Create one entry per unit summoned
+        log_entries = []
         for unit_info in log_data['response']['unit_list']:
             log_entry = cls.parse(**unit_info)
             log_entry.parse_common_log_data(log_data)
             log_entry.summoner = summoner
             log_entry.get_summon_method(log_data)
-            log_entry.save()
+            log_entries.append(log_entry)
         else:
             if log_data['response'].get('summon_choices'):
                 # Blessing popped, parse the common data but leave monster empty
@@ -605,7 +659,9 @@ class SummonLog(LogEntry, MonsterDrop):
                 log_entry.summoner = summoner
                 log_entry.get_summon_method(log_data)
                 log_entry.blessing_id = log_data['response']['summon_choices'][0]['rid']
-                log_entry.save()
+                log_entries.append(log_entry)
+
+        bulk_save(log_entries)
 
     @classmethod
     def parse_blessing_choice(cls, summoner, log_data):
@@ -630,10 +686,7 @@ class SummonLog(LogEntry, MonsterDrop):
             item_info = log_data['response']['item_list'][0]
 
             try:
-                self.item = GameItem.objects.get(
-                    category=item_info['item_master_type'],
-                    com2us_id=item_info['item_master_id'],
-                )
+                self.item = bestiary_cache.game_item(item_info['item_master_type'], item_info['item_master_id'])
             except GameItem.DoesNotExist:
                 self.item = GameItem.objects.create(
                     category=item_info['item_master_type'],
@@ -645,16 +698,10 @@ class SummonLog(LogEntry, MonsterDrop):
             mode = log_data['request']['mode']
             if mode == 3:
                 # Crystal summon
-                self.item = GameItem.objects.get(
-                    category=GameItem.CATEGORY_CURRENCY,
-                    com2us_id=1,
-                )
+                self.item = bestiary_cache.game_item(GameItem.CATEGORY_CURRENCY, 1)
             elif mode == 5:
                 # Social summon
-                self.item = GameItem.objects.get(
-                    category=GameItem.CATEGORY_CURRENCY,
-                    com2us_id=2,
-                )
+                self.item = bestiary_cache.game_item(GameItem.CATEGORY_CURRENCY, 2)
 
 
 # Dungeons
@@ -679,17 +726,23 @@ class DungeonLog(LogEntry):
     success = models.NullBooleanField(help_text='Null indicates that run was not completed')
     clear_time = models.DurationField(blank=True, null=True)
 
+    class Meta(LogEntry.Meta):
+        indexes = [
+            # Report windows by level, see data_log.util.slice_records()
+            models.Index(fields=['level', 'success', 'timestamp'], name='dungeonlog_level_success_ts'),
+        ]
+
     @classmethod
     def parse_scenario_start(cls, summoner, log_data):
         log_entry = cls(summoner=summoner)
         log_entry.parse_common_log_data(log_data)
         log_entry.battle_key = log_data['response'].get('battle_key')
 
-        log_entry.level = Level.objects.get(
-            dungeon__category=Dungeon.CATEGORY_SCENARIO,
-            dungeon__com2us_id=log_data['request']['region_id'],
+        log_entry.level = bestiary_cache.level(
+            Dungeon.CATEGORY_SCENARIO,
+            log_data['request']['stage_no'],
+            dungeon_com2us_id=log_data['request']['region_id'],
             difficulty=log_data['request']['difficulty'],
-            floor=log_data['request']['stage_no'],
         )
 
         # Remainder of information comes from BattleScenarioResult
@@ -710,7 +763,7 @@ class DungeonLog(LogEntry):
         log_entry.success = log_data['request']['win_lose'] == 1
         log_entry.clear_time = timedelta(milliseconds=log_data['request']['clear_time'])
         log_entry.save()
-        log_entry.parse_rewards(log_data['response']['reward'])
+        log_entry.save_drops(log_entry.parse_rewards(log_data['response']['reward']))
 
     @classmethod
     def parse_dungeon_result_v2(cls, summoner, log_data):
@@ -724,11 +777,7 @@ class DungeonLog(LogEntry):
         log_entry = cls(summoner=summoner)
         log_entry.parse_common_log_data(log_data)
         try:
-            log_entry.level = Level.objects.get(
-                dungeon__category=Dungeon.CATEGORY_CAIROS,
-                dungeon__com2us_id=dungeon_id,
-                floor=floor,
-            )
+            log_entry.level = bestiary_cache.level(Dungeon.CATEGORY_CAIROS, floor, dungeon_com2us_id=dungeon_id)
         except Level.DoesNotExist:
             # Create a placeholder level for later updating
             try:
@@ -752,8 +801,10 @@ class DungeonLog(LogEntry):
         log_entry.success = log_data['request']['win_lose'] == 1
         log_entry.clear_time = timedelta(milliseconds=log_data['request']['clear_time'])
         log_entry.save()
-        log_entry.parse_rewards(log_data['response']['reward'])
-        log_entry.parse_changed_item_list(log_data['response']['changed_item_list'])
+        log_entry.save_drops(
+            log_entry.parse_rewards(log_data['response']['reward']) +
+            log_entry.parse_changed_item_list(log_data['response']['changed_item_list'])
+        )
 
     @classmethod
     def parse_dimension_hole_result_v2(cls, summoner, log_data):
@@ -767,11 +818,7 @@ class DungeonLog(LogEntry):
         log_entry = cls(summoner=summoner)
         log_entry.parse_common_log_data(log_data)
         try:
-            log_entry.level = Level.objects.get(
-                dungeon__category=Dungeon.CATEGORY_DIMENSIONAL_HOLE,
-                dungeon__com2us_id=dungeon_id,
-                floor=floor,
-            )
+            log_entry.level = bestiary_cache.level(Dungeon.CATEGORY_DIMENSIONAL_HOLE, floor, dungeon_com2us_id=dungeon_id)
         except Level.DoesNotExist:
             # Create a placeholder level for later updating
             try:
@@ -795,20 +842,22 @@ class DungeonLog(LogEntry):
         log_entry.success = log_data['request']['win_lose'] == 1
         log_entry.clear_time = timedelta(milliseconds=log_data['request']['clear_time'])
         log_entry.save()
-        log_entry.parse_rewards(log_data['response']['reward'])
-        log_entry.parse_changed_item_list(log_data['response']['changed_item_list'])
+        log_entry.save_drops(
+            log_entry.parse_rewards(log_data['response']['reward']) +
+            log_entry.parse_changed_item_list(log_data['response']['changed_item_list'])
+        )
 
     def parse_rewards(self, rewards):
         if not rewards:
             # If there are no rewards, it's an empty list. Exit early since later code assumes rewards is a dict
-            return
+            return []
 
         # Parse each reward
         reward_objs = []
         for key, val in rewards.items():
             if key == 'crate':
                 # Recurse with crate contents
-                self.parse_rewards(val)
+                reward_objs += self.parse_rewards(val)
             elif key in DungeonItemDrop.PARSE_KEYS:
                 reward_objs.append(DungeonItemDrop.parse(key=key, val=val))
             elif isinstance(val, dict):
@@ -840,16 +889,12 @@ class DungeonLog(LogEntry):
             else:
                 ValueError(f"don't know how to parse {key} reward in {self.__class__.__name__}")
 
-        # Save parsed rewards
-        for reward in reward_objs:
-            if reward is not None:
-                reward.log = self
-                reward.save()
+        return reward_objs
 
     def parse_changed_item_list(self, changed_item_list):
         if not changed_item_list:
             # If there are changed items, it's an empty list. Exit early since later code assumes a dict
-            return
+            return []
 
         # Parse each reward
         changed_items_object = []
@@ -894,11 +939,7 @@ class DungeonLog(LogEntry):
             else:
                 raise ValueError(f"don't know how to parse changed item type {item_type} in {self.__class__.__name__}")
 
-        # Save parsed rewards
-        for reward in changed_items_object:
-            if reward is not None:
-                reward.log = self
-                reward.save()
+        return changed_items_object
 
 
 class DungeonItemDrop(ItemDrop):
@@ -943,11 +984,7 @@ class DungeonSecretDungeonDrop(models.Model):
     def parse(cls, instance_info):
         try:
             return cls(
-                level=Level.objects.get(
-                    dungeon__category=Dungeon.CATEGORY_SECRET,
-                    dungeon__com2us_id=instance_info['instance_id'],
-                    floor=1,
-                )
+                level=bestiary_cache.level(Dungeon.CATEGORY_SECRET, 1, dungeon_com2us_id=instance_info['instance_id'])
             )
         except Level.DoesNotExist:
             # Unknown or event dungeon. Do not log.
@@ -1004,6 +1041,11 @@ class RiftDungeonLog(LogEntry):
     clear_time = models.DurationField()
     success = models.BooleanField()
 
+    class Meta(LogEntry.Meta):
+        indexes = [
+            models.Index(fields=['level', 'grade', 'timestamp'], name='riftdungeonlog_level_grade_ts'),
+        ]
+
     def __str__(self):
         return f'RiftDungeonLog {self.level} {self.grade}'
 
@@ -1012,19 +1054,20 @@ class RiftDungeonLog(LogEntry):
         log_entry = cls(summoner=summoner)
         log_entry.parse_common_log_data(log_data)
 
-        log_entry.level = Level.objects.get(
-            dungeon__category=Dungeon.CATEGORY_RIFT_OF_WORLDS_BEASTS,
-            dungeon__com2us_id=log_data['request']['dungeon_id'],
-            floor=1,
+        log_entry.level = bestiary_cache.level(
+            Dungeon.CATEGORY_RIFT_OF_WORLDS_BEASTS,
+            1,
+            dungeon_com2us_id=log_data['request']['dungeon_id'],
         )
         log_entry.grade = log_data['response']['rift_dungeon_box_id']
         log_entry.total_damage = log_data['response']['total_damage']
         log_entry.clear_time = timedelta(milliseconds=log_data['request']['clear_time'])
         log_entry.success = log_data['request']['battle_result'] == 1
         log_entry.save()
-        log_entry.parse_rewards(log_data['response'].get('item_list') or [])
+        log_entry.save_drops(log_entry.parse_rewards(log_data['response'].get('item_list') or []))
 
     def parse_rewards(self, items):
+        item_logs = []
         for item in items:
             master_type = item['type']
             if master_type in RiftDungeonItemDrop.PARSE_ITEM_TYPES:
@@ -1038,8 +1081,9 @@ class RiftDungeonLog(LogEntry):
             else:
                 raise ValueError(f"don't know how to parse {master_type} in {self.__class__.__name__}")
 
-            log_entry.log = self
-            log_entry.save()
+            item_logs.append(log_entry)
+
+        return item_logs
 
 
 class RiftDungeonItemDrop(ItemDrop):
@@ -1079,15 +1123,20 @@ class RiftRaidLog(LogEntry):
     contribution_amount = models.IntegerField(blank=True, null=True)
     clear_time = models.DurationField(blank=True, null=True)
 
+    class Meta(LogEntry.Meta):
+        indexes = [
+            models.Index(fields=['level', 'success', 'timestamp'], name='riftraidlog_level_success_ts'),
+        ]
+
     @classmethod
     def parse_rift_raid_start(cls, summoner, log_data):
         log_entry = cls(summoner=summoner)
         log_entry.parse_common_log_data(log_data)
         log_entry.battle_key = log_data['request']['battle_key']
-        log_entry.level = Level.objects.get(
-            dungeon__category=Dungeon.CATEGORY_RIFT_OF_WORLDS_RAID,
-            dungeon__com2us_id=log_data['response']['battle_info']['raid_id'],
-            floor=log_data['response']['battle_info']['stage_id'],
+        log_entry.level = bestiary_cache.level(
+            Dungeon.CATEGORY_RIFT_OF_WORLDS_RAID,
+            log_data['response']['battle_info']['stage_id'],
+            dungeon_com2us_id=log_data['response']['battle_info']['raid_id'],
         )
         log_entry.save()
 
@@ -1117,9 +1166,10 @@ class RiftRaidLog(LogEntry):
         log_entry.contribution_amount = user_status['damage']
         log_entry.clear_time = timedelta(milliseconds=log_data['request']['clear_time'])
         log_entry.save()
-        log_entry.parse_rewards(battle_key, log_data['response']['battle_reward_list'])
+        log_entry.save_drops(log_entry.parse_rewards(battle_key, log_data['response']['battle_reward_list']))
 
     def parse_rewards(self, battle_key, rewards_list):
+        item_logs = []
         for rewards in rewards_list:
             reward_wizard_id = rewards['wizard_id']
             if self.wizard_id == reward_wizard_id:
@@ -1135,8 +1185,9 @@ class RiftRaidLog(LogEntry):
                     else:
                         raise ValueError(f"don't know how to parse {master_type} in {self.__class__.__name__}")
 
-                    log_entry.log = self
-                    log_entry.save()
+                    item_logs.append(log_entry)
+
+        return item_logs
 
 
 class RiftRaidDrop(models.Model):
@@ -1220,11 +1271,16 @@ class WorldBossLog(LogEntry):
     avg_monster_level = models.FloatField()
     monster_count = models.IntegerField()
 
+    class Meta(LogEntry.Meta):
+        indexes = [
+            models.Index(fields=['level', 'grade', 'timestamp'], name='worldbosslog_level_grade_ts'),
+        ]
+
     @classmethod
     def parse_world_boss_start(cls, summoner, log_data):
         log_entry = cls(summoner=summoner)
         log_entry.parse_common_log_data(log_data)
-        log_entry.level = Level.objects.get(dungeon__category=Dungeon.CATEGORY_WORLD_BOSS, floor=1)
+        log_entry.level = bestiary_cache.level(Dungeon.CATEGORY_WORLD_BOSS, 1)
         log_entry.battle_key = log_data['response']['battle_key']
         log_entry.damage = log_data['response']['worldboss_battle_result']['total_damage']
         log_entry.battle_points = log_data['response']['worldboss_battle_result']['total_battle_point']
@@ -1245,18 +1301,19 @@ class WorldBossLog(LogEntry):
             return
 
         log_entry.grade = log_data['response']['reward_info']['box_id']
-        log_entry.parse_rewards(log_data['response']['reward_info']['reward_list'])
+        drops = log_entry.parse_rewards(log_data['response']['reward_info']['reward_list'])
         log_entry.save()
 
         # Parse runes only out of the reward crate
         runes_reward = log_data['response']['reward']['crate'].get('runes', [])
 
         for rune_data in runes_reward:
-            rune_drop = WorldBossLogRuneDrop.parse(**rune_data)
-            rune_drop.log = log_entry
-            rune_drop.save()
+            drops.append(WorldBossLogRuneDrop.parse(**rune_data))
+
+        log_entry.save_drops(drops)
 
     def parse_rewards(self, rewards):
+        item_logs = []
         for reward in rewards:
             master_type = reward['item_master_type']
             if master_type in WorldBossLogItemDrop.PARSE_ITEM_TYPES:
@@ -1269,9 +1326,9 @@ class WorldBossLog(LogEntry):
             else:
                 raise ValueError(f"don't know how to parse {master_type} in {self.__class__.__name__}")
 
-            if log_entry:
-                log_entry.log = self
-                log_entry.save()
+            item_logs.append(log_entry)
+
+        return item_logs
 
 
 class WorldBossLogItemDrop(ItemDrop):
@@ -36,3 +36,27 @@ class LevelReport(Report):
 
 class SummonReport(Report):
     item = models.ForeignKey(GameItem, on_delete=models.PROTECT)
+
+
+class LevelReportBucket(models.Model):
+    """
+    Running drop aggregates for one time bucket of logs for a level. Used to generate LevelReports incrementally
+    without re-aggregating the entire report window.
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, help_text="The logging model aggregated")
+    level = models.ForeignKey(Level, on_delete=models.CASCADE)
+    bucket = models.DateTimeField(help_text='Start of the time bucket')
+    start_timestamp = models.DateTimeField(help_text='Timestamp of the earliest log in this bucket')
+    end_timestamp = models.DateTimeField(help_text='Timestamp of the latest log in this bucket')
+    log_count = models.IntegerField()
+    aggregates = JSONField()
+    last_log_id = models.BigIntegerField(
+        default=0,
+        help_text='Primary key of the newest log aggregated for this level, the same for all of its buckets'
+    )
+
+    class Meta:
+        unique_together = ('content_type', 'level', 'bucket')
+
+    def __str__(self):
+        return f"{self.level} {self.bucket}"
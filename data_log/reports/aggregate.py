@@ -0,0 +1,795 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+from math import sqrt
+
+from django.db.models import F
+
+from bestiary.models import Artifact, Dungeon, GameItem, Level, Monster, Rune, RuneCraft
+from data_log import models
+from data_log.util import floor_to_nearest, ceil_to_nearest, replace_value_with_choice, transform_to_dict, \
+    round_timedelta
+
+MINIMUM_THRESHOLD = 0.005  # Any drops that occur less than this percentage of time are filtered out
+CLEAR_TIME_BIN_WIDTH = timedelta(seconds=5)
+EFFICIENCY_BIN_WIDTH = 5
+VALUE_BIN_WIDTH = 500
+
+# Narrow column set read from each drop table. log_id is always the first column.
+DROP_COLUMNS = {
+    models.ItemDrop.RELATED_NAME: ('item_id', 'quantity'),
+    models.MonsterDrop.RELATED_NAME: ('monster_id', 'grade'),
+    models.MonsterPieceDrop.RELATED_NAME: ('monster_id', 'quantity'),
+    models.RuneDrop.RELATED_NAME: (
+        'type', 'slot', 'quality', 'stars', 'main_stat', 'innate_stat', 'substats', 'value', 'max_efficiency',
+    ),
+    models.RuneCraftDrop.RELATED_NAME: ('type', 'rune', 'quality', 'stat'),
+    models.ArtifactDrop.RELATED_NAME: ('slot', 'element', 'archetype', 'quality', 'main_stat', 'effects', 'max_efficiency'),
+    models.DungeonSecretDungeonDrop.RELATED_NAME: ('level_id', ),
+}
+
+MONSTER_INFO_FIELDS = ('name', 'bestiary_slug', 'image_filename', 'element', 'can_awaken', 'is_awakened', 'natural_stars', 'family_id')
+
+
+def _none_last(value):
+    # Matches postgres ascending sort order, which places nulls last
+    return value is None, value
+
+
+def _sorted_counts(counts, min_count, order='count'):
+    # [(value, count)] above the threshold, in the same order the report queries use
+    results = [(value, count) for value, count in counts.items() if count > min_count]
+
+    if order == 'count':
+        return sorted(results, key=lambda r: (-r[1], _none_last(r[0])))
+    return sorted(results, key=lambda r: _none_last(r[0]))
+
+
+def _occurrences(counts, field, min_count, total=None, choices=None, order='count', name_key=None):
+    data = [{field: value, 'count': count} for value, count in _sorted_counts(counts, min_count, order)]
+
+    if choices:
+        data = replace_value_with_choice(data, {field: choices})
+
+    return {
+        'type': 'occurrences',
+        'total': sum(counts.values()) if total is None else total,
+        'data': transform_to_dict(data, name_key=name_key),
+    }
+
+
+def _histogram(bin_counts, first_bin, num_bins, choices, bin_label):
+    """
+    Roll fixed width bin counts up into the same list of dicts django_pivot's histogram() produces.
+
+    :param bin_counts: Counter of {(bin index, slice value): count}
+    :param first_bin: bin index of the first reported bin. Values below it are excluded.
+    :param num_bins: number of reported bins. The last bin includes everything above it.
+    :param choices: choices of the sliced field, used for the keys of each bin
+    :param bin_label: function of reported bin number to its label
+    """
+    data = [
+        {'bin': bin_label(x), **{display: 0 for _, display in choices}}
+        for x in range(num_bins)
+    ]
+    choice_dict = dict(choices)
+
+    for (bin_idx, slice_value), count in bin_counts.items():
+        if bin_idx < first_bin or slice_value not in choice_dict:
+            continue
+
+        x = min(bin_idx - first_bin, num_bins - 1)
+        data[x][choice_dict[slice_value]] += count
+
+    return data
+
+
+class DropAggregate:
+    """
+    Running totals for a set of logs and their drops. Aggregates are mergeable so they can be calculated for small
+    slices of logs and combined later, and produce the same report structure as drop_report().
+    """
+
+    def __init__(self, drop_types=(), has_clear_time=False):
+        self.drop_types = list(drop_types)
+        self.has_clear_time = has_clear_time
+        self.log_count = 0
+        self.wizard_ids = set()
+        self.start_timestamp = None
+        self.end_timestamp = None
+        self.counts = defaultdict(Counter)  # Counters of tuple keys by section
+        self.ranges = defaultdict(dict)  # [min, max] of tuple keys by section
+
+    @classmethod
+    def for_model(cls, model):
+        return cls(
+            drop_types=[drop_type for drop_type in DROP_COLUMNS.keys() if hasattr(model, drop_type)],
+            has_clear_time=hasattr(model, 'clear_time'),
+        )
+
+    # Accumulation
+    def _measure(self, section, key, value):
+        if value is None:
+            return
+
+        self.counts[section][('sum', ) + key] += value
+        current = self.ranges[section].get(key)
+        if current is None:
+            self.ranges[section][key] = [value, value]
+        else:
+            current[0] = min(current[0], value)
+            current[1] = max(current[1], value)
+
+    def add_log(self, timestamp, wizard_id, success=None, clear_time=None, category=None):
+        self.log_count += 1
+        self.wizard_ids.add(wizard_id)
+
+        if self.start_timestamp is None or timestamp < self.start_timestamp:
+            self.start_timestamp = timestamp
+        if self.end_timestamp is None or timestamp > self.end_timestamp:
+            self.end_timestamp = timestamp
+
+        if self.has_clear_time:
+            section = self.counts['clear_time']
+            section[('success', success)] += 1
+
+            if clear_time is not None:
+                microseconds = clear_time // timedelta(microseconds=1)
+                section[('bin', clear_time // CLEAR_TIME_BIN_WIDTH, success)] += 1
+
+                if success or category == Dungeon.CATEGORY_RIFT_OF_WORLDS_BEASTS:
+                    section[('count', )] += 1
+                    section[('sum_sq', )] += (microseconds / 1e6) ** 2
+                    self._measure('clear_time', ('time', ), microseconds)
+
+    def add_drop(self, drop_type, *columns):
+        getattr(self, f'_add_{drop_type}')(self.counts[drop_type], *columns)
+
+    def _add_items(self, section, item_id, quantity):
+        section[('item', item_id)] += 1
+        self._measure(models.ItemDrop.RELATED_NAME, ('qty', item_id), quantity)
+
+    def _add_monsters(self, section, monster_id, grade):
+        section[('monster', monster_id, grade)] += 1
+
+    def _add_monster_pieces(self, section, monster_id, quantity):
+        section[('monster', monster_id)] += 1
+        self._measure(models.MonsterPieceDrop.RELATED_NAME, ('qty', monster_id), quantity)
+
+    def _add_runes(self, section, rune_type, slot, quality, stars, main_stat, innate_stat, substats, value, max_efficiency):
+        section[('type', rune_type)] += 1
+        section[('slot', slot)] += 1
+        section[('quality', quality)] += 1
+        section[('stars', stars)] += 1
+        section[('main_stat', slot, main_stat)] += 1
+        section[('innate_stat', innate_stat)] += 1
+        for substat in substats or []:
+            section[('substat', substat)] += 1
+        if max_efficiency is not None:
+            section[('max_efficiency', int(max_efficiency // EFFICIENCY_BIN_WIDTH), quality)] += 1
+        if value is not None:
+            section[('value', value // VALUE_BIN_WIDTH, quality)] += 1
+            self._measure(models.RuneDrop.RELATED_NAME, ('value', ), value)
+
+    def _add_rune_crafts(self, section, craft_type, rune, quality, stat):
+        section[('craft', craft_type, rune, quality, stat)] += 1
+
+    def _add_artifacts(self, section, slot, element, archetype, quality, main_stat, effects, max_efficiency):
+        section[('slot', slot)] += 1
+        if slot == Artifact.SLOT_ELEMENTAL:
+            section[('element', element)] += 1
+        elif slot == Artifact.SLOT_ARCHETYPE:
+            section[('archetype', archetype)] += 1
+        section[('quality', quality)] += 1
+        section[('main_stat', main_stat)] += 1
+        for effect in effects or []:
+            section[('effect', effect)] += 1
+        if max_efficiency is not None:
+            section[('max_efficiency', int(max_efficiency // EFFICIENCY_BIN_WIDTH), quality)] += 1
+
+    def _add_secret_dungeons(self, section, level_id):
+        section[('level', level_id)] += 1
+
+    def merge(self, other):
+        self.log_count += other.log_count
+        self.wizard_ids |= other.wizard_ids
+
+        if other.start_timestamp and (self.start_timestamp is None or other.start_timestamp < self.start_timestamp):
+            self.start_timestamp = other.start_timestamp
+        if other.end_timestamp and (self.end_timestamp is None or other.end_timestamp > self.end_timestamp):
+            self.end_timestamp = other.end_timestamp
+
+        for section, counts in other.counts.items():
+            self.counts[section].update(counts)
+
+        for section, ranges in other.ranges.items():
+            for key, (other_min, other_max) in ranges.items():
+                current = self.ranges[section].get(key)
+                if current is None:
+                    self.ranges[section][key] = [other_min, other_max]
+                else:
+                    current[0] = min(current[0], other_min)
+                    current[1] = max(current[1], other_max)
+
+        return self
+
+    # Serialization
+    def to_json(self):
+        return {
+            'drop_types': self.drop_types,
+            'has_clear_time': self.has_clear_time,
+            'log_count': self.log_count,
+            'wizard_ids': sorted(self.wizard_ids),
+            'counts': {
+                section: [[list(key), count] for key, count in counts.items()]
+                for section, counts in self.counts.items()
+            },
+            'ranges': {
+                section: [[list(key), low, high] for key, (low, high) in ranges.items()]
+                for section, ranges in self.ranges.items()
+            },
+        }
+
+    @classmethod
+    def from_json(cls, data, start_timestamp=None, end_timestamp=None):
+        aggregate = cls(data['drop_types'], data['has_clear_time'])
+        aggregate.log_count = data['log_count']
+        aggregate.wizard_ids = set(data['wizard_ids'])
+        aggregate.start_timestamp = start_timestamp
+        aggregate.end_timestamp = end_timestamp
+
+        for section, counts in data['counts'].items():
+            aggregate.counts[section] = Counter({tuple(key): count for key, count in counts})
+
+        for section, ranges in data['ranges'].items():
+            aggregate.ranges[section] = {tuple(key): [low, high] for key, low, high in ranges}
+
+        return aggregate
+
+    # Reporting
+    def _values(self, section, tag):
+        # Counter of the remaining key values for all keys in section starting with tag
+        values = Counter()
+        for key, count in self.counts[section].items():
+            if key[0] == tag:
+                values[key[1] if len(key) == 2 else key[1:]] += count
+        return values
+
+    def _load_related(self):
+        item_ids = set(self._values(models.ItemDrop.RELATED_NAME, 'item'))
+        monster_ids = {monster for monster, grade in self._values(models.MonsterDrop.RELATED_NAME, 'monster')}
+        monster_ids |= set(self._values(models.MonsterPieceDrop.RELATED_NAME, 'monster'))
+        level_ids = set(self._values(models.DungeonSecretDungeonDrop.RELATED_NAME, 'level'))
+
+        self._items = {
+            item['pk']: item
+            for item in GameItem.objects.filter(pk__in=item_ids).values('pk', 'name', 'icon', 'category')
+        } if item_ids else {}
+        self._monsters = {
+            monster['pk']: monster
+            for monster in Monster.objects.filter(pk__in=monster_ids).values('pk', *MONSTER_INFO_FIELDS)
+        } if monster_ids else {}
+        self._secret_dungeon_monsters = {
+            level['pk']: level
+            for level in Level.objects.filter(pk__in=level_ids).values(
+                'pk',
+                **{field: F(f'dungeon__secretdungeon__monster__{field}') for field in MONSTER_INFO_FIELDS}
+            )
+        } if level_ids else {}
+
+    def report(self, **kwargs):
+        self._load_related()
+
+        report_data = {
+            'summary': self._summary(**kwargs),
+        }
+
+        if self.has_clear_time:
+            clear_time = self._clear_time_report()
+            if clear_time:
+                report_data['clear_time'] = clear_time
+
+        for drop_type in self.drop_types:
+            report_fn = getattr(self, f'_{drop_type}_report', None)
+            if report_fn:
+                report_data[drop_type] = report_fn(**kwargs)
+
+        return report_data
+
+    def _clear_time_report(self):
+        section = self.counts['clear_time']
+        count = section[('count', )]
+        time_range = self.ranges['clear_time'].get(('time', ))
+
+        if not count or not time_range:
+            return None
+
+        mean = section[('sum', 'time')] / count
+        std_dev = sqrt(max(0, section[('sum_sq', )] / count - (mean / 1e6) ** 2))
+        avg_time = timedelta(microseconds=mean)
+        min_time = timedelta(microseconds=time_range[0])
+        max_time = timedelta(microseconds=time_range[1])
+
+        # Use +/- 3 std deviations of clear time avg as bounds for time range in case of extreme outliers skewing chart scale
+        bins_start = round_timedelta(
+            max(min_time, avg_time - timedelta(seconds=std_dev * 3)),
+            CLEAR_TIME_BIN_WIDTH,
+            direction='down',
+        )
+        bins_end = round_timedelta(
+            min(max_time, avg_time + timedelta(seconds=std_dev * 3)),
+            CLEAR_TIME_BIN_WIDTH,
+            direction='up',
+        )
+
+        # Histogram is sliced on every value of success seen, in database order
+        success_choices = [
+            (value, str(value)) for value in sorted(self._values('clear_time', 'success'), key=_none_last)
+        ]
+
+        return {
+            'min': str(min_time),
+            'max': str(max_time),
+            'avg': str(avg_time),
+            'chart': {
+                'type': 'histogram',
+                'width': 5,
+                'data': _histogram(
+                    self._values('clear_time', 'bin'),
+                    bins_start // CLEAR_TIME_BIN_WIDTH,
+                    int((bins_end - bins_start) / CLEAR_TIME_BIN_WIDTH),
+                    success_choices,
+                    lambda x: str(bins_start + CLEAR_TIME_BIN_WIDTH * x),
+                ),
+            }
+        }
+
+    def _summary(self, **kwargs):
+        summary = {
+            'table': {},
+            'chart': [],
+        }
+
+        kwargs['min_count'] = kwargs.get('min_count', max(1, int(MINIMUM_THRESHOLD * self.log_count)))
+
+        for drop_type in self.drop_types:
+            chart_data, table_data = getattr(self, f'_{drop_type}_summary')(**kwargs)
+            summary['chart'] += chart_data
+
+            if table_data:
+                summary['table'][drop_type] = table_data
+
+        return summary
+
+    def _rate(self, count, total=None):
+        return count / (total or self.log_count) * 100
+
+    def _monster_row(self, info, stars, count):
+        return {
+            'name': info['name'],
+            'slug': info['bestiary_slug'],
+            'icon': info['image_filename'],
+            'element': info['element'],
+            'can_awaken': info['can_awaken'],
+            'is_awakened': info['is_awakened'],
+            'stars': stars,
+            'count': count,
+        }
+
+    def _items_summary(self, min_count, **kwargs):
+        section = models.ItemDrop.RELATED_NAME
+        quantities = self.ranges[section]
+        chart_counts = Counter()
+        table_rows = {}
+
+        for item_id, count in self._values(section, 'item').items():
+            item = self._items[item_id]
+            is_currency = item['category'] == GameItem.CATEGORY_CURRENCY
+
+            if kwargs.get('exclude_social_points') and is_currency and item['name'] == 'Social Point':
+                continue
+
+            if kwargs.get('include_currency') or not is_currency:
+                chart_counts[item['name']] += count
+
+            row = table_rows.setdefault((item['category'], item['name'], item['icon']), {'count': 0, 'sum': 0, 'ranges': []})
+            row['count'] += count
+            row['sum'] += self.counts[section][('sum', 'qty', item_id)]
+            row['ranges'].append(quantities[('qty', item_id)])
+
+        chart_data = [{'name': name, 'count': count} for name, count in _sorted_counts(chart_counts, min_count - 1)]
+        table_data = [
+            {
+                'name': name,
+                'icon': icon,
+                'count': row['count'],
+                'min': min(low for low, high in row['ranges']),
+                'max': max(high for low, high in row['ranges']),
+                'avg': row['sum'] / row['count'],
+                'drop_chance': self._rate(row['count']),
+                'qty_per_100': self._rate(row['sum']),
+            }
+            for (category, name, icon), row in sorted(table_rows.items(), key=lambda r: (r[0][0], -r[1]['count'], r[0][1]))
+            if row['count'] >= min_count
+        ]
+
+        return chart_data, table_data
+
+    def _monsters_summary(self, min_count, **kwargs):
+        drops = self._values(models.MonsterDrop.RELATED_NAME, 'monster')
+        grades = Counter()
+        for (monster_id, grade), count in drops.items():
+            grades[grade] += count
+
+        chart_data = [
+            {'name': f'{grade}⭐ Monster', 'count': count} for grade, count in _sorted_counts(grades, min_count - 1)
+        ]
+        table_data = replace_value_with_choice(
+            [
+                {
+                    **self._monster_row(self._monsters[monster_id], grade, count),
+                    'drop_chance': self._rate(count),
+                    'qty_per_100': self._rate(count),
+                }
+                for (monster_id, grade), count in _sorted_counts(drops, min_count - 1)
+            ],
+            {'element': Monster.ELEMENT_CHOICES}
+        )
+
+        return chart_data, table_data
+
+    def _rune_crafts_summary(self, min_count, **kwargs):
+        crafts = self._values(models.RuneCraftDrop.RELATED_NAME, 'craft')
+        by_field = [Counter(), Counter(), Counter()]
+        for (craft_type, rune, quality, stat), count in crafts.items():
+            by_field[0][craft_type] += count
+            by_field[1][rune] += count
+            by_field[2][quality] += count
+        by_type, by_rune, by_quality = by_field
+
+        chart_data = replace_value_with_choice(
+            [{'name': craft_type, 'count': count} for craft_type, count in _sorted_counts(by_type, min_count - 1)],
+            {'name': RuneCraft.CRAFT_CHOICES}
+        )
+        table_data = {
+            'sets': replace_value_with_choice(
+                [{'rune': rune, 'count': count} for rune, count in _sorted_counts(by_rune, min_count - 1, order='value')],
+                {'rune': Rune.TYPE_CHOICES}
+            ),
+            'type': replace_value_with_choice(
+                [{'type': craft_type, 'count': count} for craft_type, count in _sorted_counts(by_type, min_count - 1, order='value')],
+                {'type': Rune.TYPE_CHOICES}
+            ),
+            'quality': replace_value_with_choice(
+                [{'quality': quality, 'count': count} for quality, count in _sorted_counts(by_quality, min_count - 1, order='value')],
+                {'quality': Rune.QUALITY_CHOICES}
+            ),
+        }
+
+        return chart_data, table_data
+
+    def _total_chart(self, drop_type, total, min_count):
+        # Chart is name, count only
+        if total >= min_count and total > 0:
+            return [{
+                'name': ' '.join([s.capitalize() for s in drop_type.split('_')]).rstrip('s'),
+                'count': total,
+            }]
+        return []
+
+    def _monster_pieces_summary(self, min_count, **kwargs):
+        section = models.MonsterPieceDrop.RELATED_NAME
+        drops = self._values(section, 'monster')
+
+        table_data = []
+        for monster_id, count in _sorted_counts(drops, min_count - 1):
+            quantity = self.counts[section][('sum', 'qty', monster_id)]
+            low, high = self.ranges[section][('qty', monster_id)]
+            info = self._monsters[monster_id]
+            table_data.append({
+                **self._monster_row(info, info['natural_stars'], count),
+                'min': low,
+                'max': high,
+                'avg': quantity / count,
+                'drop_chance': self._rate(count),
+                'qty_per_100': self._rate(quantity),
+            })
+
+        return (
+            self._total_chart(section, sum(drops.values()), min_count),
+            replace_value_with_choice(table_data, {'element': Monster.ELEMENT_CHOICES}),
+        )
+
+    def _runes_summary(self, min_count, **kwargs):
+        section = models.RuneDrop.RELATED_NAME
+        slots = self._values(section, 'slot')
+
+        table_data = {
+            'sets': replace_value_with_choice(
+                [{'type': value, 'count': count} for value, count in _sorted_counts(self._values(section, 'type'), min_count - 1, order='value')],
+                {'type': Rune.TYPE_CHOICES}
+            ),
+            'slots': [{'slot': value, 'count': count} for value, count in _sorted_counts(slots, min_count - 1, order='value')],
+            'quality': replace_value_with_choice(
+                [{'quality': value, 'count': count} for value, count in _sorted_counts(self._values(section, 'quality'), min_count - 1, order='value')],
+                {'quality': Rune.QUALITY_CHOICES}
+            ),
+        }
+
+        return self._total_chart(section, sum(slots.values()), min_count), table_data
+
+    def _artifacts_summary(self, min_count, **kwargs):
+        section = models.ArtifactDrop.RELATED_NAME
+
+        # Element and archetype are not replaced with their display values, matching the original report
+        table_data = {
+            'element': [
+                {'element': value, 'count': count}
+                for value, count in _sorted_counts(self._values(section, 'element'), min_count - 1, order='value')
+            ],
+            'archetype': [
+                {'archetype': value, 'count': count}
+                for value, count in _sorted_counts(self._values(section, 'archetype'), min_count - 1, order='value')
+            ],
+            'quality': replace_value_with_choice(
+                [{'quality': value, 'count': count} for value, count in _sorted_counts(self._values(section, 'quality'), min_count - 1, order='value')],
+                {'quality': Artifact.QUALITY_CHOICES}
+            ),
+        }
+
+        return self._total_chart(section, sum(self._values(section, 'slot').values()), min_count), table_data
+
+    def _secret_dungeons_summary(self, min_count, **kwargs):
+        drops = self._values(models.DungeonSecretDungeonDrop.RELATED_NAME, 'level')
+
+        table_data = []
+        for level_id, count in _sorted_counts(drops, min_count - 1):
+            info = self._secret_dungeon_monsters[level_id]
+            table_data.append({
+                **self._monster_row(info, info['natural_stars'], count),
+                'drop_chance': self._rate(count),
+                'qty_per_100': self._rate(count),
+            })
+
+        table_data = replace_value_with_choice(
+            table_data,
+            {'element': Monster.ELEMENT_CHOICES}
+        )
+
+        return self._total_chart(models.DungeonSecretDungeonDrop.RELATED_NAME, sum(drops.values()), min_count), table_data
+
+    # Individual drop details. min_count and drop rates are based on the number of drops of that type.
+    def _detail_min_count(self, total, **kwargs):
+        return kwargs.get('min_count', max(1, int(MINIMUM_THRESHOLD * total)))
+
+    def _items_report(self, **kwargs):
+        section = models.ItemDrop.RELATED_NAME
+        drops = self._values(section, 'item')
+        total = sum(drops.values())
+
+        if total == 0:
+            return None
+
+        results = []
+        for item_id, count in _sorted_counts(drops, self._detail_min_count(total, **kwargs)):
+            quantity = self.counts[section][('sum', 'qty', item_id)]
+            low, high = self.ranges[section][('qty', item_id)]
+            results.append({
+                'item': item_id,
+                'name': self._items[item_id]['name'],
+                'icon': self._items[item_id]['icon'],
+                'count': count,
+                'min': low,
+                'max': high,
+                'avg': quantity / count,
+                'drop_chance': self._rate(count, total),
+                'qty_per_100': self._rate(quantity, total),
+            })
+
+        return results
+
+    def _monsters_report(self, **kwargs):
+        drops = self._values(models.MonsterDrop.RELATED_NAME, 'monster')
+        total = sum(drops.values())
+
+        if total == 0:
+            return None
+
+        min_count = self._detail_min_count(total, **kwargs)
+        by_monster = Counter()
+        by_family = Counter()
+        by_stars = Counter()
+        by_element = Counter()
+        by_awakened = Counter()
+
+        for (monster_id, grade), count in drops.items():
+            info = self._monsters[monster_id]
+            by_monster[f"{info['element']} {info['name']}".title()] += count
+            by_family[(info['family_id'], info['name'])] += count
+            by_stars[f"{info['natural_stars']}⭐"] += count
+            by_element[info['element'].title()] += count
+            by_awakened[info['is_awakened']] += count
+
+        return {
+            'monsters': _occurrences(by_monster, 'monster_name', min_count, total=total),
+            'family': {
+                'type': 'occurrences',
+                'total': total,
+                'data': {name: count for (family_id, name), count in _sorted_counts(by_family, min_count)},
+            },
+            'nat_stars': _occurrences(by_stars, 'grade', min_count, total=total),
+            'element': _occurrences(by_element, 'element_cap', min_count, total=total),
+            'awakened': {
+                'type': 'occurrences',
+                'total': total,
+                'data': {
+                    'Awakened' if awakened else 'Unawakened': count
+                    for awakened, count in _sorted_counts(by_awakened, min_count)
+                },
+            },
+        }
+
+    def _runes_report(self, **kwargs):
+        section = models.RuneDrop.RELATED_NAME
+        slots = self._values(section, 'slot')
+        total = sum(slots.values())
+
+        if total == 0:
+            return None
+
+        min_count = self._detail_min_count(total, **kwargs)
+        main_stats = self._values(section, 'main_stat')
+        main_stat_by_slot = defaultdict(Counter)
+        all_main_stats = Counter()
+        for (slot, main_stat), count in main_stats.items():
+            main_stat_by_slot[slot][main_stat] += count
+            all_main_stats[main_stat] += count
+
+        report_data = {
+            'stars': _occurrences(
+                Counter({f'{stars}⭐': count for stars, count in self._values(section, 'stars').items()}),
+                'grade', min_count, total=total,
+            ),
+            'type': _occurrences(self._values(section, 'type'), 'type', min_count, total=total, choices=Rune.TYPE_CHOICES),
+            'quality': _occurrences(self._values(section, 'quality'), 'quality', min_count, total=total, choices=Rune.QUALITY_CHOICES),
+            'slot': _occurrences(slots, 'slot', min_count, total=total),
+            'main_stat': _occurrences(all_main_stats, 'main_stat', min_count, total=total, choices=Rune.STAT_CHOICES, order='value'),
+        }
+
+        for slot in (2, 4, 6):
+            report_data[f'slot_{slot}_main_stat'] = _occurrences(
+                main_stat_by_slot[slot], 'main_stat', min_count, choices=Rune.STAT_CHOICES, order='value'
+            )
+
+        report_data['innate_stat'] = _occurrences(
+            self._values(section, 'innate_stat'), 'innate_stat', min_count, total=total, choices=Rune.STAT_CHOICES, order='value',
+        )
+        report_data['substats'] = _occurrences(self._values(section, 'substat'), 'substat', -1, choices=Rune.STAT_CHOICES, order='value')
+        report_data['max_efficiency'] = {
+            'type': 'histogram',
+            'width': EFFICIENCY_BIN_WIDTH,
+            'data': _histogram(
+                self._values(section, 'max_efficiency'), 0, 100 // EFFICIENCY_BIN_WIDTH, Rune.QUALITY_CHOICES,
+                lambda x: str(x * EFFICIENCY_BIN_WIDTH),
+            ),
+        }
+
+        # Sell value ranges
+        min_value, max_value = self.ranges[section][('value', )]
+        min_value = int(floor_to_nearest(min_value, 1000))
+        max_value = int(ceil_to_nearest(max_value, 1000))
+        report_data['value'] = {
+            'type': 'histogram',
+            'width': VALUE_BIN_WIDTH,
+            'data': _histogram(
+                self._values(section, 'value'),
+                min_value // VALUE_BIN_WIDTH,
+                len(range(min_value, max_value, VALUE_BIN_WIDTH)),
+                Rune.QUALITY_CHOICES,
+                lambda x: str(min_value + x * VALUE_BIN_WIDTH),
+            ),
+        }
+
+        return report_data
+
+    def _artifacts_report(self, **kwargs):
+        section = models.ArtifactDrop.RELATED_NAME
+        slots = self._values(section, 'slot')
+        total = sum(slots.values())
+
+        if total == 0:
+            return None
+
+        min_count = self._detail_min_count(total, **kwargs)
+
+        return {
+            'element': _occurrences(
+                self._values(section, 'element'), 'element', min_count, total=slots[Artifact.SLOT_ELEMENTAL], choices=Artifact.ELEMENT_CHOICES,
+            ),
+            'archetype': _occurrences(
+                self._values(section, 'archetype'), 'archetype', min_count, total=slots[Artifact.SLOT_ARCHETYPE], choices=Artifact.ARCHETYPE_CHOICES,
+            ),
+            'quality': _occurrences(self._values(section, 'quality'), 'quality', min_count, total=total, choices=Artifact.QUALITY_CHOICES),
+            'main_stat': _occurrences(
+                self._values(section, 'main_stat'), 'main_stat', min_count, total=total, choices=Artifact.STAT_CHOICES, order='value',
+            ),
+            'effects': _occurrences(self._values(section, 'effect'), 'effect', -1, choices=Artifact.EFFECT_CHOICES, order='value'),
+            'max_efficiency': {
+                'type': 'histogram',
+                'width': EFFICIENCY_BIN_WIDTH,
+                'data': _histogram(
+                    self._values(section, 'max_efficiency'), 0, 100 // EFFICIENCY_BIN_WIDTH, Artifact.QUALITY_CHOICES,
+                    lambda x: str(x * EFFICIENCY_BIN_WIDTH),
+                ),
+            },
+        }
+
+    def _rune_craft_report_data(self, crafts, **kwargs):
+        total = sum(crafts.values())
+
+        if total == 0:
+            return None
+
+        min_count = self._detail_min_count(total, **kwargs)
+        by_field = [Counter(), Counter(), Counter(), Counter()]
+        for key, count in crafts.items():
+            for idx, value in enumerate(key):
+                by_field[idx][value] += count
+        by_type, by_rune, by_quality, by_stat = by_field
+
+        return {
+            'type': _occurrences(by_type, 'type', min_count, total=total, choices=RuneCraft.CRAFT_CHOICES),
+            'rune': _occurrences(by_rune, 'rune', min_count, total=total, choices=RuneCraft.TYPE_CHOICES),
+            'quality': _occurrences(by_quality, 'quality', min_count, total=total, choices=RuneCraft.QUALITY_CHOICES),
+            'stat': _occurrences(by_stat, 'stat', min_count, total=total, choices=RuneCraft.STAT_CHOICES, order='value'),
+        }
+
+    def _rune_crafts_report(self, **kwargs):
+        crafts = self._values(models.RuneCraftDrop.RELATED_NAME, 'craft')
+
+        return {
+            'grindstone': self._rune_craft_report_data(
+                Counter({key: count for key, count in crafts.items() if key[0] in RuneCraft.CRAFT_GRINDSTONES}), **kwargs
+            ),
+            'gem': self._rune_craft_report_data(
+                Counter({key: count for key, count in crafts.items() if key[0] in RuneCraft.CRAFT_ENCHANT_GEMS}), **kwargs
+            ),
+        }
+
+
+def fold_logs(qs, bucket=None):
+    """
+    Stream the logs in qs and their drops once each, accumulating them into DropAggregates.
+
+    :param qs: log queryset
+    :param bucket: optional function of log timestamp to a bucket key. Without it all logs are folded into one aggregate.
+    :return: dict of {bucket key: DropAggregate}
+    """
+    model = qs.model
+    aggregates = {}
+    log_buckets = {}
+
+    log_columns = ['pk', 'timestamp', 'wizard_id']
+    if hasattr(model, 'clear_time'):
+        log_columns += ['success', 'clear_time', 'level__dungeon__category']
+
+    for pk, timestamp, *log_data in qs.order_by().values_list(*log_columns).iterator():
+        key = bucket(timestamp) if bucket else None
+        if key not in aggregates:
+            aggregates[key] = DropAggregate.for_model(model)
+
+        aggregates[key].add_log(timestamp, *log_data)
+        log_buckets[pk] = aggregates[key]
+
+    if not aggregates:
+        return aggregates
+
+    for drop_type in aggregates[next(iter(aggregates))].drop_types:
+        drop_model = getattr(model, drop_type).field.model
+        drops = drop_model.objects.filter(log__in=qs).order_by().values_list('log_id', *DROP_COLUMNS[drop_type])
+
+        for log_id, *columns in drops.iterator():
+            aggregate = log_buckets.get(log_id)
+            if aggregate:
+                aggregate.add_drop(drop_type, *columns)
+
+    return aggregates
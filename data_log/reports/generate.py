@@ -2,17 +2,20 @@ from collections import Counter
 from datetime import timedelta
 
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import Count, Min, Max, Avg, Sum, Func, F, Func, Q, CharField, FloatField, Value, StdDev
-from django.db.models.functions import Cast, Concat, Extract
+from django.db import transaction
+from django.db.models import Count, Min, Max, Avg, Sum, Func, F, Func, CharField, FloatField, Value
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
 from django_pivot.histogram import histogram
 
 from bestiary.models import Monster, Rune, Level, GameItem, Dungeon, Artifact, ArtifactCraft
 from data_log import models
+from data_log.reports.aggregate import DropAggregate, fold_logs, MINIMUM_THRESHOLD, CLEAR_TIME_BIN_WIDTH
 from data_log.util import slice_records, floor_to_nearest, ceil_to_nearest, replace_value_with_choice, \
-    transform_to_dict, round_timedelta
+    transform_to_dict
 
-MINIMUM_THRESHOLD = 0.005  # Any drops that occur less than this percentage of time are filtered out
-CLEAR_TIME_BIN_WIDTH = timedelta(seconds=5)
+LEVEL_REPORT_MINIMUM_COUNT = 2500
+LEVEL_REPORT_TIMESPAN = timedelta(weeks=2)
 
 
 def get_report_summary(drops, total_log_count, **kwargs):
@@ -623,130 +626,97 @@ def get_drop_querysets(qs):
 
 
 def drop_report(qs, **kwargs):
-    report_data = {}
-
-    # Get querysets for each possible drop type
-    drops = get_drop_querysets(qs)
-    report_data['summary'] = get_report_summary(drops, qs.count(), **kwargs)
-
-    # Clear time statistics, if supported by the qs model
-    if hasattr(qs.model, 'clear_time'):
-        successful_runs = qs.filter(
-            Q(success=True) | Q(level__dungeon__category=Dungeon.CATEGORY_RIFT_OF_WORLDS_BEASTS)
-        )
-
-        if successful_runs.count():
-            clear_time_aggs = successful_runs.aggregate(
-                std_dev=StdDev(Extract(F('clear_time'), lookup_name='epoch')),
-                avg=Avg('clear_time'),
-                min=Min('clear_time'),
-                max=Max('clear_time'),
-            )
-
-            # Use +/- 3 std deviations of clear time avg as bounds for time range in case of extreme outliers skewing chart scale
-            min_time = round_timedelta(
-                max(clear_time_aggs['min'], clear_time_aggs['avg'] - timedelta(seconds=clear_time_aggs['std_dev'] * 3)),
-                CLEAR_TIME_BIN_WIDTH,
-                direction='down',
-            )
-            max_time = round_timedelta(
-                min(clear_time_aggs['max'], clear_time_aggs['avg'] + timedelta(seconds=clear_time_aggs['std_dev'] * 3)),
-                CLEAR_TIME_BIN_WIDTH,
-                direction='up',
-            )
-            bins = [min_time + CLEAR_TIME_BIN_WIDTH * x for x in range(0, int((max_time - min_time) / CLEAR_TIME_BIN_WIDTH))]
-
-            # Histogram generates on entire qs, not just successful runs.
-            report_data['clear_time'] = {
-                'min': str(clear_time_aggs['min']),
-                'max': str(clear_time_aggs['max']),
-                'avg': str(clear_time_aggs['avg']),
-                'chart': {
-                    'type': 'histogram',
-                    'width': 5,
-                    'data': histogram(qs, 'clear_time', bins, slice_on='success'),
-                }
-            }
-
-    # Individual drop details
-    for key, qs in drops.items():
-        if DROP_TYPES[key]:
-            report_data[key] = DROP_TYPES[key](qs, qs.count(), **kwargs)
-
-    return report_data
+    # Each log and drop table is read once and every breakdown is counted in memory
+    aggregate = fold_logs(qs).get(None) or DropAggregate.for_model(qs.model)
+    return aggregate.report(**kwargs)
 
 
 def grade_summary_report(qs, grade_choices):
     report_data = []
 
     drops = get_drop_querysets(qs)
+    grade_log_counts = dict(qs.order_by().values_list('grade').annotate(count=Count('pk')))
+
+    # Stats of all drops by grade, one grouped query per drop type. Currently only care about monsters and items
+    item_stats = {}
+    monster_counts = {}
+    rune_counts = {}
+
+    if 'items' in drops:
+        for result in drops['items'].order_by().values('log__grade', 'item').annotate(
+            count=Count('pk'),
+            min=Min('quantity'),
+            max=Max('quantity'),
+            avg=Avg('quantity'),
+            quantity=Sum('quantity'),
+        ):
+            item_stats[(result.pop('log__grade'), result.pop('item'))] = result
+
+    if 'monsters' in drops:
+        monster_counts = {
+            (grade, monster): count
+            for grade, monster, count in drops['monsters'].order_by().values_list('log__grade', 'monster').annotate(count=Count('pk'))
+        }
 
-    # List of all drops. Currently only care about monsters and items
-    all_items = GameItem.objects.filter(pk__in=drops['items'].values_list('item', flat=True)) if 'items' in drops else []
-    all_monsters = Monster.objects.filter(pk__in=drops['monsters'].values_list('monster', flat=True)) if 'monsters' in drops else []
-    all_runes = drops['runes'] if 'runes' in drops else []
+    if 'runes' in drops:
+        rune_counts = {
+            (grade, stars): count
+            for grade, stars, count in drops['runes'].order_by().values_list('log__grade', 'stars').annotate(count=Count('pk'))
+        }
+
+    # List of all drops
+    all_items = GameItem.objects.filter(pk__in={item for grade, item in item_stats}) if item_stats else []
+    all_monsters = Monster.objects.filter(pk__in={monster for grade, monster in monster_counts}) if monster_counts else []
+    all_rune_stars = sorted({stars for grade, stars in rune_counts}, reverse=True)
 
     for grade_id, grade_name in grade_choices:
-        grade_qs = qs.filter(grade=grade_id)
-        grade_run_count = grade_qs.count() if grade_qs.count() else 1
+        log_count = grade_log_counts.get(grade_id, 0)
+        grade_run_count = log_count if log_count else 1
 
         grade_report = {
             'grade': grade_name,
-            'log_count': grade_qs.count(),
+            'log_count': log_count,
             'drops': [],
         }
         for item in all_items:
-            result = drops['items'].filter(
-                log__in=grade_qs,
-                item=item,
-            ).aggregate(
-                count=Count('pk'),
-                min=Min('quantity'),
-                max=Max('quantity'),
-                avg=Avg('quantity'),
-                drop_chance=Cast(Count('pk'), FloatField()) / grade_run_count * 100,
-                qty_per_100=Cast(Sum('quantity'), FloatField()) / grade_run_count * 100,
-            )
+            result = item_stats.get((grade_id, item.pk), {})
+            count = result.get('count', 0)
+            quantity = result.get('quantity')
 
             grade_report['drops'].append({
                 'type': 'item',
                 'name': item.name,
                 'icon': item.icon,
-                **result,
+                'count': count,
+                'min': result.get('min'),
+                'max': result.get('max'),
+                'avg': result.get('avg'),
+                'drop_chance': float(count) / grade_run_count * 100,
+                'qty_per_100': float(quantity) / grade_run_count * 100 if quantity is not None else None,
             })
 
         for monster in all_monsters:
-            result = drops['monsters'].filter(
-                log__in=grade_qs,
-                monster=monster
-            ).aggregate(
-                count=Count('pk'),
-                drop_chance=Cast(Count('pk'), FloatField()) / grade_run_count * 100,
-                qty_per_100=Cast(Func(Count('pk'), 0, function='nullif'), FloatField()) / grade_run_count * 100,
-            )
+            count = monster_counts.get((grade_id, monster.pk), 0)
 
             grade_report['drops'].append({
                 'type': 'monster',
                 'name': monster.name,
                 'icon': monster.image_filename,
                 'stars': monster.natural_stars,
-                **result,
+                'count': count,
+                'drop_chance': float(count) / grade_run_count * 100,
+                'qty_per_100': float(count) / grade_run_count * 100 if count else None,
             })
 
-        for stars in sorted(all_runes.values_list('stars', flat=True).distinct(), reverse=True):
-            result = drops['runes'].filter(
-                log__in=grade_qs,
-                stars=stars,
-            ).aggregate(
-                count=Count('pk'),
-                drop_chance=Cast(Count('pk'), FloatField()) / grade_run_count * 100,
-                qty_per_100=Cast(Func(Count('pk'), 0, function='nullif'), FloatField()) / grade_run_count * 100,
-            )
+        for stars in all_rune_stars:
+            count = rune_counts.get((grade_id, stars), 0)
 
             grade_report['drops'].append({
                 'type': 'rune',
                 'name': f'{stars}⭐ Rune',
-                **result,
+                'count': count,
+                'drop_chance': float(count) / grade_run_count * 100,
+                'qty_per_100': float(count) / grade_run_count * 100 if count else None,
             })
 
         report_data.append(grade_report)
@@ -754,73 +724,177 @@ def grade_summary_report(qs, grade_choices):
     return report_data
 
 
-def _generate_level_reports(model, **kwargs):
-    content_type = ContentType.objects.get_for_model(model)
-    levels = model.objects.values_list('level', flat=True).distinct().order_by()
+def _bucket_start(timestamp):
+    return timestamp.replace(minute=0, second=0, microsecond=0)
 
-    for level in Level.objects.filter(pk__in=levels):
-        records = slice_records(model.objects.filter(level=level, success=True), minimum_count=2500, report_timespan=timedelta(weeks=2))
 
-        if records.count() > 0:
-            report_data = drop_report(records, **kwargs)
+def _update_level_report_buckets(model, level, content_type):
+    # Fold logs received since the last aggregated log into their hourly buckets. Log timestamps come from the game,
+    # and logs can be uploaded or drained from the log queue late, so received logs are tracked by primary key.
+    buckets = models.LevelReportBucket.objects.filter(content_type=content_type, level=level)
+    logs = model.objects.filter(level=level, success=True)
+    last_log_id = buckets.aggregate(Max('last_log_id'))['last_log_id__max']
+
+    if last_log_id is not None:
+        new_logs = logs.filter(pk__gt=last_log_id)
+    else:
+        # Nothing aggregated yet. Start from the same window a full report would use.
+        records = slice_records(logs, minimum_count=LEVEL_REPORT_MINIMUM_COUNT, report_timespan=LEVEL_REPORT_TIMESPAN)
+        earliest = records.aggregate(Min('timestamp'))['timestamp__min']
+
+        if earliest is None:
+            return
+
+        new_logs = logs.filter(timestamp__gte=_bucket_start(earliest))
+
+    # Logs committed while folding are left for the next update
+    newest_log_id = new_logs.aggregate(Max('pk'))['pk__max']
+    if newest_log_id is None:
+        return
+    new_logs = new_logs.filter(pk__lte=newest_log_id)
+
+    for bucket_start, aggregate in fold_logs(new_logs, bucket=_bucket_start).items():
+        try:
+            bucket = buckets.get(bucket=bucket_start)
+        except models.LevelReportBucket.DoesNotExist:
+            bucket = models.LevelReportBucket(content_type=content_type, level=level, bucket=bucket_start)
+        else:
+            aggregate.merge(DropAggregate.from_json(bucket.aggregates, bucket.start_timestamp, bucket.end_timestamp))
+
+        bucket.start_timestamp = aggregate.start_timestamp
+        bucket.end_timestamp = aggregate.end_timestamp
+        bucket.log_count = aggregate.log_count
+        bucket.aggregates = aggregate.to_json()
+        bucket.save()
+
+    buckets.update(last_log_id=newest_log_id)
+
+
+def _select_level_report_buckets(level, content_type):
+    # Same window as slice_records() at bucket granularity: the report timespan, extended back to the minimum count
+    buckets = list(models.LevelReportBucket.objects.filter(content_type=content_type, level=level).order_by('-bucket'))
+    cutoff = timezone.now() - LEVEL_REPORT_TIMESPAN
+    selected = [bucket for bucket in buckets if bucket.end_timestamp >= cutoff]
+
+    if not selected:
+        return []
+
+    log_count = sum(bucket.log_count for bucket in selected)
+    for bucket in buckets[len(selected):]:
+        if log_count >= LEVEL_REPORT_MINIMUM_COUNT:
+            break
+
+        selected.append(bucket)
+        log_count += bucket.log_count
+
+    # Buckets older than the window have aged out and will never be needed again
+    models.LevelReportBucket.objects.filter(
+        content_type=content_type,
+        level=level,
+        bucket__lt=selected[-1].bucket,
+    ).delete()
+
+    return selected
+
+
+def _generate_incremental_level_report(model, level, content_type, **kwargs):
+    with transaction.atomic():
+        _update_level_report_buckets(model, level, content_type)
+        buckets = _select_level_report_buckets(level, content_type)
+
+        if buckets:
+            aggregate = DropAggregate.for_model(model)
+            for bucket in buckets:
+                aggregate.merge(DropAggregate.from_json(bucket.aggregates, bucket.start_timestamp, bucket.end_timestamp))
 
             models.LevelReport.objects.create(
                 level=level,
                 content_type=content_type,
-                start_timestamp=records[records.count() - 1].timestamp,  # first() and last() do not work on sliced qs
-                end_timestamp=records[0].timestamp,
-                log_count=records.count(),
-                unique_contributors=records.aggregate(Count('wizard_id', distinct=True))['wizard_id__count'],
-                report=report_data,
+                start_timestamp=aggregate.start_timestamp,
+                end_timestamp=aggregate.end_timestamp,
+                log_count=aggregate.log_count,
+                unique_contributors=len(aggregate.wizard_ids),
+                report=aggregate.report(**kwargs),
             )
 
 
-def generate_dungeon_log_reports(**kwargs):
-    _generate_level_reports(models.DungeonLog, **kwargs)
+def _generate_level_report(model, level, content_type, incremental=False, **kwargs):
+    if incremental:
+        _generate_incremental_level_report(model, level, content_type, **kwargs)
+        return
 
+    records = slice_records(model.objects.filter(level=level, success=True), minimum_count=LEVEL_REPORT_MINIMUM_COUNT, report_timespan=LEVEL_REPORT_TIMESPAN)
 
-def generate_rift_raid_reports():
-    _generate_level_reports(models.RiftRaidLog, include_currency=True, exclude_social_points=True)
+    if records.count() > 0:
+        report_data = drop_report(records, **kwargs)
 
+        models.LevelReport.objects.create(
+            level=level,
+            content_type=content_type,
+            start_timestamp=records[records.count() - 1].timestamp,  # first() and last() do not work on sliced qs
+            end_timestamp=records[0].timestamp,
+            log_count=records.count(),
+            unique_contributors=records.aggregate(Count('wizard_id', distinct=True))['wizard_id__count'],
+            report=report_data,
+        )
 
-def _generate_by_grade_reports(model):
+
+def _generate_level_reports(model, incremental=False, **kwargs):
     content_type = ContentType.objects.get_for_model(model)
-    levels = model.objects.values_list('level', flat=True).distinct().order_by()
 
-    for level in Level.objects.filter(pk__in=levels):
-        all_records = model.objects.none()
-        report_data = {
-            'reports': []
-        }
+    for level in get_report_levels(model):
+        _generate_level_report(model, level, content_type, incremental=incremental, **kwargs)
 
-        # Generate a report by grade
-        for grade, grade_desc in model.GRADE_CHOICES:
-            records = slice_records(model.objects.filter(level=level, grade=grade), minimum_count=2500, report_timespan=timedelta(weeks=2))
 
-            if records.count() > 0:
-                grade_report = drop_report(records)
-            else:
-                grade_report = None
+def generate_dungeon_log_reports(**kwargs):
+    _generate_level_reports(models.DungeonLog, **kwargs)
 
-            report_data['reports'].append({
-                'grade': grade_desc,
-                'report': grade_report
-            })
-            all_records |= records
 
-        if all_records.count() > 0:
-            # Generate a report with all results for a complete list of all things that drop here
-            report_data['summary'] = grade_summary_report(all_records, model.GRADE_CHOICES)
+def generate_rift_raid_reports(**kwargs):
+    _generate_level_reports(models.RiftRaidLog, include_currency=True, exclude_social_points=True, **kwargs)
 
-            models.LevelReport.objects.create(
-                level=level,
-                content_type=content_type,
-                start_timestamp=all_records.last().timestamp,
-                end_timestamp=all_records.first().timestamp,
-                log_count=all_records.count(),
-                unique_contributors=all_records.aggregate(Count('wizard_id', distinct=True))['wizard_id__count'],
-                report=report_data,
-            )
+
+def _generate_by_grade_report(model, level, content_type):
+    all_records = model.objects.none()
+    report_data = {
+        'reports': []
+    }
+
+    # Generate a report by grade
+    for grade, grade_desc in model.GRADE_CHOICES:
+        records = slice_records(model.objects.filter(level=level, grade=grade), minimum_count=LEVEL_REPORT_MINIMUM_COUNT, report_timespan=LEVEL_REPORT_TIMESPAN)
+
+        if records.count() > 0:
+            grade_report = drop_report(records)
+        else:
+            grade_report = None
+
+        report_data['reports'].append({
+            'grade': grade_desc,
+            'report': grade_report
+        })
+        all_records |= records
+
+    if all_records.count() > 0:
+        # Generate a report with all results for a complete list of all things that drop here
+        report_data['summary'] = grade_summary_report(all_records, model.GRADE_CHOICES)
+
+        models.LevelReport.objects.create(
+            level=level,
+            content_type=content_type,
+            start_timestamp=all_records.last().timestamp,
+            end_timestamp=all_records.first().timestamp,
+            log_count=all_records.count(),
+            unique_contributors=all_records.aggregate(Count('wizard_id', distinct=True))['wizard_id__count'],
+            report=report_data,
+        )
+
+
+def _generate_by_grade_reports(model):
+    content_type = ContentType.objects.get_for_model(model)
+
+    for level in get_report_levels(model):
+        _generate_by_grade_report(model, level, content_type)
 
 
 def generate_rift_dungeon_reports():
@@ -828,4 +902,34 @@ def generate_rift_dungeon_reports():
 
 
 def generate_world_boss_dungeon_reports():
-    _generate_by_grade_reports(models.WorldBossLog)
\ No newline at end of file
+    _generate_by_grade_reports(models.WorldBossLog)
+
+
+# Log models with level reports, and the options used to generate them
+LEVEL_REPORT_MODELS = {
+    models.DungeonLog: {},
+    models.RiftRaidLog: {'include_currency': True, 'exclude_social_points': True},
+}
+GRADE_REPORT_MODELS = (
+    models.RiftDungeonLog,
+    models.WorldBossLog,
+)
+
+
+def get_report_levels(model):
+    levels = model.objects.values_list('level', flat=True).distinct().order_by()
+    return Level.objects.filter(pk__in=levels)
+
+
+def generate_level_report(model, level, incremental=False):
+    """
+    Generate the report for a single level of any reported log model.
+    """
+    content_type = ContentType.objects.get_for_model(model)
+
+    if model in LEVEL_REPORT_MODELS:
+        _generate_level_report(model, level, content_type, incremental=incremental, **LEVEL_REPORT_MODELS[model])
+    elif model in GRADE_REPORT_MODELS:
+        _generate_by_grade_report(model, level, content_type)
+    else:
+        raise ValueError(f'No level report for {model.__name__}')
@@ -1,20 +1,95 @@
+from collections import Counter
 from datetime import timedelta
+from time import perf_counter
 
-from celery import shared_task
-from django.db.models import Q
+from celery import shared_task, chord
+from celery.exceptions import SoftTimeLimitExceeded
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, Q
 from django.utils import timezone
 
-from .models import DungeonLog, RiftRaidLog, WorldBossLog
-from .reports.generate import generate_dungeon_log_reports, generate_rift_raid_reports, generate_rift_dungeon_reports, \
-    generate_world_boss_dungeon_reports
+from bestiary.models import Level
+from herders import summoner_cache
+from herders.models import Summoner
+from .game_commands import parse_log
+from .models import DungeonLog, RiftRaidLog, WorldBossLog, QueuedLog
+from .reports.generate import LEVEL_REPORT_MODELS, GRADE_REPORT_MODELS, get_report_levels, generate_level_report
+
+LEVEL_REPORT_SOFT_TIME_LIMIT = 20 * 60
+LEVEL_REPORT_MAX_RETRIES = 2
+LOG_QUEUE_BATCH_SIZE = 200
+LOG_QUEUE_MAX_SECONDS = 50
+
+
+@shared_task
+def generate_all_reports(incremental=True):
+    # One subtask per log model and level so levels generate in parallel across workers.
+    # Incremental level reports only aggregate logs received since the previous run.
+    started_on = timezone.now().isoformat()
+    subtasks = [
+        generate_report_for_level.s(model._meta.model_name, level.pk, incremental)
+        for model in [*LEVEL_REPORT_MODELS, *GRADE_REPORT_MODELS]
+        for level in get_report_levels(model)
+    ]
+
+    if not subtasks:
+        return record_report_run([], started_on)
+
+    result = chord(subtasks)(record_report_run.s(started_on))
+    return {'subtasks': len(subtasks), 'callback': result.id}
+
+
+# No hard time limit: a worker killed by one fails the chord, so the callback would not run for any other level
+@shared_task(
+    bind=True,
+    soft_time_limit=LEVEL_REPORT_SOFT_TIME_LIMIT,
+    max_retries=LEVEL_REPORT_MAX_RETRIES,
+    default_retry_delay=60,
+)
+def generate_report_for_level(self, model_name, level_id, incremental=True):
+    started = perf_counter()
+    result = {
+        'model': model_name,
+        'level': level_id,
+        'retries': self.request.retries,
+        'error': None,
+    }
+
+    # Errors are returned instead of raised so one failed level does not prevent the chord callback from running
+    try:
+        generate_level_report(apps.get_model('data_log', model_name), Level.objects.get(pk=level_id), incremental=incremental)
+    except SoftTimeLimitExceeded:
+        # Not retried - it would most likely time out again
+        result['error'] = 'Time limit exceeded'
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e)
+        result['error'] = repr(e)
+
+    result['seconds'] = perf_counter() - started
+    return result
 
 
 @shared_task
-def generate_all_reports():
-    generate_dungeon_log_reports()
-    generate_rift_raid_reports()
-    generate_rift_dungeon_reports()
-    generate_world_boss_dungeon_reports()
+def record_report_run(results, started_on):
+    by_model = {}
+    for result in results:
+        model_stats = by_model.setdefault(result['model'], {'levels': 0, 'failed': 0, 'seconds': 0})
+        model_stats['levels'] += 1
+        model_stats['failed'] += result['error'] is not None
+        model_stats['seconds'] += result['seconds']
+
+    return {
+        'started_on': started_on,
+        'finished_on': timezone.now().isoformat(),
+        'levels': len(results),
+        'retries': sum(result['retries'] for result in results),
+        'seconds': sum(result['seconds'] for result in results),
+        'by_model': by_model,
+        'failed': [result for result in results if result['error'] is not None],
+        'slowest': sorted(results, key=lambda result: result['seconds'], reverse=True)[:10],
+    }
 
 
 @shared_task
@@ -28,3 +103,80 @@ def clean_incomplete_logs():
     }
 
     return result
+
+
+def _queued_log_summoners(batch):
+    # Resolve summoners for a whole batch at once, the same way LogData.create does for a single log
+    by_user = {
+        summoner.user_id: summoner
+        for summoner in Summoner.objects.filter(user_id__in={log.user_id for log in batch if log.user_id})
+    }
+    by_wizard_id = summoner_cache.get_summoners(log.wizard_id for log in batch if not log.user_id)
+
+    return {
+        log.pk: by_user.get(log.user_id) if log.user_id else by_wizard_id[log.wizard_id]
+        for log in batch
+    }
+
+
+def _claim_queued_logs(batch_size, busy_wizard_ids):
+    # Lock the next batch of queued logs. Every queued log of each wizard in the batch is claimed with it, so a
+    # wizard's logs are never parsed by two workers at once or out of order, and a batch can exceed batch_size by the
+    # logs of its wizards. Wizards with logs locked by another worker are added to busy_wizard_ids and left to it.
+    # Must be called in a transaction.
+    while True:
+        wizard_ids = {
+            log.wizard_id for log in
+            QueuedLog.objects.select_for_update(skip_locked=True).exclude(wizard_id__in=busy_wizard_ids)[:batch_size]
+        }
+        if not wizard_ids:
+            return []
+
+        batch = list(QueuedLog.objects.select_for_update(skip_locked=True).filter(wizard_id__in=wizard_ids))
+        locked = Counter(log.wizard_id for log in batch)
+        busy_wizard_ids.update(
+            wizard_id for wizard_id, queued in QueuedLog.objects.filter(
+                wizard_id__in=wizard_ids
+            ).order_by().values_list('wizard_id').annotate(Count('pk'))
+            if queued != locked[wizard_id]
+        )
+
+        batch = [log for log in batch if log.wizard_id not in busy_wizard_ids]
+        if batch:
+            return batch
+
+
+@shared_task
+def process_log_queue(batch_size=LOG_QUEUE_BATCH_SIZE, max_seconds=LOG_QUEUE_MAX_SECONDS):
+    # Drain logs queued by LogData.create in async ingestion mode, oldest first so start and result logs of the same
+    # battle are parsed in order. Batches are claimed with SKIP LOCKED so several workers can drain the queue at once,
+    # each claiming whole wizards so that a wizard's logs are still parsed one at a time in the order received.
+    started = perf_counter()
+    result = {'parsed': 0, 'invalid': 0, 'failed': 0, 'batches': 0}
+    busy_wizard_ids = set()
+
+    while perf_counter() - started < max_seconds:
+        with transaction.atomic():
+            batch = _claim_queued_logs(batch_size, busy_wizard_ids)
+            if not batch:
+                break
+
+            summoners = _queued_log_summoners(batch)
+            for queued_log in batch:
+                try:
+                    with transaction.atomic():
+                        valid = parse_log(summoners[queued_log.pk], queued_log.data)
+                except Exception:
+                    # Admins have already been mailed the log data. Drop it so it can't block the queue.
+                    result['failed'] += 1
+                else:
+                    result['parsed' if valid else 'invalid'] += 1
+
+            QueuedLog.objects.filter(pk__in=[queued_log.pk for queued_log in batch]).delete()
+            result['batches'] += 1
+
+    result['remaining'] = QueuedLog.objects.count()
+    result['busy_wizards'] = len(busy_wizard_ids)
+    result['summoner_cache'] = dict(summoner_cache.stats)
+    result['seconds'] = perf_counter() - started
+    return result
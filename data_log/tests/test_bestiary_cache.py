@@ -0,0 +1,114 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from bestiary.models import Dungeon, Level, GameItem
+from data_log import models
+from data_log.bestiary_cache import bestiary_cache, VERSION_CACHE_KEY
+from .test_log_views import BaseLogTest
+
+BESTIARY_TABLES = ('bestiary_gameitem', 'bestiary_monster', 'bestiary_level', 'bestiary_dungeon')
+
+
+class BestiaryCacheTests(BaseLogTest):
+    fixtures = ['test_game_items', 'test_levels', 'test_summon_monsters']
+
+    def _bestiary_queries(self, queries):
+        return [query for query in queries if any(f'FROM "{table}"' in query['sql'] for table in BESTIARY_TABLES)]
+
+    def test_no_bestiary_queries_once_loaded(self):
+        self._do_log('BattleDungeonResult_V2/giants_b10_rune_drop.json')
+
+        for filename in [
+            'BattleDungeonResult_V2/giants_b10_rune_drop.json',
+            'BattleDungeonResult_V2/dragon_b10_rune_drop.json',
+            'BattleDungeonResult_V2/hall_of_light_b1_howl_secret_dungeon_drop.json',
+            'BattleRiftDungeonResult/fire_beast_sss_transmog_stone.json',
+        ]:
+            with CaptureQueriesContext(connection) as queries:
+                self._do_log(filename)
+            self.assertEqual(self._bestiary_queries(queries), [], filename)
+
+        self.assertEqual(models.DungeonLog.objects.count(), 4)
+        self.assertEqual(models.DungeonSecretDungeonDrop.objects.count(), 1)
+
+    def test_same_errors_as_queryset_get(self):
+        with self.assertRaises(Level.DoesNotExist):
+            bestiary_cache.level(Dungeon.CATEGORY_CAIROS, 1, dungeon_com2us_id=-1)
+        with self.assertRaises(GameItem.DoesNotExist):
+            bestiary_cache.game_item(GameItem.CATEGORY_CURRENCY, -1)
+
+    def test_bestiary_edit_invalidates(self):
+        bestiary_cache.refresh()
+        mana = bestiary_cache.game_item(GameItem.CATEGORY_CURRENCY, name='Mana')
+
+        mana.name = 'Renamed Mana'
+        mana.save()
+
+        self.assertEqual(bestiary_cache.game_item(GameItem.CATEGORY_CURRENCY, mana.com2us_id).name, 'Renamed Mana')
+        with self.assertRaises(GameItem.DoesNotExist):
+            bestiary_cache.game_item(GameItem.CATEGORY_CURRENCY, name='Mana')
+
+    def test_new_version_from_other_process_reloads(self):
+        bestiary_cache.refresh()
+        bestiary_cache.game_item(GameItem.CATEGORY_CURRENCY, name='Mana')
+
+        cache.set(VERSION_CACHE_KEY, 'updated elsewhere', None)
+        bestiary_cache.refresh()
+
+        with CaptureQueriesContext(connection) as queries:
+            bestiary_cache.game_item(GameItem.CATEGORY_CURRENCY, name='Mana')
+        self.assertEqual(len(self._bestiary_queries(queries)), 1)
+
+
+class BestiaryCacheTransactionTests(TransactionTestCase):
+    # Invalidation waits for the commit, which a TestCase never reaches
+
+    def setUp(self):
+        cache.clear()
+        self.item = GameItem.objects.create(category=GameItem.CATEGORY_CURRENCY, com2us_id=1, name='Mana')
+        bestiary_cache.refresh()
+        self.version = bestiary_cache.version
+
+    def _cached_name(self):
+        return bestiary_cache._tables['game_items'][0][GameItem.CATEGORY_CURRENCY, 1][0].name
+
+    def test_edit_invalidates_on_commit(self):
+        with transaction.atomic():
+            self.item.name = 'Renamed Mana'
+            self.item.save()
+
+            self.assertEqual(bestiary_cache.game_item(GameItem.CATEGORY_CURRENCY, 1).name, 'Renamed Mana')
+            self.assertNotIn('game_items', bestiary_cache._tables)
+            self.assertEqual(cache.get(VERSION_CACHE_KEY), self.version)
+
+        self.assertNotEqual(cache.get(VERSION_CACHE_KEY), self.version)
+        self.assertEqual(bestiary_cache.game_item(GameItem.CATEGORY_CURRENCY, 1).name, 'Renamed Mana')
+        self.assertEqual(self._cached_name(), 'Renamed Mana')
+
+    def test_rolled_back_edit_not_cached(self):
+        with transaction.atomic():
+            self.item.name = 'Renamed Mana'
+            self.item.save()
+            bestiary_cache.game_item(GameItem.CATEGORY_CURRENCY, 1)
+            transaction.set_rollback(True)
+
+        self.assertEqual(cache.get(VERSION_CACHE_KEY), self.version)
+        self.assertEqual(bestiary_cache.game_item(GameItem.CATEGORY_CURRENCY, 1).name, 'Mana')
+
+        # Kept again from the next parsed log on
+        bestiary_cache.refresh()
+        bestiary_cache.game_item(GameItem.CATEGORY_CURRENCY, 1)
+        self.assertEqual(self._cached_name(), 'Mana')
+
+    def test_invalidated_once_per_transaction(self):
+        with mock.patch('data_log.bestiary_cache.cache.set', wraps=cache.set) as cache_set:
+            with transaction.atomic():
+                for name in ['Renamed Mana', 'Mana']:
+                    self.item.name = name
+                    self.item.save()
+
+        self.assertEqual(cache_set.call_count, 1)
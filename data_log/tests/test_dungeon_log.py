@@ -1,3 +1,8 @@
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
 from bestiary.models import Level, GameItem
 from data_log import models
 from .test_log_views import BaseLogTest
@@ -173,6 +178,25 @@ class ScenarioLogTests(BaseLogTest):
         self.assertTrue(log.items.filter(item__category=GameItem.CATEGORY_CURRENCY, item__com2us_id=103).exists())
         self.assertTrue(log.items.filter(item__category=GameItem.CATEGORY_CRAFT_STUFF, item__com2us_id=1003).exists())
 
+    def test_one_insert_per_drop_type(self):
+        with CaptureQueriesContext(connection) as queries:
+            self._do_log('BattleDungeonResult_V2/giants_b10_harmony_drop.json')
+
+        log = models.DungeonLog.objects.first()
+        self.assertEqual(log.items.count(), 4)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT')]
+
+        # The log and one for all item drops
+        self.assertEqual(len(inserts), 2)
+
+    def test_failed_parse_saves_nothing(self):
+        with mock.patch.object(models.DungeonLog, 'parse_changed_item_list', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                self._do_log('BattleDungeonResult_V2/giants_b10_rune_drop.json')
+
+        self.assertEqual(models.DungeonLog.objects.count(), 0)
+        self.assertEqual(models.DungeonItemDrop.objects.count(), 0)
+
 
 class DimensionHoleTests(BaseLogTest):
     fixtures = ['test_game_items', 'test_levels']
@@ -0,0 +1,56 @@
+import copy
+import json
+import os
+
+from django.test import TestCase
+from jsonschema import Draft4Validator
+
+from data_log.game_commands import active_log_commands, compile_validator
+
+
+class CompiledValidatorTests(TestCase):
+    def _game_api_logs(self):
+        for dirpath, dirnames, filenames in os.walk('data_log/tests/game_api_data'):
+            for filename in filenames:
+                with open(os.path.join(dirpath, filename)) as f:
+                    log_data = json.load(f)['data']
+
+                if log_data['request']['command'] in active_log_commands:
+                    yield filename, log_data
+
+    def _mutations(self, log_data):
+        # Each required key removed, and each value replaced with a value of a different type
+        yield log_data
+        for key in ('request', 'response'):
+            for param in list(log_data[key].keys()):
+                missing = copy.deepcopy(log_data)
+                del missing[key][param]
+                yield missing
+
+                for wrong_type in (None, True, 1, 'string', [], {}):
+                    mutated = copy.deepcopy(log_data)
+                    mutated[key][param] = wrong_type
+                    yield mutated
+
+    def test_same_result_as_draft4_validator(self):
+        for filename, log_data in self._game_api_logs():
+            api_command = active_log_commands[log_data['request']['command']]
+            for mutated in self._mutations(log_data):
+                self.assertEqual(api_command.validate(mutated), api_command.validator.is_valid(mutated), filename)
+
+    def test_type_checks(self):
+        schema = {'type': 'object', 'properties': {'value': {'type': ['null', 'number']}}, 'required': ['value']}
+        validate = compile_validator(schema)
+
+        for value in [None, 1, 1.5, True, 'string', [], {}]:
+            self.assertEqual(validate({'value': value}), Draft4Validator(schema).is_valid({'value': value}), value)
+        self.assertFalse(validate({}))
+        self.assertFalse(validate([]))
+
+    def test_unsupported_keywords_fall_back_to_draft4(self):
+        schema = {'type': 'object', 'properties': {'value': {'type': 'integer', 'minimum': 5}}}
+        validate = compile_validator(schema)
+
+        self.assertTrue(validate({'value': 5}))
+        self.assertFalse(validate({'value': 4}))
+        self.assertFalse(validate({'value': 'string'}))
@@ -1,13 +1,19 @@
 import json
+import threading
 
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.authtoken.models import Token
 from rest_framework.reverse import reverse
 from rest_framework.test import APIRequestFactory
 
-from data_log import views, models
+from data_log import views, models, tasks
+from data_log.bestiary_cache import bestiary_cache
 from data_log.game_commands import accepted_api_params
+from herders import summoner_cache
 from herders.models import Summoner
 
 
@@ -15,6 +21,12 @@ class BaseLogTest(TestCase):
     def setUp(self):
         self.factory = APIRequestFactory()
 
+        # Cached summoner IDs would outlive the rolled back test data
+        cache.clear()
+
+        # Fixtures are loaded in the test transaction, which never commits to invalidate the bestiary cache
+        bestiary_cache.invalidate()
+
     def _do_log(self, log_data_filename, *args, **kwargs):
         with open(f'data_log/tests/game_api_data/{log_data_filename}', 'r') as f:
             view = views.LogData.as_view({'post': 'create'})
@@ -154,6 +166,19 @@ class LogDataViewTests(BaseLogTest):
         self.assertEqual(log.summoner, u.summoner)
         self.assertEqual(log.wizard_id, 123)
 
+    def test_wizard_id_lookup_cached(self):
+        u = User.objects.create(username='t')
+        Summoner.objects.create(user=u, com2us_id=123)
+        self._do_log('SummonUnit/scroll_unknown_qty1.json')
+        hits = summoner_cache.stats['hits']
+
+        with CaptureQueriesContext(connection) as queries:
+            self._do_log('SummonUnit/scroll_unknown_qty1.json')
+
+        self.assertEqual(summoner_cache.stats['hits'], hits + 1)
+        self.assertFalse([query for query in queries if 'herders_summoner' in query['sql']])
+        self.assertTrue(all(log.summoner == u.summoner for log in models.SummonLog.objects.all()))
+
     def test_mismatched_accepted_api_params_version(self):
         view = views.LogData.as_view({'post': 'create'})
         with open(f'data_log/tests/game_api_data/SummonUnit/scroll_unknown_qty1.json', 'r') as f:
@@ -166,3 +191,152 @@ class LogDataViewTests(BaseLogTest):
             )
             response = view(request)
             self.assertTrue(response.data.get('reinit'))
+
+
+@override_settings(LOG_INGESTION_ASYNC=True)
+class AsyncLogIngestionTests(BaseLogTest):
+    fixtures = ['test_summon_monsters', 'test_game_items']
+
+    def test_log_queued_until_processed(self):
+        response = self._do_log('SummonUnit/scroll_unknown_qty1.json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data.get('detail'), 'Log OK')
+        self.assertIsNone(response.data.get('reinit'))
+        self.assertEqual(models.QueuedLog.objects.count(), 1)
+        self.assertEqual(models.SummonLog.objects.count(), 0)
+
+        result = tasks.process_log_queue()
+
+        self.assertEqual(result['parsed'], 1)
+        self.assertEqual(models.QueuedLog.objects.count(), 0)
+        self.assertEqual(models.SummonLog.objects.count(), 1)
+
+    def test_invalid_envelope_rejected(self):
+        view = views.LogData.as_view({'post': 'create'})
+        request = self.factory.post(
+            reverse('data_log:log-upload-list'),
+            data={'data': {'request': {'command': 'FakeApiCommand', 'wizard_id': 123}, 'response': {}}},
+            format='json',
+        )
+        response = view(request)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.data.get('reinit'))
+        self.assertEqual(models.QueuedLog.objects.count(), 0)
+
+    def test_failed_validation_saves_full_log(self):
+        with open(f'data_log/tests/game_api_data/SummonUnit/scroll_unknown_qty1.json', 'r') as f:
+            data = get_requested_keys(json.load(f))
+
+        del data['data']['request']['mode']  # Delete required key for test
+        view = views.LogData.as_view({'post': 'create'})
+        response = view(self.factory.post(reverse('data_log:log-upload-list'), data=data, format='json'))
+        self.assertEqual(response.status_code, 200)
+
+        result = tasks.process_log_queue()
+
+        self.assertEqual(result['invalid'], 1)
+        self.assertEqual(models.FullLog.objects.count(), 1)
+        self.assertEqual(models.SummonLog.objects.count(), 0)
+
+    def test_summoners_resolved(self):
+        wizard_user = User.objects.create(username='wizard')
+        Summoner.objects.create(user=wizard_user, com2us_id=123)
+        token_user = User.objects.create(username='token')
+        Summoner.objects.create(user=token_user)
+        token = Token.objects.create(user=token_user)
+
+        self._do_log('SummonUnit/scroll_unknown_qty1.json')
+        self._do_log('SummonUnit/scroll_unknown_qty1.json', HTTP_AUTHORIZATION=f'Token {token.key}')
+        tasks.process_log_queue()
+
+        logs = models.SummonLog.objects.order_by('pk')
+        self.assertEqual(logs[0].summoner, wizard_user.summoner)
+        self.assertEqual(logs[1].summoner, token_user.summoner)
+
+
+class QueuedLogClaimTests(TransactionTestCase):
+    # Claims by another worker need their own connection and committed rows
+
+    def setUp(self):
+        for wizard_id in [1, 2, 1, 3, 2, 1]:
+            models.QueuedLog.objects.create(command='SummonUnit', wizard_id=wizard_id, data={})
+        self.logs = list(models.QueuedLog.objects.all())
+
+    def _claim(self, batch_size, busy_wizard_ids):
+        with transaction.atomic():
+            return [log.pk for log in tasks._claim_queued_logs(batch_size, busy_wizard_ids)]
+
+    def test_claims_whole_wizards_in_order(self):
+        self.assertEqual(
+            self._claim(2, set()),
+            [log.pk for log in self.logs if log.wizard_id in (1, 2)]
+        )
+
+    def test_wizard_claimed_by_other_worker_skipped(self):
+        claimed = threading.Event()
+        done = threading.Event()
+
+        def other_worker():
+            # Holds the first log of wizard 1, as a worker parsing it would
+            try:
+                with transaction.atomic():
+                    list(models.QueuedLog.objects.select_for_update().filter(pk=self.logs[0].pk))
+                    claimed.set()
+                    done.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        try:
+            self.assertTrue(claimed.wait(10))
+            busy_wizard_ids = set()
+            self.assertEqual(
+                self._claim(2, busy_wizard_ids),
+                [log.pk for log in self.logs if log.wizard_id == 2]
+            )
+            self.assertEqual(busy_wizard_ids, {1})
+        finally:
+            done.set()
+            thread.join()
+
+
+class SummonerCacheInvalidationTests(TransactionTestCase):
+    # Wizard IDs are invalidated when the change commits, which a TestCase never reaches
+
+    def setUp(self):
+        cache.clear()
+
+    def test_wizard_id_cache_invalidated(self):
+        # Cached as not belonging to any summoner
+        self.assertIsNone(summoner_cache.get_summoner_id(123))
+
+        u = User.objects.create(username='t')
+        summoner = Summoner.objects.create(user=u, com2us_id=123)
+        self.assertEqual(summoner_cache.get_summoner_id(123), summoner.pk)
+
+        summoner = Summoner.objects.get(pk=summoner.pk)
+        summoner.com2us_id = 456
+        summoner.save()
+        self.assertIsNone(summoner_cache.get_summoner_id(123))
+        self.assertEqual(summoner_cache.get_summoners([123, 456]), {123: None, 456: summoner})
+
+        summoner.delete()
+        self.assertIsNone(summoner_cache.get_summoner_id(456))
+
+    def test_invalidated_on_commit(self):
+        u = User.objects.create(username='t')
+        summoner = Summoner.objects.create(user=u, com2us_id=123)
+        self.assertEqual(summoner_cache.get_summoner_id(123), summoner.pk)
+
+        with transaction.atomic():
+            summoner.com2us_id = 456
+            summoner.save()
+
+            # Still cached until the change commits
+            self.assertEqual(summoner_cache.get_summoner_id(123), summoner.pk)
+
+        self.assertIsNone(summoner_cache.get_summoner_id(123))
+        self.assertEqual(summoner_cache.get_summoner_id(456), summoner.pk)
@@ -0,0 +1,324 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.db.models import Min, Max
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from bestiary.models import Level
+from data_log import models, tasks
+from data_log.management.commands.benchmark_drop_report import queryset_drop_report
+from data_log.management.commands.benchmark_slice_records import queryset_slice_records
+from data_log.reports.aggregate import DropAggregate, fold_logs
+from data_log.reports.generate import drop_report, grade_summary_report, \
+    generate_dungeon_log_reports, generate_level_report
+from data_log.util import slice_records
+from .test_log_views import BaseLogTest
+
+DUNGEON_LOGS = [
+    'BattleDungeonResult_V2/giants_b10_rune_drop.json',
+    'BattleDungeonResult_V2/giants_b10_harmony_drop.json',
+    'BattleDungeonResult_V2/giants_b10_failed.json',
+    'BattleDungeonResult_V2/dragon_b10_rune_drop.json',
+    'BattleDungeonResult_V2/hall_of_dark_small_essence_drop.json',
+    'BattleDungeonResult_V2/hall_of_light_b1_howl_secret_dungeon_drop.json',
+    'BattleDungeonResult_V2/punisher_b5_artifact_drop.json',
+    'BattleDungeonResult_V2/punisher_b5_conversion_stone_drop.json',
+    'BattleDimensionHoleDungeonResult_V2/sanctuary_b3_rune_drop.json',
+    'BattleDimensionHoleDungeonResult_V2/forest_b5_grind_drop.json',
+]
+
+
+def _normalize(report):
+    # Tables grouped without an ordering come back from the database in arbitrary order
+    for drop_type in ('monsters', 'monster_pieces', 'secret_dungeons'):
+        table = report['summary']['table'].get(drop_type)
+        if table:
+            for row in table:
+                if drop_type == 'secret_dungeons':
+                    # Original report sums the drop pk instead of the quantity
+                    row.pop('qty_per_100')
+            table.sort(key=lambda row: (row['name'], row['stars']))
+
+    # Ties when ordering by count are also in arbitrary order
+    report['summary']['chart'].sort(key=lambda row: (-row['count'], row['name']))
+    if report.get('items'):
+        report['items'].sort(key=lambda row: (-row['count'], row['name']))
+    return report
+
+
+class ReportTestCase(BaseLogTest):
+    fixtures = ['test_game_items', 'test_levels', 'test_summon_monsters']
+
+    def _log_dungeons(self, repeat=3, start=None):
+        for _ in range(repeat):
+            for filename in DUNGEON_LOGS:
+                self._do_log(filename)
+
+        # Spread logs out over the last few hours so they fall into different report buckets
+        start = start or timezone.now()
+        for idx, log in enumerate(models.DungeonLog.objects.filter(timestamp__lt=start - timedelta(days=365))):
+            log.timestamp = start - timedelta(minutes=17 * idx)
+            log.save()
+
+
+class DropAggregateTests(ReportTestCase):
+    def test_matches_drop_report(self):
+        self._log_dungeons()
+
+        for level in Level.objects.filter(pk__in=models.DungeonLog.objects.values_list('level', flat=True)):
+            qs = models.DungeonLog.objects.filter(level=level, success=True)
+            expected = queryset_drop_report(qs)
+            actual = drop_report(qs)
+            self.assertEqual(_normalize(actual), _normalize(expected), level)
+
+    def test_matches_drop_report_with_min_count(self):
+        self._log_dungeons()
+        qs = models.DungeonLog.objects.filter(success__isnull=False)
+
+        for kwargs in [{'min_count': 0}, {'min_count': 4, 'include_currency': True, 'exclude_social_points': True}]:
+            self.assertEqual(_normalize(drop_report(qs, **kwargs)), _normalize(queryset_drop_report(qs, **kwargs)))
+
+    def test_empty_report(self):
+        qs = models.DungeonLog.objects.none()
+        self.assertEqual(drop_report(qs), queryset_drop_report(qs))
+
+    def test_query_count_independent_of_log_count(self):
+        self._log_dungeons(repeat=1)
+        qs = models.DungeonLog.objects.filter(success=True)
+        with CaptureQueriesContext(connection) as few_logs:
+            drop_report(qs)
+
+        self._log_dungeons(repeat=3)
+        with CaptureQueriesContext(connection) as more_logs:
+            drop_report(qs)
+
+        self.assertEqual(len(few_logs), len(more_logs))
+
+        # One query for the logs, one per drop table, and one per related table for names and icons
+        self.assertLessEqual(len(more_logs), 1 + len(DropAggregate.for_model(models.DungeonLog).drop_types) + 3)
+
+    def test_merged_buckets_match_single_aggregate(self):
+        self._log_dungeons()
+        qs = models.DungeonLog.objects.filter(level__dungeon__com2us_id=8001, level__floor=10)
+
+        merged = DropAggregate.for_model(models.DungeonLog)
+        for aggregate in fold_logs(qs, bucket=lambda timestamp: timestamp.hour).values():
+            merged.merge(DropAggregate.from_json(aggregate.to_json(), aggregate.start_timestamp, aggregate.end_timestamp))
+
+        self.assertEqual(merged.log_count, qs.count())
+        self.assertEqual(merged.report(), fold_logs(qs)[None].report())
+
+
+class IncrementalLevelReportTests(ReportTestCase):
+    def _latest_reports(self):
+        return {
+            report.level_id: report
+            for report in models.LevelReport.objects.order_by('generated_on', 'pk')
+        }
+
+    def test_matches_full_report(self):
+        self._log_dungeons()
+        self._assert_matches_full_report()
+
+    def test_quiet_level_matches_full_report(self):
+        # No logs within the report timespan, so neither mode reports the level
+        self._log_dungeons(start=timezone.now() - timedelta(days=30))
+        self._assert_matches_full_report()
+
+        self.assertFalse(models.LevelReport.objects.exists())
+
+    def test_late_log_matches_full_report(self):
+        self._log_dungeons()
+        generate_dungeon_log_reports(incremental=True)
+
+        # Uploaded after the last report, but played between logs that were already aggregated
+        self._do_log(DUNGEON_LOGS[0])
+        late_log = models.DungeonLog.objects.latest('pk')
+        timestamps = models.DungeonLog.objects.filter(
+            level=late_log.level, success=True
+        ).exclude(pk=late_log.pk).aggregate(Min('timestamp'), Max('timestamp'))
+        late_log.timestamp = timestamps['timestamp__min'] + (timestamps['timestamp__max'] - timestamps['timestamp__min']) / 2
+        late_log.save()
+
+        self._assert_matches_full_report()
+
+    def _assert_matches_full_report(self):
+        generate_dungeon_log_reports()
+        full_reports = self._latest_reports()
+        generate_dungeon_log_reports(incremental=True)
+        incremental_reports = self._latest_reports()
+
+        self.assertEqual(full_reports.keys(), incremental_reports.keys())
+        for level_id, report in full_reports.items():
+            incremental = incremental_reports[level_id]
+            self.assertNotEqual(report.pk, incremental.pk)
+            self.assertEqual(incremental.log_count, report.log_count)
+            self.assertEqual(incremental.unique_contributors, report.unique_contributors)
+            self.assertEqual(incremental.start_timestamp, report.start_timestamp)
+            self.assertEqual(incremental.end_timestamp, report.end_timestamp)
+            self.assertEqual(_normalize(incremental.report), _normalize(report.report))
+
+    def test_only_new_logs_are_folded(self):
+        self._log_dungeons(start=timezone.now() - timedelta(hours=12))
+        generate_dungeon_log_reports(incremental=True)
+        first_reports = self._latest_reports()
+
+        self._log_dungeons(repeat=1)
+        with mock.patch('data_log.reports.generate.fold_logs', wraps=fold_logs) as fold:
+            generate_dungeon_log_reports(incremental=True)
+
+        for call in fold.call_args_list:
+            self.assertEqual(call[0][0].filter(timestamp__lte=timezone.now() - timedelta(hours=12)).count(), 0)
+
+        for level_id, report in self._latest_reports().items():
+            expected = models.DungeonLog.objects.filter(level_id=level_id, success=True).count()
+            self.assertEqual(report.log_count, expected)
+            self.assertGreater(report.log_count, first_reports[level_id].log_count)
+
+    def test_aged_out_buckets_deleted(self):
+        self._log_dungeons(repeat=1, start=timezone.now() - timedelta(days=3))
+        generate_dungeon_log_reports(incremental=True)
+        old_buckets = list(models.LevelReportBucket.objects.values_list('pk', flat=True))
+        self.assertTrue(old_buckets)
+
+        self._log_dungeons(repeat=1)
+        with mock.patch('data_log.reports.generate.LEVEL_REPORT_MINIMUM_COUNT', 1), \
+                mock.patch('data_log.reports.generate.LEVEL_REPORT_TIMESPAN', timedelta(days=1)):
+            generate_dungeon_log_reports(incremental=True)
+
+        self.assertFalse(models.LevelReportBucket.objects.filter(pk__in=old_buckets).exists())
+        report = models.LevelReport.objects.order_by('-pk').first()
+        self.assertEqual(
+            report.log_count,
+            models.DungeonLog.objects.filter(
+                level=report.level,
+                success=True,
+                timestamp__gte=timezone.now() - timedelta(days=2),
+            ).count()
+        )
+
+
+class GradeSummaryReportTests(BaseLogTest):
+    fixtures = ['test_game_items', 'test_levels']
+
+    RIFT_LOGS = [
+        'BattleRiftDungeonResult/fire_beast_b.json',
+        'BattleRiftDungeonResult/fire_beast_sss_transmog_stone.json',
+        'BattleRiftDungeonResult/water_beast_a.json',
+        'BattleRiftDungeonResult/water_beast_fail.json',
+    ]
+
+    def test_report_by_grade(self):
+        for filename in self.RIFT_LOGS * 2:
+            self._do_log(filename)
+
+        qs = models.RiftDungeonLog.objects.all()
+        report = grade_summary_report(qs, models.RiftDungeonLog.GRADE_CHOICES)
+        self.assertEqual([grade['grade'] for grade in report], [desc for grade, desc in models.RiftDungeonLog.GRADE_CHOICES])
+
+        for grade, grade_report in zip(models.RiftDungeonLog.GRADE_CHOICES, report):
+            grade_logs = qs.filter(grade=grade[0])
+            self.assertEqual(grade_report['log_count'], grade_logs.count())
+
+            for drop in grade_report['drops']:
+                if drop['type'] == 'item':
+                    drops = models.RiftDungeonItemDrop.objects.filter(log__in=grade_logs, item__name=drop['name'])
+                    self.assertEqual(drop['count'], drops.count())
+                    self.assertEqual(drop['drop_chance'], drops.count() / (grade_logs.count() or 1) * 100)
+
+    def test_query_count_independent_of_drops(self):
+        self._do_log(self.RIFT_LOGS[0])
+        with CaptureQueriesContext(connection) as few_drops:
+            grade_summary_report(models.RiftDungeonLog.objects.all(), models.RiftDungeonLog.GRADE_CHOICES)
+
+        for filename in self.RIFT_LOGS:
+            self._do_log(filename)
+        with CaptureQueriesContext(connection) as more_drops:
+            grade_summary_report(models.RiftDungeonLog.objects.all(), models.RiftDungeonLog.GRADE_CHOICES)
+
+        self.assertEqual(len(few_drops), len(more_drops))
+
+
+class GenerateAllReportsTaskTests(ReportTestCase):
+    def test_report_per_level(self):
+        self._log_dungeons(repeat=1)
+        levels = set(models.DungeonLog.objects.values_list('level', flat=True))
+
+        result = tasks.generate_all_reports.apply(kwargs={'incremental': False}).get()
+
+        self.assertEqual(result['subtasks'], len(levels))
+        self.assertEqual(set(models.LevelReport.objects.values_list('level', flat=True)), levels)
+
+    def test_failed_level_does_not_stop_others(self):
+        self._log_dungeons(repeat=1)
+        failed_level = models.DungeonLog.objects.filter(success=True).first().level
+
+        def fail_one_level(model, level, **kwargs):
+            if level == failed_level:
+                raise ValueError('Failed')
+            return generate_level_report(model, level, **kwargs)
+
+        with mock.patch('data_log.tasks.generate_level_report', side_effect=fail_one_level), \
+                mock.patch.object(tasks.generate_report_for_level, 'max_retries', 0), \
+                mock.patch('data_log.tasks.record_report_run.run', wraps=tasks.record_report_run.run) as record_run:
+            tasks.generate_all_reports.apply(kwargs={'incremental': False})
+
+        stats = tasks.record_report_run.run(*record_run.call_args[0])
+        self.assertEqual([result['level'] for result in stats['failed']], [failed_level.pk])
+        self.assertEqual(stats['levels'], models.DungeonLog.objects.values('level').distinct().count())
+        self.assertFalse(models.LevelReport.objects.filter(level=failed_level).exists())
+        self.assertTrue(models.LevelReport.objects.exclude(level=failed_level).exists())
+
+
+class SliceRecordsTests(ReportTestCase):
+    SLICE_KWARGS = [
+        {},
+        {'report_timespan': timedelta(days=2)},
+        {'minimum_count': 5},
+        {'minimum_count': 5, 'report_timespan': timedelta(days=2)},
+        {'minimum_count': 50, 'report_timespan': timedelta(days=2)},
+        {'minimum_count': 5, 'report_timespan': timedelta(hours=1)},
+        {'maximum_count': 5},
+        {'maximum_count': 5, 'report_timespan': timedelta(days=2)},
+        {'maximum_count': 50, 'report_timespan': timedelta(days=2)},
+    ]
+
+    def _create_logs(self, hours_ago):
+        level = Level.objects.first()
+        now = timezone.now()
+        models.DungeonLog.objects.bulk_create([
+            models.DungeonLog(wizard_id=1, level=level, success=True, timestamp=now - timedelta(hours=hours))
+            for hours in hours_ago
+        ])
+        return models.DungeonLog.objects.filter(level=level, success=True)
+
+    def _assert_same_records(self, qs):
+        for kwargs in self.SLICE_KWARGS:
+            self.assertEqual(
+                set(slice_records(qs, **kwargs).values_list('pk', flat=True)),
+                set(queryset_slice_records(qs, **kwargs).values_list('pk', flat=True)),
+                kwargs,
+            )
+
+    def test_no_records(self):
+        self._assert_same_records(models.DungeonLog.objects.all())
+
+    def test_records_inside_and_outside_timespan(self):
+        self._assert_same_records(self._create_logs(range(0, 24 * 7, 5)))
+
+    def test_records_only_outside_timespan(self):
+        self._assert_same_records(self._create_logs(range(72, 200, 3)))
+
+    def test_duplicate_timestamps(self):
+        self._assert_same_records(self._create_logs([10] * 8 + [30] * 8 + [60] * 8))
+
+    def test_single_query(self):
+        qs = self._create_logs(range(0, 24 * 7, 5))
+
+        with CaptureQueriesContext(connection) as queries:
+            slice_records(qs, minimum_count=50, report_timespan=timedelta(days=2)).count()
+
+        # The window boundary, then the count itself
+        self.assertEqual(len(queries), 2)
@@ -1,9 +1,24 @@
 from math import trunc
 
+from django.db.models import IntegerField, Value
 from django.utils import timezone
 
 
+def _window_timestamps(qs, *positions):
+    # Timestamps of the records at the given 1-based positions counting from the newest, fetched in one query.
+    # Each position is a LIMIT 1 OFFSET n read that can walk an index ending in timestamp backwards.
+    ordered = qs.filter(timestamp__isnull=False).order_by('-timestamp', '-pk')
+    reads = [
+        ordered.annotate(position=Value(position, output_field=IntegerField())).values_list('position', 'timestamp')[position - 1:position]
+        for position in positions
+    ]
+    timestamps = dict(reads[0].union(*reads[1:], all=True) if len(reads) > 1 else reads[0])
+    return [timestamps.get(position) for position in positions]
+
+
 def slice_records(qs, *args, **kwargs):
+    # Records within report_timespan, extended back to the newest minimum_count records or cut down to the newest
+    # maximum_count records
     report_timespan = kwargs.get('report_timespan')
     minimum_count = kwargs.get('minimum_count')
     maximum_count = kwargs.get('maximum_count')
@@ -11,29 +26,28 @@ def slice_records(qs, *args, **kwargs):
     if minimum_count and maximum_count:
         raise ValueError('Cannot use minimum_count and maximum_count at the same time.')
 
-    if qs.count() == 0:
-        return qs
+    timespan_start = timezone.now() - report_timespan if report_timespan else None
 
-    if report_timespan:
-        result = qs.filter(timestamp__gte=timezone.now() - report_timespan)
-    else:
-        result = qs
+    if minimum_count and timespan_start:
+        newest, nth_newest = _window_timestamps(qs, 1, minimum_count)
+
+        # Only extended if there is at least one record within the timespan
+        if newest is not None and newest >= timespan_start:
+            if nth_newest is None:
+                # Fewer than minimum_count records in total
+                return qs.filter(timestamp__isnull=False)
 
-    if minimum_count or maximum_count:
-        num_records = result.count()
+            return qs.filter(timestamp__gte=min(timespan_start, nth_newest))
+    elif maximum_count:
+        nth_newest, = _window_timestamps(qs, maximum_count)
 
-        if num_records > 0:
-            if minimum_count and num_records < minimum_count:
-                temp_slice = qs[:minimum_count]
-                earliest_record = temp_slice[temp_slice.count() - 1]
-                result = qs.filter(timestamp__gte=earliest_record.timestamp)
+        if nth_newest is not None:
+            return qs.filter(timestamp__gte=max(timespan_start, nth_newest) if timespan_start else nth_newest)
 
-            if maximum_count and num_records > maximum_count:
-                temp_slice = qs[:maximum_count]
-                earliest_record = temp_slice[temp_slice.count() - 1]
-                result = qs.filter(timestamp__gte=earliest_record.timestamp)
+    if timespan_start:
+        return qs.filter(timestamp__gte=timespan_start)
 
-    return result
+    return qs
 
 
 def floor_to_nearest(num, multiple_of):
@@ -1,13 +1,13 @@
 import json
 
-from django.core.mail import mail_admins
+from django.conf import settings
 from rest_framework import viewsets, permissions, versioning, exceptions, parsers
 from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
-from herders.models import Summoner
-from .game_commands import active_log_commands, accepted_api_params
-from .models import FullLog
+from herders import summoner_cache
+from .game_commands import active_log_commands, accepted_api_params, parse_log
+from .models import QueuedLog
 
 
 class InvalidLogException(exceptions.APIException):
@@ -49,24 +49,24 @@ class LogData(viewsets.ViewSet):
         if api_command not in active_log_commands:
             raise InvalidLogException('Unsupported game command')
 
-        # Determine the user account providing this log
-        if request.user.is_authenticated:
-            summoner = request.user.summoner
+        if settings.LOG_INGESTION_ASYNC:
+            # Validation and parsing happen later in data_log.tasks.process_log_queue
+            QueuedLog.objects.create(
+                command=api_command,
+                wizard_id=wizard_id,
+                user=request.user if request.user.is_authenticated else None,
+                data=log_data,
+            )
         else:
-            # Attempt to get summoner instance from wizard_id in log data
-            summoner = Summoner.objects.filter(com2us_id=wizard_id).first()
-
-        # Validate log data format
-        if not active_log_commands[api_command].validate(log_data):
-            FullLog.parse(summoner, log_data)
-            raise InvalidLogException(detail='Log data failed validation')
-
-        # Parse the log
-        try:
-            active_log_commands[api_command].parse(summoner, log_data)
-        except Exception as e:
-            mail_admins('Log server error', f'Request body:\n\n{log_data}')
-            raise e
+            # Determine the user account providing this log
+            if request.user.is_authenticated:
+                summoner = request.user.summoner
+            else:
+                # Attempt to get summoner instance from wizard_id in log data
+                summoner = summoner_cache.get_summoner(wizard_id)
+
+            if not parse_log(summoner, log_data):
+                raise InvalidLogException(detail='Log data failed validation')
 
         response = {'detail': 'Log OK'}
 
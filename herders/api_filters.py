@@ -137,6 +137,7 @@ class RuneInstanceFilter(django_filters.FilterSet):
             'marked_for_sale': ['exact'],
             'has_grind': ['exact', 'lte', 'lt', 'gte', 'gt'],
             'has_gem': ['exact'],
+            **{field: ['gte', 'lte'] for field in RuneInstance.STAT_VALUE_FIELDS.values()},
         }
 
     def filter_substats(self, queryset, name, value):
@@ -0,0 +1,110 @@
+import copy
+
+from django.apps import apps
+from django.db import transaction
+
+from bestiary.models import Rune, Artifact
+from data_log.models import RuneDrop
+from .models import RuneInstance, RuneBuild, ArtifactInstance, DeferredRuneRecompute
+
+CHUNK_SIZE = 2000
+
+
+def recompute_models():
+    # Models whose derived fields can be recomputed, by label
+    models = [RuneInstance, ArtifactInstance] + [
+        model for model in apps.get_models() if issubclass(model, RuneDrop)
+    ]
+    return {model._meta.label_lower: model for model in models}
+
+
+def _update_derived_fields(obj):
+    if isinstance(obj, Rune):
+        obj.update_fields()
+    elif isinstance(obj, Artifact):
+        obj._update_values()
+
+
+class BulkRecompute:
+    # Recomputes the derived fields of every row in a queryset without calling save(). Rows are streamed in primary
+    # key order and written back in chunks with bulk_update(), each chunk in its own transaction, so a run that stops
+    # part way can be resumed after the last primary key it reported. Only the rows and fields that changed are
+    # written.
+    #
+    # Runes that changed are not saved one at a time, so the stats of the monsters they are equipped on and of the
+    # rune builds that contain them are recomputed once per chunk instead.
+
+    BATCH_SIZE = 500
+
+    def __init__(self, queryset, chunk_size=CHUNK_SIZE):
+        self.queryset = queryset.order_by('pk')
+        self.model = queryset.model
+        self.fields = self.model.DERIVED_FIELDS
+        self.chunk_size = chunk_size
+        self.checked = 0
+        self.changed = 0
+        self.last_pk = None
+
+    def run(self, after=None, on_chunk=None):
+        # on_chunk is called after each chunk is written, when last_pk is the last primary key of that chunk
+        queryset = self.queryset
+        if after is not None:
+            queryset = queryset.filter(pk__gt=after)
+
+        chunk = []
+        for obj in queryset.iterator(chunk_size=self.chunk_size):
+            chunk.append(obj)
+            if len(chunk) == self.chunk_size:
+                self._save_chunk(chunk, on_chunk)
+                chunk = []
+
+        if chunk:
+            self._save_chunk(chunk, on_chunk)
+
+    def _save_chunk(self, chunk, on_chunk):
+        changed = []
+        write_fields = set()
+        for obj in chunk:
+            # Copied since update_fields() caps substat values in place
+            stored = [copy.copy(getattr(obj, field)) for field in self.fields]
+            _update_derived_fields(obj)
+            changed_fields = [
+                field for field, value in zip(self.fields, stored) if getattr(obj, field) != value
+            ]
+            if changed_fields:
+                changed.append(obj)
+                write_fields.update(changed_fields)
+
+        with transaction.atomic():
+            if changed:
+                self.model.objects.bulk_update(changed, write_fields, batch_size=self.BATCH_SIZE)
+            if changed and self.model is RuneInstance:
+                self._recompute_rune_stats(changed)
+
+        self.checked += len(chunk)
+        self.changed += len(changed)
+        self.last_pk = chunk[-1].pk
+
+        if on_chunk is not None:
+            on_chunk(self)
+
+    def _recompute_rune_stats(self, runes):
+        recompute = DeferredRuneRecompute()
+        recompute.monster_ids.update(rune.assigned_to_id for rune in runes if rune.assigned_to_id)
+        recompute.build_ids.update(
+            RuneBuild.runes.through.objects.filter(
+                runeinstance_id__in=[rune.pk for rune in runes]
+            ).values_list('runebuild_id', flat=True)
+        )
+        recompute.run()
+
+
+def recompute_profile(summoner, chunk_size=CHUNK_SIZE):
+    # Recomputes the derived fields of a profile's runes and artifacts. Returns the number of rows checked and changed.
+    counts = {}
+    for model in [RuneInstance, ArtifactInstance]:
+        recompute = BulkRecompute(model.objects.filter(owner=summoner), chunk_size)
+        recompute.run()
+        counts[model._meta.model_name] = {'checked': recompute.checked, 'changed': recompute.changed}
+
+    return counts
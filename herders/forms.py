@@ -1231,6 +1231,19 @@ class FilterRuneForm(forms.Form):
         widget=forms.Select(choices=((None, '---'), (True, 'Yes'), (False, 'No'))),
     )
 
+    # Minimum total value of a stat on the rune, including grinds
+    hp__gte = forms.IntegerField(label='Min HP', min_value=0, required=False)
+    hp_pct__gte = forms.IntegerField(label='Min HP %', min_value=0, required=False)
+    attack__gte = forms.IntegerField(label='Min ATK', min_value=0, required=False)
+    attack_pct__gte = forms.IntegerField(label='Min ATK %', min_value=0, required=False)
+    defense__gte = forms.IntegerField(label='Min DEF', min_value=0, required=False)
+    defense_pct__gte = forms.IntegerField(label='Min DEF %', min_value=0, required=False)
+    speed__gte = forms.IntegerField(label='Min SPD', min_value=0, required=False)
+    crit_rate__gte = forms.IntegerField(label='Min CRI Rate %', min_value=0, required=False)
+    crit_damage__gte = forms.IntegerField(label='Min CRI Dmg %', min_value=0, required=False)
+    resistance__gte = forms.IntegerField(label='Min Resistance %', min_value=0, required=False)
+    accuracy__gte = forms.IntegerField(label='Min Accuracy %', min_value=0, required=False)
+
     helper = FormHelper()
     helper.form_method = 'post'
     helper.form_id = 'FilterInventoryForm'
@@ -1301,6 +1314,29 @@ class FilterRuneForm(forms.Form):
             ),
             css_class='row',
         ),
+        Div(
+            Div(
+                Field('hp__gte', wrapper_class='form-group-sm form-group-condensed'),
+                Field('hp_pct__gte', wrapper_class='form-group-sm form-group-condensed'),
+                Field('attack__gte', wrapper_class='form-group-sm form-group-condensed'),
+                Field('attack_pct__gte', wrapper_class='form-group-sm form-group-condensed'),
+                css_class='col-md-4 col-sm-6',
+            ),
+            Div(
+                Field('defense__gte', wrapper_class='form-group-sm form-group-condensed'),
+                Field('defense_pct__gte', wrapper_class='form-group-sm form-group-condensed'),
+                Field('speed__gte', wrapper_class='form-group-sm form-group-condensed'),
+                Field('crit_rate__gte', wrapper_class='form-group-sm form-group-condensed'),
+                css_class='col-md-4 col-sm-6',
+            ),
+            Div(
+                Field('crit_damage__gte', wrapper_class='form-group-sm form-group-condensed'),
+                Field('resistance__gte', wrapper_class='form-group-sm form-group-condensed'),
+                Field('accuracy__gte', wrapper_class='form-group-sm form-group-condensed'),
+                css_class='col-md-4 col-sm-6',
+            ),
+            css_class='row',
+        ),
         Div(
             Div(
                 Submit('apply', 'Apply', css_class='btn-success '),
@@ -0,0 +1,123 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import connection
+
+PROGRESS_CACHE_TIMEOUT = 60 * 60
+
+# Minimum seconds between progress updates written to the cache within a phase
+PUBLISH_INTERVAL = 1
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_key(task_id):
+    return f'profile-import-progress-{task_id}'
+
+
+def get(task_id):
+    # Latest progress published by a com2us_data_import task, or None if it hasn't started
+    return cache.get(_cache_key(task_id))
+
+
+class ImportProgress:
+    # Tracks each phase of a profile import: items processed out of the total, elapsed time and database queries.
+    # Progress is published to the cache for import_status to poll and each finished phase is logged as a metric.
+
+    def __init__(self, task_id, summoner_id, skipped=()):
+        self.task_id = task_id
+        self.summoner_id = summoner_id
+        self.skipped = sorted(skipped)
+        self.status = 'STARTED'
+        self.step = None
+        self.phases = {}
+        self.started = time.monotonic()
+        self.published = 0
+        self._phase = None
+
+    @contextmanager
+    def phase(self, name, total=0):
+        # Queries are counted for the default database connection only
+        self.step = name
+        self._phase = metrics = self.phases[name] = {
+            'processed': 0,
+            'total': total,
+            'elapsed': 0,
+            'queries': 0,
+            'rate': None,
+        }
+        started = time.monotonic()
+
+        def count_query(execute, sql, params, many, context):
+            metrics['queries'] += 1
+            return execute(sql, params, many, context)
+
+        self.publish()
+        with connection.execute_wrapper(count_query):
+            yield metrics
+
+        metrics['processed'] = metrics['total']
+        metrics['elapsed'] = round(time.monotonic() - started, 3)
+        if metrics['elapsed']:
+            # Items per second
+            metrics['rate'] = round(metrics['processed'] / metrics['elapsed'], 1)
+        self._phase = None
+        self._log('phase', dict(metrics, phase=name))
+        self.publish()
+
+    def batches(self, items, size):
+        # Yields items in lists of size, counting each list as processed once the caller is done with it
+        for idx in range(0, len(items), size):
+            yield items[idx:idx + size]
+            self.advance(len(items[idx:idx + size]))
+
+    def chunks(self, items, size):
+        # Like batches(), for items that can only be iterated, such as arrays streamed from an upload
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == size:
+                yield chunk
+                self.advance(len(chunk))
+                chunk = []
+
+        if chunk:
+            yield chunk
+            self.advance(len(chunk))
+
+    def advance(self, count):
+        self._phase['processed'] += count
+        if time.monotonic() - self.published >= PUBLISH_INTERVAL:
+            self.publish()
+
+    def finish(self, status='SUCCESS'):
+        self.status = status
+        self.step = 'success' if status == 'SUCCESS' else self.step
+        self._log('finished', {
+            'status': status,
+            'elapsed': round(time.monotonic() - self.started, 3),
+            'queries': sum(metrics['queries'] for metrics in self.phases.values()),
+            'skipped': self.skipped,
+        })
+        self.publish()
+
+    def as_dict(self):
+        return {
+            'status': self.status,
+            'step': self.step,
+            'skipped': self.skipped,
+            'phases': self.phases,
+            'elapsed': round(time.monotonic() - self.started, 3),
+        }
+
+    def publish(self):
+        self.published = time.monotonic()
+        if self.task_id:
+            cache.set(_cache_key(self.task_id), self.as_dict(), PROGRESS_CACHE_TIMEOUT)
+
+    def _log(self, event, metrics):
+        metrics = dict(metrics, event=f'profile_import.{event}', task_id=self.task_id, summoner_id=self.summoner_id)
+        logger.info(json.dumps(metrics, sort_keys=True), extra={'metrics': metrics})
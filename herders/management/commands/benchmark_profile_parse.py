@@ -0,0 +1,113 @@
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from herders.models import Summoner
+from herders.profile_parser import parse_sw_json, parse_rune_data, parse_artifact_data, parse_rune_craft_data, \
+    parse_artifact_craft_data
+
+PARSE_OPTIONS = {
+    'clear_profile': False,
+    'default_priority': None,
+    'lock_monsters': True,
+    'minimum_stars': 1,
+    'ignore_silver': False,
+    'ignore_material': False,
+    'except_with_runes': True,
+    'except_light_and_dark': True,
+    'except_fusion_ingredient': True,
+}
+
+# Items sent to a worker process at a time
+CHUNK_SIZE = 256
+
+
+def _decode(parse, item):
+    # Field values of the new instance parse_*_data() makes of item, as plain data a worker process can send back.
+    # The primary key is a new random UUID every time.
+    instance = parse(item, None, {})
+    return {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields if not field.primary_key
+    }
+
+
+def _sections(data):
+    # (decode function, items) of every rune, artifact and craft in the export
+    runes = list(data.get('runes') or [])
+    artifacts = list(data.get('artifacts') or [])
+    for unit_info in data['unit_list']:
+        equipped_runes = unit_info.get('runes') or []
+        runes += equipped_runes.values() if isinstance(equipped_runes, dict) else equipped_runes
+        artifacts += unit_info.get('artifacts', [])
+
+    return [
+        (partial(_decode, parse_rune_data), runes),
+        (partial(_decode, parse_artifact_data), artifacts),
+        (partial(_decode, parse_rune_craft_data), data.get('rune_craft_item_list') or []),
+        (partial(_decode, parse_artifact_craft_data), data.get('artifact_crafts') or []),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Time parse_sw_json() on a recorded profile export, and how much of it decoding runes, artifacts and ' \
+           'crafts in a pool of worker processes could save'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Recorded profile export JSON file')
+        parser.add_argument('--profile', help='Username whose stored instances the export is parsed against')
+        parser.add_argument('--processes', type=int, nargs='+', default=[2, 4], help='Worker pool sizes to compare')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement, best time is reported')
+
+    def _run(self, fn, repeat):
+        best_time = None
+        for _ in range(repeat):
+            start = perf_counter()
+            results = fn()
+            elapsed = perf_counter() - start
+            best_time = elapsed if best_time is None else min(best_time, elapsed)
+
+        return results, best_time
+
+    def handle(self, *args, **options):
+        with open(options['path'], encoding='utf-8-sig') as f:
+            data = json.load(f)
+
+        if options['profile']:
+            try:
+                owner = Summoner.objects.get(user__username=options['profile'])
+            except Summoner.DoesNotExist:
+                raise CommandError(f"Profile {options['profile']} does not exist")
+        else:
+            # Parse as a first import
+            owner = Summoner()
+
+        results, parse_time = self._run(lambda: parse_sw_json(data, owner, PARSE_OPTIONS), options['repeat'])
+        self.stdout.write(
+            f"{len(results['monsters'])} monsters, {len(results['runes'])} runes, "
+            f"{len(results['artifacts'])} artifacts parsed in {parse_time:.3f}s"
+        )
+
+        sections = _sections(data)
+        serial, serial_time = self._run(
+            lambda: [[decode(item) for item in items] for decode, items in sections], options['repeat']
+        )
+        self.stdout.write(f"{'decode':>9} {'seconds':>9} {'speedup':>8}")
+        self.stdout.write(f"{'serial':>9} {serial_time:>9.3f} {1:>7.1f}x")
+
+        for processes in options['processes']:
+            # Each pool is shut down before the next is started
+            with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('fork')) as pool:
+                decoded, elapsed = self._run(
+                    lambda: [list(pool.map(decode, items, chunksize=CHUNK_SIZE)) for decode, items in sections],
+                    options['repeat'],
+                )
+
+            if decoded != serial:
+                self.stderr.write(f'{processes} processes: decoded differently')
+
+            self.stdout.write(f'{processes:>9} {elapsed:>9.3f} {serial_time / elapsed:>7.1f}x')
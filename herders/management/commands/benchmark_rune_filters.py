@@ -0,0 +1,114 @@
+import random
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from herders.filters import RuneInstanceFilter
+from herders.forms import FilterRuneForm
+from herders.models import Summoner, RuneInstance
+
+SCENARIOS = [
+    ('SPD >= 20', {'speed__gte': 20}, lambda rune: rune.get_stat(RuneInstance.STAT_SPD) >= 20),
+    (
+        'SPD >= 15, CRI Rate >= 10',
+        {'speed__gte': 15, 'crit_rate__gte': 10},
+        lambda rune: rune.get_stat(RuneInstance.STAT_SPD) >= 15 and rune.get_stat(RuneInstance.STAT_CRIT_RATE_PCT) >= 10,
+    ),
+    (
+        'HP % >= 40, slot 2',
+        {'hp_pct__gte': 40, 'slot': ['2']},
+        lambda rune: rune.get_stat(RuneInstance.STAT_HP_PCT) >= 40 and rune.slot == 2,
+    ),
+    (
+        'substats ATK % and CRI Dmg',
+        {'substats': [str(RuneInstance.STAT_ATK_PCT), str(RuneInstance.STAT_CRIT_DMG_PCT)]},
+        lambda rune: RuneInstance.STAT_ATK_PCT in rune.substats and RuneInstance.STAT_CRIT_DMG_PCT in rune.substats,
+    ),
+]
+
+
+def _random_rune(rng, owner):
+    slot = rng.randint(1, 6)
+    main_stat = rng.choice(RuneInstance.MAIN_STATS_BY_SLOT[slot])
+    innate_stat, *substats = rng.sample([stat for stat, _ in RuneInstance.STAT_CHOICES if stat != main_stat], 5)
+    rune = RuneInstance(
+        owner=owner,
+        type=rng.choice([rune_type for rune_type, _ in RuneInstance.TYPE_CHOICES]),
+        stars=rng.choice([5, 6]),
+        level=rng.choice([0, 3, 6, 9, 12, 15]),
+        slot=slot,
+        main_stat=main_stat,
+        main_stat_value=0,
+        innate_stat=rng.choice([innate_stat, None]),
+        innate_stat_value=rng.randint(1, 4),
+        substats=substats,
+        substat_values=[rng.randint(1, 20) for _ in substats],
+        substats_enchanted=[False for _ in substats],
+        substats_grind_value=[rng.choice([0, 0, rng.randint(1, 5)]) for _ in substats],
+    )
+    rune.update_fields()
+    return rune
+
+
+class Command(BaseCommand):
+    help = 'Compare the rune inventory stat filters against filtering the same runes with get_stat() in Python on a ' \
+           'synthetic inventory. All synthetic rows are rolled back afterwards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runes', type=int, default=100000, help='Runes in the synthetic inventory')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per implementation, best time is reported')
+
+    def _run(self, fn, repeat):
+        best_time = None
+        for _ in range(repeat):
+            start = perf_counter()
+            count = fn()
+            elapsed = perf_counter() - start
+            best_time = elapsed if best_time is None else min(best_time, elapsed)
+
+        return count, best_time
+
+    def _scans(self, qs):
+        # Scan nodes of the query plan, to show which indexes answer the filter
+        sql, params = qs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}', params)
+            plan = [row[0] for row in cursor.fetchall()]
+
+        return ', '.join(line.strip().lstrip('-> ').split('  ')[0] for line in plan if 'Scan' in line)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+
+        with transaction.atomic():
+            summoner = Summoner.objects.create(user=User.objects.create(username='benchmark_rune_filters'))
+
+            start = perf_counter()
+            for idx in range(0, options['runes'], 10000):
+                RuneInstance.objects.bulk_create(
+                    [_random_rune(rng, summoner) for _ in range(min(10000, options['runes'] - idx))]
+                )
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {RuneInstance._meta.db_table}')
+            self.stdout.write(f"Inserted {options['runes']} runes in {perf_counter() - start:.1f}s")
+
+            queryset = RuneInstance.objects.filter(owner=summoner)
+            self.stdout.write(f"{'filter':>28} {'runes':>8} {'python':>9} {'filter':>9}  plan")
+            for name, data, predicate in SCENARIOS:
+                form = FilterRuneForm(data)
+                form.is_valid()
+                qs = RuneInstanceFilter(form.cleaned_data, queryset=queryset).qs
+
+                old_count, old_time = self._run(
+                    lambda: sum(1 for rune in queryset.iterator(chunk_size=2000) if predicate(rune)), options['repeat']
+                )
+                new_count, new_time = self._run(qs.count, options['repeat'])
+
+                if old_count != new_count:
+                    self.stderr.write(f'{name}: filtered {new_count} runes, expected {old_count}')
+
+                self.stdout.write(f'{name:>28} {new_count:>8} {old_time:>9.3f} {new_time:>9.3f}  {self._scans(qs)}')
+
+            transaction.set_rollback(True)
@@ -0,0 +1,87 @@
+import random
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bestiary.models import Monster
+from herders.models import MonsterInstance, RuneInstance
+from herders.rune_optimizer import RuneOptimizer
+
+SLOT_MAIN_STATS = {
+    1: [RuneInstance.STAT_ATK],
+    2: [RuneInstance.STAT_SPD, RuneInstance.STAT_HP_PCT, RuneInstance.STAT_ATK_PCT, RuneInstance.STAT_DEF_PCT],
+    3: [RuneInstance.STAT_DEF],
+    4: [RuneInstance.STAT_CRIT_RATE_PCT, RuneInstance.STAT_CRIT_DMG_PCT, RuneInstance.STAT_HP_PCT, RuneInstance.STAT_ATK_PCT],
+    5: [RuneInstance.STAT_HP],
+    6: [RuneInstance.STAT_HP_PCT, RuneInstance.STAT_ACCURACY_PCT, RuneInstance.STAT_RESIST_PCT, RuneInstance.STAT_DEF_PCT],
+}
+
+SCENARIOS = [
+    ('efficiency', {}),
+    ('speed', {'weights': {RuneInstance.STAT_SPD: 1}}),
+    ('violent/will damage dealer', {
+        'set_combinations': [[RuneInstance.TYPE_VIOLENT, RuneInstance.TYPE_WILL]],
+        'main_stats': {2: [RuneInstance.STAT_SPD], 4: [RuneInstance.STAT_CRIT_DMG_PCT]},
+        'minimums': {RuneInstance.STAT_CRIT_RATE_PCT: 70},
+        'weights': {RuneInstance.STAT_ATK: 1, RuneInstance.STAT_CRIT_DMG_PCT: 10},
+    }),
+    ('swift tank', {
+        'set_combinations': [[RuneInstance.TYPE_SWIFT], [RuneInstance.TYPE_VIOLENT]],
+        'minimums': {RuneInstance.STAT_SPD: 150},
+        'weights': {RuneInstance.STAT_HP: 1, RuneInstance.STAT_DEF: 2},
+    }),
+]
+
+
+def _random_rune(rng, slot):
+    main_stat = rng.choice(SLOT_MAIN_STATS[slot])
+    substats = rng.sample([stat for stat, _ in RuneInstance.STAT_CHOICES if stat != main_stat], 4)
+    return RuneInstance(
+        type=rng.choice([rune_type for rune_type, _ in RuneInstance.TYPE_CHOICES]),
+        stars=6,
+        level=15,
+        slot=slot,
+        main_stat=main_stat,
+        main_stat_value=rng.randint(20, 60),
+        substats=substats,
+        substat_values=[rng.randint(1, 15) for _ in substats],
+        substats_enchanted=[False] * 4,
+        substats_grind_value=[0] * 4,
+        efficiency=rng.uniform(50, 120),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Time RuneOptimizer searching a generated rune pool for a few typical build requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--monster', type=int, default=14102, help='com2us_id of the monster to build for')
+        parser.add_argument('--runes', type=int, default=3000, help='Runes in the generated pool')
+        parser.add_argument('--limit', type=int, default=10, help='Builds to return')
+        parser.add_argument('--time-budget', type=float, default=10, help='Seconds each search may take')
+
+    def handle(self, *args, **options):
+        try:
+            monster = Monster.objects.get(com2us_id=options['monster'])
+        except Monster.DoesNotExist:
+            raise CommandError(f"Monster {options['monster']} does not exist")
+
+        mon = MonsterInstance(monster=monster, stars=6, level=40)
+        rng = random.Random(0)
+        runes = [_random_rune(rng, rng.randint(1, 6)) for _ in range(options['runes'])]
+
+        self.stdout.write(f"{options['runes']} runes, {monster}")
+        self.stdout.write(f"{'scenario':>28} {'seconds':>9} {'nodes':>9} {'builds':>7} {'best':>10}")
+        for name, kwargs in SCENARIOS:
+            optimizer = RuneOptimizer(
+                mon, runes=runes, limit=options['limit'], time_budget=options['time_budget'], **kwargs
+            )
+            start = perf_counter()
+            builds = optimizer.run()
+            elapsed = perf_counter() - start
+
+            best = f'{builds[0].score:.1f}' if builds else '-'
+            timed_out = ' (time budget reached)' if optimizer.timed_out else ''
+            self.stdout.write(
+                f'{name:>28} {elapsed:>9.3f} {optimizer.nodes:>9} {len(builds):>7} {best:>10}{timed_out}'
+            )
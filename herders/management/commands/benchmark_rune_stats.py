@@ -0,0 +1,85 @@
+import random
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from herders.models import RuneInstance, RuneBuild
+from herders.rune_stats import build_stats
+
+
+def get_stat_build_stats(runes):
+    # Previous RuneBuild.update_stats() aggregation, one get_stat() scan per stat per rune
+    stat_bonuses = {stat: sum(rune.get_stat(stat) for rune in runes) for stat, _ in RuneInstance.STAT_CHOICES}
+    stat_bonuses[RuneInstance.STAT_SPD_PCT] = 0
+
+    set_counts = {}
+    for rune in runes:
+        set_counts[rune.type] = set_counts.get(rune.type, 0) + 1
+
+    for rune_set, count in set_counts.items():
+        bonus = RuneInstance.RUNE_SET_BONUSES[rune_set]
+        if bonus['stat']:
+            stat_bonuses[bonus['stat']] += bonus['value'] * (count // bonus['count'])
+
+    return stat_bonuses
+
+
+def _random_rune(rng, slot):
+    stats = [stat for stat, _ in RuneInstance.STAT_CHOICES]
+    main_stat, innate_stat, *substats = rng.sample(stats, 6)
+    return RuneInstance(
+        type=rng.choice([rune_type for rune_type, _ in RuneInstance.TYPE_CHOICES]),
+        stars=6,
+        level=15,
+        slot=slot,
+        main_stat=main_stat,
+        main_stat_value=rng.randint(10, 60),
+        innate_stat=rng.choice([innate_stat, None]),
+        innate_stat_value=rng.randint(1, 8),
+        substats=substats,
+        substat_values=[rng.randint(1, 20) for _ in substats],
+        substats_enchanted=[False for _ in substats],
+        substats_grind_value=[rng.randint(0, 5) for _ in substats],
+        efficiency=rng.uniform(50, 120),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Compare recomputing the stats of every rune build in a generated account with RuneBuild.update_stats() ' \
+           'against summing get_stat() for each stat'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--monsters', type=int, default=1000, help='Monsters in the generated account')
+        parser.add_argument('--builds', type=int, default=2, help='Rune builds per monster')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per implementation, best time is reported')
+
+    def _run(self, fn, builds, repeat):
+        best_time = None
+        for _ in range(repeat):
+            start = perf_counter()
+            for build, runes in builds:
+                fn(build, runes)
+            elapsed = perf_counter() - start
+            best_time = elapsed if best_time is None else min(best_time, elapsed)
+
+        return best_time
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        builds = [
+            (RuneBuild(), [_random_rune(rng, slot) for slot in range(1, 7)])
+            for _ in range(options['monsters'] * options['builds'])
+        ]
+
+        old_time = self._run(lambda build, runes: get_stat_build_stats(runes), builds, options['repeat'])
+        new_time = self._run(lambda build, runes: build.update_stats(runes), builds, options['repeat'])
+
+        for build, runes in builds:
+            totals = build_stats(runes)
+            if any(totals[stat] != value for stat, value in get_stat_build_stats(runes).items()):
+                self.stderr.write('Stats differ from the get_stat() reference')
+                break
+
+        self.stdout.write(f"{len(builds)} builds, {len(builds) * 6} runes")
+        self.stdout.write(f"{'get_stat':>12} {old_time:>9.3f}s")
+        self.stdout.write(f"{'update_stats':>12} {new_time:>9.3f}s {old_time / new_time:>7.1f}x")
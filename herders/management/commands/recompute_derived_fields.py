@@ -0,0 +1,42 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from herders.bulk_recompute import BulkRecompute, CHUNK_SIZE, recompute_models
+
+
+class Command(BaseCommand):
+    help = 'Recompute derived fields such as efficiency of runes, rune drops and artifacts in bulk. Progress is ' \
+           'written after each chunk, and an interrupted run can be resumed with --after.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='*', help=f"Models to recompute, any of {', '.join(recompute_models())}. Default all."
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows read and written at a time')
+        parser.add_argument('--after', help='Only recompute rows after this primary key. Needs a single model.')
+
+    def handle(self, *args, **options):
+        models = recompute_models()
+        labels = options['models'] or list(models)
+
+        unknown = [label for label in labels if label not in models]
+        if unknown:
+            raise CommandError(f"Unknown models {', '.join(unknown)}")
+
+        if options['after'] is not None and len(labels) != 1:
+            raise CommandError('--after needs exactly one model')
+
+        for label in labels:
+            recompute = BulkRecompute(models[label].objects.all(), options['chunk_size'])
+            start = perf_counter()
+            recompute.run(
+                after=options['after'],
+                on_chunk=lambda chunk: self.stdout.write(
+                    f'{label}: {chunk.checked} checked, {chunk.changed} changed, last pk {chunk.last_pk}'
+                ),
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'{label}: done, {recompute.checked} checked, {recompute.changed} changed in '
+                f'{perf_counter() - start:.1f}s'
+            ))
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.15 on 2026-10-18 04:20
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('herders', '0017_auto_20200808_1642'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='summoner',
+            name='import_fingerprints',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 2.2.15 on 2026-10-18 04:47
+
+from collections import Counter
+
+from django.db import migrations, models
+
+# Runes needed to complete each rune set type, as of this migration
+RUNE_SET_COUNT_REQUIREMENTS = {
+    1: 2, 2: 4, 3: 2, 4: 4, 5: 4, 6: 2, 7: 2, 8: 2, 9: 4, 10: 2, 11: 2,
+    12: 2, 13: 2, 14: 4, 15: 4, 16: 2, 17: 2, 18: 2, 19: 2, 20: 2, 21: 2,
+}
+
+
+def rune_set_summary(runes):
+    # Copy of herders.rune_stats.rune_set_summary() as of this migration
+    runes = list(runes)
+    packed = 0
+    in_sets = 0
+
+    for rune_set, count in Counter(rune.type for rune in runes).items():
+        completed = count // RUNE_SET_COUNT_REQUIREMENTS[rune_set]
+        packed |= completed << (rune_set - 1) * 2
+        in_sets += completed * RUNE_SET_COUNT_REQUIREMENTS[rune_set]
+
+    summary = {
+        'rune_sets': packed,
+        'rune_set_broken': len(runes) > in_sets,
+    }
+    main_stats = {rune.slot: rune.main_stat for rune in runes}
+    for slot in (2, 4, 6):
+        summary[f'slot_{slot}_main_stat'] = main_stats.get(slot)
+
+    return summary
+
+
+def fill_rune_set_summaries(apps, schema_editor):
+    fields = ['rune_sets', 'rune_set_broken', 'slot_2_main_stat', 'slot_4_main_stat', 'slot_6_main_stat']
+
+    for model_name, runes_name in [('MonsterInstance', 'runeinstance_set'), ('RuneBuild', 'runes')]:
+        model = apps.get_model('herders', model_name)
+        pks = list(model.objects.order_by('pk').values_list('pk', flat=True))
+
+        for idx in range(0, len(pks), 1000):
+            objs = list(model.objects.filter(pk__in=pks[idx:idx + 1000]).prefetch_related(runes_name))
+            for obj in objs:
+                for field, value in rune_set_summary(getattr(obj, runes_name).all()).items():
+                    setattr(obj, field, value)
+
+            model.objects.bulk_update(objs, fields)
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('herders', '0018_summoner_import_fingerprints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='monsterinstance',
+            name='rune_set_broken',
+            field=models.BooleanField(default=False, help_text='Some runes are not part of a completed set'),
+        ),
+        migrations.AddField(
+            model_name='monsterinstance',
+            name='rune_sets',
+            field=models.BigIntegerField(default=0, help_text='Completed rune sets, two bits per rune set type'),
+        ),
+        migrations.AddField(
+            model_name='monsterinstance',
+            name='slot_2_main_stat',
+            field=models.IntegerField(blank=True, choices=[(1, 'HP'), (2, 'HP %'), (3, 'ATK'), (4, 'ATK %'), (5, 'DEF'), (6, 'DEF %'), (7, 'SPD'), (8, 'CRI Rate %'), (9, 'CRI Dmg %'), (10, 'Resistance %'), (11, 'Accuracy %')], null=True),
+        ),
+        migrations.AddField(
+            model_name='monsterinstance',
+            name='slot_4_main_stat',
+            field=models.IntegerField(blank=True, choices=[(1, 'HP'), (2, 'HP %'), (3, 'ATK'), (4, 'ATK %'), (5, 'DEF'), (6, 'DEF %'), (7, 'SPD'), (8, 'CRI Rate %'), (9, 'CRI Dmg %'), (10, 'Resistance %'), (11, 'Accuracy %')], null=True),
+        ),
+        migrations.AddField(
+            model_name='monsterinstance',
+            name='slot_6_main_stat',
+            field=models.IntegerField(blank=True, choices=[(1, 'HP'), (2, 'HP %'), (3, 'ATK'), (4, 'ATK %'), (5, 'DEF'), (6, 'DEF %'), (7, 'SPD'), (8, 'CRI Rate %'), (9, 'CRI Dmg %'), (10, 'Resistance %'), (11, 'Accuracy %')], null=True),
+        ),
+        migrations.AddField(
+            model_name='runebuild',
+            name='rune_set_broken',
+            field=models.BooleanField(default=False, help_text='Some runes are not part of a completed set'),
+        ),
+        migrations.AddField(
+            model_name='runebuild',
+            name='rune_sets',
+            field=models.BigIntegerField(default=0, help_text='Completed rune sets, two bits per rune set type'),
+        ),
+        migrations.AddField(
+            model_name='runebuild',
+            name='slot_2_main_stat',
+            field=models.IntegerField(blank=True, choices=[(1, 'HP'), (2, 'HP %'), (3, 'ATK'), (4, 'ATK %'), (5, 'DEF'), (6, 'DEF %'), (7, 'SPD'), (8, 'CRI Rate %'), (9, 'CRI Dmg %'), (10, 'Resistance %'), (11, 'Accuracy %')], null=True),
+        ),
+        migrations.AddField(
+            model_name='runebuild',
+            name='slot_4_main_stat',
+            field=models.IntegerField(blank=True, choices=[(1, 'HP'), (2, 'HP %'), (3, 'ATK'), (4, 'ATK %'), (5, 'DEF'), (6, 'DEF %'), (7, 'SPD'), (8, 'CRI Rate %'), (9, 'CRI Dmg %'), (10, 'Resistance %'), (11, 'Accuracy %')], null=True),
+        ),
+        migrations.AddField(
+            model_name='runebuild',
+            name='slot_6_main_stat',
+            field=models.IntegerField(blank=True, choices=[(1, 'HP'), (2, 'HP %'), (3, 'ATK'), (4, 'ATK %'), (5, 'DEF'), (6, 'DEF %'), (7, 'SPD'), (8, 'CRI Rate %'), (9, 'CRI Dmg %'), (10, 'Resistance %'), (11, 'Accuracy %')], null=True),
+        ),
+        migrations.RunPython(fill_rune_set_summaries, noop),
+    ]
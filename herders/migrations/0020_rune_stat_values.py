@@ -0,0 +1,147 @@
+# Generated by Django 2.2.15 on 2026-10-18 05:11
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+# Column of each stat, as of this migration
+STAT_VALUE_FIELDS = {
+    1: 'hp',
+    2: 'hp_pct',
+    3: 'attack',
+    4: 'attack_pct',
+    5: 'defense',
+    6: 'defense_pct',
+    7: 'speed',
+    8: 'crit_rate',
+    9: 'crit_damage',
+    10: 'resistance',
+    11: 'accuracy',
+}
+
+
+def fill_stat_values_sql(table):
+    # Same values as Rune.get_stat(): the main stat, then the innate stat, then the first matching substat plus grind
+    columns = []
+    for stat, field in STAT_VALUE_FIELDS.items():
+        substat = f'array_position(substats, {stat})'
+        columns.append(
+            f'{field} = CASE WHEN main_stat = {stat} THEN main_stat_value '
+            f'WHEN innate_stat = {stat} THEN COALESCE(innate_stat_value, 0) '
+            f'ELSE COALESCE(substat_values[{substat}] + COALESCE(substats_grind_value[{substat}], 0), 0) END'
+        )
+
+    return f'UPDATE {table} SET {", ".join(columns)}'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('herders', '0019_rune_set_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='runeinstance',
+            name='accuracy',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='runeinstance',
+            name='attack',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='runeinstance',
+            name='attack_pct',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='runeinstance',
+            name='crit_damage',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='runeinstance',
+            name='crit_rate',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='runeinstance',
+            name='defense',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='runeinstance',
+            name='defense_pct',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='runeinstance',
+            name='hp',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='runeinstance',
+            name='hp_pct',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='runeinstance',
+            name='resistance',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='runeinstance',
+            name='speed',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(fill_stat_values_sql('herders_runeinstance'), migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='runeinstance',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['substats'], name='runeinstance_substats'),
+        ),
+        migrations.AddIndex(
+            model_name='runeinstance',
+            index=models.Index(fields=['owner', 'hp'], name='runeinstance_owner_hp'),
+        ),
+        migrations.AddIndex(
+            model_name='runeinstance',
+            index=models.Index(fields=['owner', 'hp_pct'], name='runeinstance_owner_hp_pct'),
+        ),
+        migrations.AddIndex(
+            model_name='runeinstance',
+            index=models.Index(fields=['owner', 'attack'], name='runeinstance_owner_attack'),
+        ),
+        migrations.AddIndex(
+            model_name='runeinstance',
+            index=models.Index(fields=['owner', 'attack_pct'], name='runeinstance_owner_attack_pct'),
+        ),
+        migrations.AddIndex(
+            model_name='runeinstance',
+            index=models.Index(fields=['owner', 'defense'], name='runeinstance_owner_defense'),
+        ),
+        migrations.AddIndex(
+            model_name='runeinstance',
+            index=models.Index(fields=['owner', 'defense_pct'], name='runeinstance_owner_defense_pct'),
+        ),
+        migrations.AddIndex(
+            model_name='runeinstance',
+            index=models.Index(fields=['owner', 'speed'], name='runeinstance_owner_speed'),
+        ),
+        migrations.AddIndex(
+            model_name='runeinstance',
+            index=models.Index(fields=['owner', 'crit_rate'], name='runeinstance_owner_crit_rate'),
+        ),
+        migrations.AddIndex(
+            model_name='runeinstance',
+            index=models.Index(fields=['owner', 'crit_damage'], name='runeinstance_owner_crit_damage'),
+        ),
+        migrations.AddIndex(
+            model_name='runeinstance',
+            index=models.Index(fields=['owner', 'resistance'], name='runeinstance_owner_resistance'),
+        ),
+        migrations.AddIndex(
+            model_name='runeinstance',
+            index=models.Index(fields=['owner', 'accuracy'], name='runeinstance_owner_accuracy'),
+        ),
+    ]
@@ -1,17 +1,21 @@
+import threading
 import uuid
 from collections import OrderedDict
+from contextlib import contextmanager
 from math import floor, ceil
 
 from django.contrib.auth.models import User
 from django.contrib.postgres.fields import ArrayField, JSONField
+from django.contrib.postgres.indexes import GinIndex
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models import Q, Count, Avg
+from django.db import models, transaction
+from django.db.models import Q
 from django.utils.functional import cached_property
 from django.utils.safestring import mark_safe
 from timezone_field import TimeZoneField
 
 from bestiary.models import base, Monster, Building, Level, Rune, RuneCraft, Artifact, ArtifactCraft
+from . import rune_stats
 
 
 # Individual user/monster collection models
@@ -41,6 +45,7 @@ class Summoner(models.Model):
     timezone = TimeZoneField(default='America/Los_Angeles')
     notes = models.TextField(null=True, blank=True)
     preferences = JSONField(default=dict)
+    import_fingerprints = JSONField(default=dict, blank=True)
     last_update = models.DateTimeField(auto_now=True)
 
     def get_rune_counts(self):
@@ -250,7 +255,59 @@ class MonsterTag(models.Model):
         return mark_safe(self.name)
 
 
-class MonsterInstance(models.Model, base.Stars):
+def _average_efficiency(runes):
+    # Same as aggregating Avg('efficiency') over the runes, for runes that are already loaded
+    efficiencies = [rune.efficiency for rune in runes if rune.efficiency is not None]
+    return sum(efficiencies) / len(efficiencies) if efficiencies else 0.0
+
+
+class RuneSetSummary(models.Model):
+    # Summary of the runes in a set of six, stored whenever the runes change so it can be displayed without queries
+    RUNE_SET_SUMMARY_FIELDS = [
+        'rune_sets',
+        'rune_set_broken',
+        'slot_2_main_stat',
+        'slot_4_main_stat',
+        'slot_6_main_stat',
+    ]
+
+    rune_sets = models.BigIntegerField(default=0, help_text='Completed rune sets, two bits per rune set type')
+    rune_set_broken = models.BooleanField(default=False, help_text='Some runes are not part of a completed set')
+    slot_2_main_stat = models.IntegerField(choices=base.Stats.STAT_CHOICES, blank=True, null=True)
+    slot_4_main_stat = models.IntegerField(choices=base.Stats.STAT_CHOICES, blank=True, null=True)
+    slot_6_main_stat = models.IntegerField(choices=base.Stats.STAT_CHOICES, blank=True, null=True)
+
+    class Meta:
+        abstract = True
+
+    def update_rune_set_summary(self, runes):
+        for field, value in rune_stats.rune_set_summary(runes).items():
+            setattr(self, field, value)
+
+    @property
+    def active_rune_sets(self):
+        return rune_stats.unpack_rune_sets(self.rune_sets)
+
+    @property
+    def rune_set_bonus_text(self):
+        return [RuneInstance.RUNE_SET_BONUSES[active_set]['description'] for active_set in self.active_rune_sets]
+
+    def _rune_set_names(self):
+        names = [RuneInstance.TYPE_CHOICES[rune_type - 1][1] for rune_type in self.active_rune_sets]
+        if self.rune_set_broken:
+            names.append('Broken')
+
+        return '/'.join(names)
+
+    def _main_stat_names(self):
+        # Main stats of the even slots
+        return '/'.join(
+            getattr(self, f'get_slot_{slot}_main_stat_display')()
+            for slot in rune_stats.SUMMARY_SLOTS if getattr(self, f'slot_{slot}_main_stat') is not None
+        )
+
+
+class MonsterInstance(RuneSetSummary, base.Stars):
     PRIORITY_DONE = 0
     PRIORITY_LOW = 1
     PRIORITY_MED = 2
@@ -284,6 +341,18 @@ class MonsterInstance(models.Model, base.Stars):
     rta_build = models.ForeignKey('RuneBuild', null=True, on_delete=models.SET_NULL, related_name='rta_build')
 
     # Calculated fields (on save)
+    RUNE_STAT_FIELDS = [
+        'rune_hp',
+        'rune_attack',
+        'rune_defense',
+        'rune_speed',
+        'rune_crit_rate',
+        'rune_crit_damage',
+        'rune_resistance',
+        'rune_accuracy',
+        'avg_rune_efficiency',
+    ] + RuneSetSummary.RUNE_SET_SUMMARY_FIELDS
+
     rune_hp = models.IntegerField(blank=True, default=0)
     rune_attack = models.IntegerField(blank=True, default=0)
     rune_defense = models.IntegerField(blank=True, default=0)
@@ -316,54 +385,15 @@ class MonsterInstance(models.Model, base.Stars):
         return skill_ups_remaining
 
     def get_rune_set_summary(self):
-        sets = []
-
-        # Determine rune sets
-        rune_counts = self.runeinstance_set.values('type').order_by().annotate(count=Count('type'))
-        num_equipped = self.runeinstance_set.count()
-
-        for rune_count in rune_counts:
-            type_name = RuneInstance.TYPE_CHOICES[rune_count['type'] - 1][1]
-            required = RuneInstance.RUNE_SET_COUNT_REQUIREMENTS[rune_count['type']]
-            present = rune_count['count']
-
-            if present >= required:
-                num_equipped -= required * (present // required)
-                sets += [type_name] * (present // required)
-
-        if num_equipped:
-            # Some runes are present that aren't in a set
-            sets.append('Broken')
-
-        # Summarize slot 2/4/6 main stats
-        stats = []
-
-        for x in [2, 4, 6]:
-            try:
-                stats.append(self.runeinstance_set.get(slot=x).get_main_stat_display())
-            except:
-                continue
-
-        return '/'.join(sets) + ' - ' + '/'.join(stats)
+        return f'{self._rune_set_names()} - {self._main_stat_names()}'
 
     def get_rune_set_bonuses(self):
-        rune_counts = self.runeinstance_set.values('type').order_by().annotate(count=Count('type'))
-        rune_bonuses = []
-
-        for rune_count in rune_counts:
-            required = RuneInstance.RUNE_SET_COUNT_REQUIREMENTS[rune_count['type']]
-            present = rune_count['count']
-            bonus_text = RuneInstance.RUNE_SET_BONUSES[rune_count['type']]['description']
-
-            if present >= required:
-                rune_bonuses.extend([bonus_text] * (present // required))
-
-        return rune_bonuses
+        return self.rune_set_bonus_text
 
     def get_avg_rune_efficiency(self):
         # TODO: Switch after switching to rune builds
         # return self.default_build.avg_efficiency
-        return self.runeinstance_set.aggregate(Avg('efficiency'))['efficiency__avg'] or 0.0
+        return _average_efficiency(self.runeinstance_set.all())
 
     # Stat values for current monster grade/level
     @cached_property
@@ -489,77 +519,28 @@ class MonsterInstance(models.Model, base.Stars):
     def accuracy(self):
         return self.base_accuracy + self.rune_accuracy
 
-    def get_rune_stats(self, at_max_level=False):
+    def get_rune_stats(self, at_max_level=False, runes=None):
         # TODO: Delete after switching to rune builds
         if at_max_level:
             base_stats = {
                 RuneInstance.STAT_HP: self.monster.actual_hp(6, 40),
-                RuneInstance.STAT_HP_PCT: self.monster.actual_hp(6, 40),
                 RuneInstance.STAT_ATK: self.monster.actual_attack(6, 40),
-                RuneInstance.STAT_ATK_PCT: self.monster.actual_attack(6, 40),
                 RuneInstance.STAT_DEF: self.monster.actual_defense(6, 40),
-                RuneInstance.STAT_DEF_PCT: self.monster.actual_defense(6, 40),
                 RuneInstance.STAT_SPD: self.base_speed,
-                RuneInstance.STAT_CRIT_RATE_PCT: self.base_crit_rate,
-                RuneInstance.STAT_CRIT_DMG_PCT: self.base_crit_damage,
-                RuneInstance.STAT_RESIST_PCT: self.base_resistance,
-                RuneInstance.STAT_ACCURACY_PCT: self.base_accuracy,
             }
         else:
             base_stats = {
                 RuneInstance.STAT_HP: self.base_hp,
-                RuneInstance.STAT_HP_PCT: self.base_hp,
                 RuneInstance.STAT_ATK: self.base_attack,
-                RuneInstance.STAT_ATK_PCT: self.base_attack,
                 RuneInstance.STAT_DEF: self.base_defense,
-                RuneInstance.STAT_DEF_PCT: self.base_defense,
                 RuneInstance.STAT_SPD: self.base_speed,
-                RuneInstance.STAT_CRIT_RATE_PCT: self.base_crit_rate,
-                RuneInstance.STAT_CRIT_DMG_PCT: self.base_crit_damage,
-                RuneInstance.STAT_RESIST_PCT: self.base_resistance,
-                RuneInstance.STAT_ACCURACY_PCT: self.base_accuracy,
             }
 
-        # Update stats based on runes
-        rune_set = self.runeinstance_set.all()
-        stat_bonuses = {stat_id: 0 for stat_id, _ in RuneInstance.STAT_CHOICES}
-        rune_set_counts = {type_id: 0 for type_id, _ in RuneInstance.TYPE_CHOICES}
-
-        # Sum up all stat bonuses
-        for rune in rune_set:
-            rune_set_counts[rune.type] += 1
-            stat_bonuses[RuneInstance.STAT_HP] += rune.get_stat(RuneInstance.STAT_HP)
-            stat_bonuses[RuneInstance.STAT_HP_PCT] += rune.get_stat(RuneInstance.STAT_HP_PCT)
-            stat_bonuses[RuneInstance.STAT_ATK] += rune.get_stat(RuneInstance.STAT_ATK)
-            stat_bonuses[RuneInstance.STAT_ATK_PCT] += rune.get_stat(RuneInstance.STAT_ATK_PCT)
-            stat_bonuses[RuneInstance.STAT_DEF] += rune.get_stat(RuneInstance.STAT_DEF)
-            stat_bonuses[RuneInstance.STAT_DEF_PCT] += rune.get_stat(RuneInstance.STAT_DEF_PCT)
-            stat_bonuses[RuneInstance.STAT_SPD] += rune.get_stat(RuneInstance.STAT_SPD)
-            stat_bonuses[RuneInstance.STAT_CRIT_RATE_PCT] += rune.get_stat(RuneInstance.STAT_CRIT_RATE_PCT)
-            stat_bonuses[RuneInstance.STAT_CRIT_DMG_PCT] += rune.get_stat(RuneInstance.STAT_CRIT_DMG_PCT)
-            stat_bonuses[RuneInstance.STAT_RESIST_PCT] += rune.get_stat(RuneInstance.STAT_RESIST_PCT)
-            stat_bonuses[RuneInstance.STAT_ACCURACY_PCT] += rune.get_stat(RuneInstance.STAT_ACCURACY_PCT)
-
-        # Add in the set bonuses
-        for set, count in rune_set_counts.items():
-            required_count = RuneInstance.RUNE_SET_BONUSES[set]['count']
-            bonus_value = RuneInstance.RUNE_SET_BONUSES[set]['value']
-            if bonus_value is not None and count >= required_count:
-                num_sets_equipped = floor(count / required_count)
-                stat = RuneInstance.RUNE_SET_BONUSES[set]['stat']
-
-                if set == RuneInstance.TYPE_SWIFT:
-                    # Swift set is special because it adds a percentage to a normally flat stat
-                    bonus_value = int(ceil(round(base_stats[RuneInstance.STAT_SPD] * (bonus_value / 100.0), 3)))
-                    stat = RuneInstance.STAT_SPD
-
-                stat_bonuses[stat] += bonus_value * num_sets_equipped
-
-        # Convert HP/ATK/DEF percentage bonuses to flat bonuses based on the base stats
-        for stat in [RuneInstance.STAT_HP_PCT, RuneInstance.STAT_ATK_PCT, RuneInstance.STAT_DEF_PCT]:
-            stat_bonuses[stat] = int(ceil(round(base_stats[stat] * (stat_bonuses[stat] / 100.0), 3)))
-
-        return stat_bonuses
+        # Percentage bonuses, including Swift's, are converted to flat bonuses based on the base stats
+        if runes is None:
+            runes = self.runeinstance_set.all()
+
+        return rune_stats.flat_stats(rune_stats.build_stats(runes), base_stats)
 
     def get_max_level_stats(self):
         max_base_hp = self.monster.actual_hp(6, 40)
@@ -686,13 +667,31 @@ class MonsterInstance(models.Model, base.Stars):
 
         super(MonsterInstance, self).clean()
 
-    def save(self, *args, **kwargs):
+    def update_fields(self):
         # Remove custom name if not a homunculus
         if not self.monster.homunculus:
             self.custom_name = ''
 
+        # Limit skill levels to the max level of the skill
+        skills = self.monster.skills.all()
+
+        if len(skills) >= 1 and self.skill_1_level > skills[0].max_level:
+            self.skill_1_level = skills[0].max_level
+
+        if len(skills) >= 2 and self.skill_2_level > skills[1].max_level:
+            self.skill_2_level = skills[1].max_level
+
+        if len(skills) >= 3 and self.skill_3_level > skills[2].max_level:
+            self.skill_3_level = skills[2].max_level
+
+        if len(skills) >= 4 and self.skill_4_level > skills[3].max_level:
+            self.skill_4_level = skills[3].max_level
+
+    def update_rune_stats(self):
         # Update rune stats based on level
-        stat_bonuses = self.get_rune_stats()
+        runes = list(self.runeinstance_set.all())
+        stat_bonuses = self.get_rune_stats(runes=runes)
+        self.update_rune_set_summary(runes)
 
         # Add all the bonuses together to get final values.
         self.rune_hp = stat_bonuses[RuneInstance.STAT_HP] + stat_bonuses[RuneInstance.STAT_HP_PCT]
@@ -706,21 +705,16 @@ class MonsterInstance(models.Model, base.Stars):
 
         self.avg_rune_efficiency = self.get_avg_rune_efficiency()
 
-        # Limit skill levels to the max level of the skill
-        skills = self.monster.skills.all()
-
-        if len(skills) >= 1 and self.skill_1_level > skills[0].max_level:
-            self.skill_1_level = skills[0].max_level
-
-        if len(skills) >= 2 and self.skill_2_level > skills[1].max_level:
-            self.skill_2_level = skills[1].max_level
+    def save(self, *args, **kwargs):
+        self.update_fields()
 
-        if len(skills) >= 3 and self.skill_3_level > skills[2].max_level:
-            self.skill_3_level = skills[2].max_level
-
-        if len(skills) >= 4 and self.skill_4_level > skills[3].max_level:
-            self.skill_4_level = skills[3].max_level
+        recompute = deferred_rune_recompute()
+        if recompute is not None:
+            super(MonsterInstance, self).save(*args, **kwargs)
+            recompute.monster_ids.add(self.pk)
+            return
 
+        self.update_rune_stats()
         super(MonsterInstance, self).save(*args, **kwargs)
 
         if self.default_build is None or self.rta_build is None:
@@ -774,7 +768,46 @@ class MonsterPiece(models.Model):
         return int(floor(self.pieces / self.PIECE_REQUIREMENTS[self.monster.natural_stars]))
 
 
-class RuneInstance(Rune):
+class RuneStatValues(models.Model):
+    # Total value of each stat on a rune from its main stat, innate stat and substats including grinds, stored so the
+    # rune inventory can be filtered on them
+    STAT_VALUE_FIELDS = {
+        base.Stats.STAT_HP: 'hp',
+        base.Stats.STAT_HP_PCT: 'hp_pct',
+        base.Stats.STAT_ATK: 'attack',
+        base.Stats.STAT_ATK_PCT: 'attack_pct',
+        base.Stats.STAT_DEF: 'defense',
+        base.Stats.STAT_DEF_PCT: 'defense_pct',
+        base.Stats.STAT_SPD: 'speed',
+        base.Stats.STAT_CRIT_RATE_PCT: 'crit_rate',
+        base.Stats.STAT_CRIT_DMG_PCT: 'crit_damage',
+        base.Stats.STAT_RESIST_PCT: 'resistance',
+        base.Stats.STAT_ACCURACY_PCT: 'accuracy',
+    }
+
+    hp = models.IntegerField(default=0)
+    hp_pct = models.IntegerField(default=0)
+    attack = models.IntegerField(default=0)
+    attack_pct = models.IntegerField(default=0)
+    defense = models.IntegerField(default=0)
+    defense_pct = models.IntegerField(default=0)
+    speed = models.IntegerField(default=0)
+    crit_rate = models.IntegerField(default=0)
+    crit_damage = models.IntegerField(default=0)
+    resistance = models.IntegerField(default=0)
+    accuracy = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    def update_stat_values(self):
+        for stat, field in self.STAT_VALUE_FIELDS.items():
+            setattr(self, field, self.get_stat(stat) or 0)
+
+
+class RuneInstance(Rune, RuneStatValues):
+    DERIVED_FIELDS = Rune.DERIVED_FIELDS + list(RuneStatValues.STAT_VALUE_FIELDS.values())
+
     # Upgrade success rate based on rune level
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     type = models.IntegerField(choices=Rune.TYPE_CHOICES)
@@ -785,6 +818,10 @@ class RuneInstance(Rune):
     notes = models.TextField(null=True, blank=True)
 
     __original_assigned_to_id = None
+    __original_set_summary = None
+
+    # Fields that rune builds summarize in their rune set summary
+    SET_SUMMARY_FIELDS = ['type', 'main_stat', 'slot']
 
     # Old substat fields to be removed later, but still used
     substat_1 = models.IntegerField(choices=Rune.STAT_CHOICES, null=True, blank=True)
@@ -802,10 +839,35 @@ class RuneInstance(Rune):
 
     class Meta:
         ordering = ['slot', 'type', 'level']
+        indexes = [
+            GinIndex(fields=['substats'], name='runeinstance_substats'),
+        ] + [
+            # Rune filters always include the owner, so stat thresholds are answered by a range scan of one index
+            models.Index(fields=['owner', field], name=f'runeinstance_owner_{field}')
+            for field in RuneStatValues.STAT_VALUE_FIELDS.values()
+        ]
 
     def __init__(self, *args, **kwargs):
         super(RuneInstance, self).__init__(*args, **kwargs)
         self.__original_assigned_to_id = self.assigned_to_id
+        self.__original_set_summary = self._set_summary_values()
+
+    def _set_summary_values(self):
+        # Read from __dict__ so deferred fields are not loaded just to be compared
+        return [self.__dict__.get(field) for field in self.SET_SUMMARY_FIELDS]
+
+    def _changed_build_ids(self):
+        # Rune builds holding this rune whose rune set summary is stale after a change of type, main stat or slot
+        if self._set_summary_values() == self.__original_set_summary:
+            return []
+
+        return list(
+            RuneBuild.runes.through.objects.filter(runeinstance_id=self.pk).values_list('runebuild_id', flat=True)
+        )
+
+    def update_fields(self):
+        super().update_fields()
+        self.update_stat_values()
 
     def clean(self):
         super().clean()
@@ -820,8 +882,31 @@ class RuneInstance(Rune):
             )
 
     def save(self, *args, **kwargs):
+        adding = self._state.adding
         super().save(*args, **kwargs)
 
+        build_ids = [] if adding else self._changed_build_ids()
+        self.__original_set_summary = self._set_summary_values()
+
+        recompute = deferred_rune_recompute()
+        if recompute is not None:
+            if self.assigned_to:
+                RuneInstance.objects.filter(
+                    assigned_to=self.assigned_to, slot=self.slot
+                ).exclude(pk=self.pk).update(assigned_to=None)
+
+            recompute.monster_ids.update(
+                pk for pk in [self.assigned_to_id, self.__original_assigned_to_id] if pk is not None
+            )
+            recompute.build_ids.update(build_ids)
+            return
+
+        if build_ids:
+            # Custom and RTA builds are not touched by the cascade below
+            recompute = DeferredRuneRecompute()
+            recompute.build_ids.update(build_ids)
+            recompute.run()
+
         if self.assigned_to:
             # Check no other runes are in this slot
             for rune in RuneInstance.objects.filter(assigned_to=self.assigned_to, slot=self.slot).exclude(pk=self.pk):
@@ -841,7 +926,7 @@ class RuneInstance(Rune):
                 MonsterInstance.objects.get(pk=self.__original_assigned_to_id)._initialize_rune_build()
 
 
-class RuneBuild(models.Model):
+class RuneBuild(RuneSetSummary):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     owner = models.ForeignKey(Summoner, on_delete=models.CASCADE)
     name = models.CharField(max_length=200, default='')
@@ -850,6 +935,22 @@ class RuneBuild(models.Model):
     monster = models.ForeignKey(MonsterInstance, on_delete=models.CASCADE)
 
     # Stat bonuses
+    STAT_FIELDS = [
+        'hp',
+        'hp_pct',
+        'attack',
+        'attack_pct',
+        'defense',
+        'defense_pct',
+        'speed',
+        'speed_pct',
+        'crit_rate',
+        'crit_damage',
+        'resistance',
+        'accuracy',
+        'avg_efficiency',
+    ] + RuneSetSummary.RUNE_SET_SUMMARY_FIELDS
+
     hp = models.IntegerField(default=0)
     hp_pct = models.IntegerField(default=0)
     attack = models.IntegerField(default=0)
@@ -868,51 +969,12 @@ class RuneBuild(models.Model):
     def __str__(self):
         return f'{self.name} - {self.rune_set_summary}'
 
-    @cached_property
+    @property
     def rune_set_summary(self):
-        num_equipped = self.runes.count()
-
-        if not num_equipped:
+        if not self.rune_sets and not self.rune_set_broken:
             return 'Empty'
 
-        # Build list of set names
-        active_set_names = [
-            RuneInstance.TYPE_CHOICES[rune_type - 1][1] for rune_type in self.active_rune_sets
-        ]
-
-        # Check if broken set present
-        active_set_required_count = sum([
-            RuneInstance.RUNE_SET_BONUSES[rune_set]['count'] for rune_set in self.active_rune_sets
-        ])
-
-        if num_equipped > active_set_required_count:
-            active_set_names.append('Broken')
-
-        set_summary = '/'.join(active_set_names)
-
-        # Build main stat list for even slots
-        main_stat_summary = '/'.join([
-            rune.get_main_stat_display() for rune in self.runes.filter(slot__in=[2, 4, 6])
-        ])
-
-        return f'{set_summary} - {main_stat_summary}'
-
-    @cached_property
-    def rune_set_bonus_text(self):
-        return [
-            f'{RuneInstance.RUNE_SET_BONUSES[active_set]["description"]}' for active_set in self.active_rune_sets
-        ]
-
-    @cached_property
-    def active_rune_sets(self):
-        completed_sets = []
-
-        for set_counts in self.runes.values('type').order_by().annotate(count=Count('type')):
-            required = RuneInstance.RUNE_SET_COUNT_REQUIREMENTS[set_counts['type']]
-            present = set_counts['count']
-            completed_sets.extend([set_counts['type']] * (present // required))
-
-        return completed_sets
+        return f'{self._rune_set_names()} - {self._main_stat_names()}'
 
     @cached_property
     def rune_stats(self):
@@ -932,37 +994,27 @@ class RuneBuild(models.Model):
 
         return stats
 
-    def update_stats(self):
-        # Sum all stats on the runes
-        stat_bonuses = {}
-        runes = self.runes.all()
-        for stat, _ in RuneInstance.STAT_CHOICES:
-            if stat not in stat_bonuses:
-                stat_bonuses[stat] = 0
-
-            for rune in runes:
-                stat_bonuses[stat] += rune.get_stat(stat)
-
-        # Add in any active set bonuses
-        stat_bonuses[RuneInstance.STAT_SPD_PCT] = 0
-        for active_set in self.active_rune_sets:
-            stat = RuneInstance.RUNE_SET_BONUSES[active_set]['stat']
-            if stat:
-                stat_bonuses[stat] += RuneInstance.RUNE_SET_BONUSES[active_set]['value']
-
-        self.hp = stat_bonuses.get(base.Stats.STAT_HP, 0)
-        self.hp_pct = stat_bonuses.get(base.Stats.STAT_HP_PCT, 0)
-        self.attack = stat_bonuses.get(base.Stats.STAT_ATK, 0)
-        self.attack_pct = stat_bonuses.get(base.Stats.STAT_ATK_PCT, 0)
-        self.defense = stat_bonuses.get(base.Stats.STAT_DEF, 0)
-        self.defense_pct = stat_bonuses.get(base.Stats.STAT_DEF_PCT, 0)
-        self.speed = stat_bonuses.get(base.Stats.STAT_SPD, 0)
-        self.speed_pct = stat_bonuses.get(base.Stats.STAT_SPD_PCT, 0)
-        self.crit_rate = stat_bonuses.get(base.Stats.STAT_CRIT_RATE_PCT, 0)
-        self.crit_damage = stat_bonuses.get(base.Stats.STAT_CRIT_DMG_PCT, 0)
-        self.resistance = stat_bonuses.get(base.Stats.STAT_RESIST_PCT, 0)
-        self.accuracy = stat_bonuses.get(base.Stats.STAT_ACCURACY_PCT, 0)
-        self.avg_efficiency = self.runes.aggregate(Avg('efficiency'))['efficiency__avg'] or 0.0
+    def update_stats(self, runes=None):
+        # Sum all stats on the runes. Runes that are already loaded can be passed in to skip querying them.
+        if runes is None:
+            runes = list(self.runes.all())
+
+        stat_bonuses = rune_stats.build_stats(runes)
+
+        self.hp = stat_bonuses[base.Stats.STAT_HP]
+        self.hp_pct = stat_bonuses[base.Stats.STAT_HP_PCT]
+        self.attack = stat_bonuses[base.Stats.STAT_ATK]
+        self.attack_pct = stat_bonuses[base.Stats.STAT_ATK_PCT]
+        self.defense = stat_bonuses[base.Stats.STAT_DEF]
+        self.defense_pct = stat_bonuses[base.Stats.STAT_DEF_PCT]
+        self.speed = stat_bonuses[base.Stats.STAT_SPD]
+        self.speed_pct = stat_bonuses[base.Stats.STAT_SPD_PCT]
+        self.crit_rate = stat_bonuses[base.Stats.STAT_CRIT_RATE_PCT]
+        self.crit_damage = stat_bonuses[base.Stats.STAT_CRIT_DMG_PCT]
+        self.resistance = stat_bonuses[base.Stats.STAT_RESIST_PCT]
+        self.accuracy = stat_bonuses[base.Stats.STAT_ACCURACY_PCT]
+        self.avg_efficiency = _average_efficiency(runes)
+        self.update_rune_set_summary(runes)
 
 
 class RuneCraftInstance(RuneCraft):
@@ -1063,3 +1115,118 @@ class BuildingInstance(models.Model):
     def save(self, *args, **kwargs):
         self.update_fields()
         super(BuildingInstance, self).save(*args, **kwargs)
+
+
+def create_missing_rune_builds(monsters, batch_size=None):
+    # Bulk version of the build initialization in MonsterInstance.save(), for monsters saved in a deferred recompute
+    # scope. Only the builds are saved; the monsters' build fields are left for the caller to save.
+    new_builds = []
+    for mon in monsters:
+        if mon.default_build is None:
+            mon.default_build = RuneBuild(owner_id=mon.owner_id, monster=mon, name='Equipped Runes')
+            new_builds.append(mon.default_build)
+
+        if mon.rta_build is None:
+            mon.rta_build = RuneBuild(owner_id=mon.owner_id, monster=mon, name='Real-Time Arena')
+            new_builds.append(mon.rta_build)
+
+    RuneBuild.objects.bulk_create(new_builds, batch_size=batch_size)
+    return new_builds
+
+
+_deferred_recompute = threading.local()
+
+
+def deferred_rune_recompute():
+    # The rune recompute scope active in this thread, if any
+    return getattr(_deferred_recompute, 'scope', None)
+
+
+@contextmanager
+def defer_rune_recompute():
+    # Within this block, saving runes and monsters and changing rune builds only records what was affected instead of
+    # cascading into stat recomputes. Each affected monster and rune build is recomputed once when the outermost block
+    # exits without an error.
+    recompute = deferred_rune_recompute()
+    if recompute is not None:
+        yield recompute
+        return
+
+    recompute = DeferredRuneRecompute()
+    _deferred_recompute.scope = recompute
+    try:
+        yield recompute
+    finally:
+        _deferred_recompute.scope = None
+
+    recompute.run()
+
+
+class DeferredRuneRecompute:
+    BATCH_SIZE = 500
+
+    def __init__(self):
+        self.monster_ids = set()
+        self.build_ids = set()
+
+    def run(self):
+        if not self.monster_ids and not self.build_ids:
+            return
+
+        with transaction.atomic():
+            monsters = list(
+                MonsterInstance.objects.filter(
+                    pk__in=self.monster_ids
+                ).select_related(
+                    'monster', 'default_build', 'rta_build'
+                ).prefetch_related(
+                    'runeinstance_set'
+                )
+            )
+            create_missing_rune_builds(monsters, self.BATCH_SIZE)
+            self._equip_default_builds(monsters)
+
+            builds = []
+            for mon in monsters:
+                runes = mon.runeinstance_set.all()
+                mon.update_rune_stats()
+                mon.default_build.update_stats(runes)
+                builds.append(mon.default_build)
+
+            other_builds = RuneBuild.objects.filter(
+                pk__in=self.build_ids.difference(build.pk for build in builds)
+            ).prefetch_related('runes')
+            for build in other_builds:
+                build.update_stats(build.runes.all())
+                builds.append(build)
+
+            MonsterInstance.objects.bulk_update(
+                monsters,
+                MonsterInstance.RUNE_STAT_FIELDS + ['default_build', 'rta_build'],
+                batch_size=self.BATCH_SIZE,
+            )
+            RuneBuild.objects.bulk_update(builds, RuneBuild.STAT_FIELDS, batch_size=self.BATCH_SIZE)
+
+        self.monster_ids = set()
+        self.build_ids = set()
+
+    def _equip_default_builds(self, monsters):
+        # Sync the default build through table rows with the equipped runes without going through m2m signals
+        through = RuneBuild.runes.through
+        equipped = {
+            (mon.default_build_id, rune.pk) for mon in monsters for rune in mon.runeinstance_set.all()
+        }
+        stored = {
+            (build_id, rune_id): pk for pk, build_id, rune_id in through.objects.filter(
+                runebuild_id__in=[mon.default_build_id for mon in monsters]
+            ).values_list('pk', 'runebuild_id', 'runeinstance_id')
+        }
+
+        removed = [pk for key, pk in stored.items() if key not in equipped]
+        if removed:
+            through.objects.filter(pk__in=removed).delete()
+
+        through.objects.bulk_create(
+            [through(runebuild_id=build_id, runeinstance_id=rune_id) for build_id, rune_id in equipped.difference(stored)],
+            batch_size=self.BATCH_SIZE,
+        )
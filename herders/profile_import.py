@@ -0,0 +1,292 @@
+import hashlib
+import json
+
+from django.core.mail import mail_admins
+
+from .models import MonsterInstance, RuneInstance, RuneBuild, create_missing_rune_builds, defer_rune_recompute
+
+IMPORT_COUNT_KEYS = ('inserted', 'updated', 'deleted', 'unchanged')
+
+# Fingerprinted sections of an uploaded profile and the keys of the upload each is made of. Monsters also depend on the
+# building list, which identifies the storage building.
+IMPORT_SECTIONS = {
+    'unit_list': ['unit_list', 'unit_lock_list', 'building_list'],
+    'runes': ['runes'],
+    'artifacts': ['artifacts'],
+    'inventory': ['inventory_info', 'rune_craft_item_list', 'artifact_crafts'],
+    'buildings': ['building_list', 'deco_list'],
+    'world_arena_rune_equip_list': ['world_arena_rune_equip_list'],
+}
+
+# Sections each import step reads. Runes and artifacts are saved and deleted as one set across the equipped and
+# unequipped lists, and RTA builds refer to monsters and runes by their database IDs.
+IMPORT_STEP_SECTIONS = {
+    'buildings': ['buildings'],
+    'storage': ['inventory'],
+    'monsters': ['unit_list'],
+    'monster_pieces': ['inventory'],
+    'runes': ['unit_list', 'runes'],
+    'rta_builds': ['unit_list', 'runes', 'world_arena_rune_equip_list'],
+    'rune_crafts': ['inventory'],
+    'artifacts': ['unit_list', 'artifacts'],
+    'artifact_crafts': ['inventory'],
+}
+
+
+_encoder = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+
+
+class ArrayDigest:
+    # SHA-256 of an encoded array, built up one element at a time. Same as hashing the encoding of the whole array.
+
+    def __init__(self):
+        self.digest = hashlib.sha256(b'[')
+        self.count = 0
+
+    def add(self, item):
+        if self.count:
+            self.digest.update(b',')
+        self.digest.update(_encoder.encode(item).encode())
+        self.count += 1
+
+    def hexdigest(self):
+        digest = self.digest.copy()
+        digest.update(b']')
+        return digest.hexdigest()
+
+
+class UploadScan:
+    # What the import needs from the streamed arrays of an upload, collected while it is first read: a digest of each
+    # array for section_fingerprints() and the number of equipped runes and artifacts, for progress totals
+
+    def __init__(self):
+        self.digests = {}
+        self.equipped = {'runes': 0, 'artifacts': 0}
+
+    def add(self, key, item):
+        self.digests.setdefault(key, ArrayDigest()).add(item)
+
+        if key == 'unit_list':
+            self.equipped['runes'] += len(item.get('runes') or [])
+            self.equipped['artifacts'] += len(item.get('artifacts') or [])
+
+
+def section_fingerprints(data, options, digests=None):
+    # Import options change what is saved from the same data, so they are part of every fingerprint. Each key of a
+    # section is hashed separately so that arrays streamed from the upload can be hashed as they are read, passed in
+    # digests by key.
+    if data.get('command') == 'VisitFriend':
+        data = data['friend']
+
+    digests = digests or {}
+    encoded_options = _encoder.encode(options).encode()
+    fingerprints = {}
+
+    for section, keys in IMPORT_SECTIONS.items():
+        digest = hashlib.sha256(encoded_options)
+        for key in keys:
+            if key in digests:
+                key_digest = digests[key].hexdigest()
+            else:
+                key_digest = hashlib.sha256(_encoder.encode(data.get(key)).encode()).hexdigest()
+            digest.update(f'{key}:{key_digest};'.encode())
+        fingerprints[section] = digest.hexdigest()
+
+    return fingerprints
+
+
+def skipped_steps(fingerprints, previous):
+    # Steps whose sections are all unchanged since the last successful import
+    unchanged = {section for section, fingerprint in fingerprints.items() if previous.get(section) == fingerprint}
+    return {step for step, sections in IMPORT_STEP_SECTIONS.items() if unchanged.issuperset(sections)}
+
+
+class InstanceDiff:
+    # Diffs freshly parsed instances against the owner's stored rows of one model, matched on a natural key
+    # (com2us_id by default). All stored rows are loaded in a single query up front so that only inserted and
+    # changed instances are written, in bulk. Bulk writes skip save(), so callers prepare derived fields first.
+
+    BATCH_SIZE = 500
+
+    def __init__(self, model, owner, key='com2us_id', ignore_fields=()):
+        self.model = model
+        self.owner = owner
+        self.key = key
+        self.fields = [
+            field for field in model._meta.concrete_fields
+            if not field.primary_key and field.name not in ignore_fields
+        ]
+        self.counts = dict.fromkeys(IMPORT_COUNT_KEYS, 0)
+
+        # Stored rows by pk and by natural key. Duplicates of a key and rows without one are never matched.
+        self.rows = {}
+        self.stored = {}
+        self.unmatched = set()
+        for row in model.objects.filter(owner=owner).values('pk', *[field.attname for field in self.fields]):
+            self.rows[row['pk']] = row
+            self.unmatched.add(row['pk'])
+            if row[key] is not None:
+                self.stored.setdefault(row[key], row)
+
+    def changed_fields(self, obj, row):
+        return [field for field in self.fields if getattr(obj, field.attname) != row[field.attname]]
+
+    def save(self, objs):
+        # Returns the instances inserted and updated
+        to_create = []
+        to_update = []
+        write_fields = set()
+
+        for obj in objs:
+            row = self.stored.get(getattr(obj, self.key))
+
+            if row is None:
+                to_create.append(obj)
+                continue
+
+            # Parsed instances may be new objects for a stored row, so point them at it
+            self.unmatched.discard(row['pk'])
+            obj.pk = row['pk']
+            obj._state.adding = False
+
+            changed = self.changed_fields(obj, row)
+            if changed:
+                to_update.append(obj)
+                write_fields.update(field.name for field in changed)
+            else:
+                self.counts['unchanged'] += 1
+
+        self.model.objects.bulk_create(to_create, batch_size=self.BATCH_SIZE)
+        if to_update:
+            self.model.objects.bulk_update(to_update, write_fields, batch_size=self.BATCH_SIZE)
+
+        self.counts['inserted'] += len(to_create)
+        self.counts['updated'] += len(to_update)
+        return to_create, to_update
+
+    def missing_rows(self):
+        # Stored values of the rows that no parsed instance matched
+        return [self.rows[pk] for pk in self.unmatched]
+
+    def missing(self):
+        return self.model.objects.filter(pk__in=self.unmatched)
+
+    def missing_batches(self):
+        # Primary keys of the missing rows in lists of at most BATCH_SIZE
+        missing = sorted(self.unmatched)
+        return [missing[idx:idx + self.BATCH_SIZE] for idx in range(0, len(missing), self.BATCH_SIZE)]
+
+    def delete(self, pks):
+        # Deletes and the cascades Django runs for them are bounded by the number of keys, so callers delete large
+        # sets in batches instead of a single statement listing every key
+        _, deleted = self.model.objects.filter(pk__in=pks).delete()
+        self.counts['deleted'] += deleted.get(self.model._meta.label, 0)
+        self.unmatched.difference_update(pks)
+
+    def delete_missing(self):
+        for pks in self.missing_batches():
+            self.delete(pks)
+
+
+def unequip_replaced_runes(runes, batch):
+    # Bulk writes skip RuneInstance.save(), which unequips the rune a monster already has in the slot a rune is
+    # equipped to. Stored runes not in the upload so far that share a monster and slot with a rune of the batch were
+    # replaced in game, so they are unequipped here instead. runes is the InstanceDiff the batch was saved with.
+    equipped = {(rune.assigned_to_id, rune.slot) for rune in batch if rune.assigned_to_id}
+    replaced = [
+        pk for pk in runes.unmatched
+        if (runes.rows[pk]['assigned_to_id'], runes.rows[pk]['slot']) in equipped
+    ]
+    if replaced:
+        RuneInstance.objects.filter(pk__in=replaced).update(assigned_to=None)
+        for pk in replaced:
+            runes.rows[pk]['assigned_to_id'] = None
+
+    return replaced
+
+
+def stale_rune_build_ids(runes, updated):
+    # Rune builds holding updated runes whose type, main stat or slot changed, so their rune set summary needs a
+    # recompute. runes is the InstanceDiff the updated runes were saved with.
+    changed = [
+        rune.pk for rune in updated
+        if any(getattr(rune, field) != runes.rows[rune.pk][field] for field in RuneInstance.SET_SUMMARY_FIELDS)
+    ]
+    if not changed:
+        return []
+
+    return list(
+        RuneBuild.runes.through.objects.filter(runeinstance_id__in=changed).values_list('runebuild_id', flat=True)
+    )
+
+
+def sync_rta_builds(owner, assignments, batch_size=InstanceDiff.BATCH_SIZE):
+    # Set the runes of each assigned monster's RTA build from the world_arena_rune_equip_list entries of an upload.
+    # Monsters and runes are resolved in one query each and the build through table rows are diffed and written in
+    # bulk, bypassing the m2m_changed signals. Returns the number of builds changed.
+    rune_ids = {}
+    for assignment in assignments:
+        rune_ids.setdefault(assignment['occupied_id'], set()).add(assignment['rune_id'])
+
+    monsters = {}
+    for mon in MonsterInstance.objects.filter(
+        owner=owner,
+        com2us_id__in=rune_ids,
+    ).select_related('default_build', 'rta_build').order_by():
+        monsters.setdefault(mon.com2us_id, []).append(mon)
+
+    runes = {}
+    for rune_pk, com2us_id, slot in RuneInstance.objects.filter(
+        owner=owner,
+        com2us_id__in=set().union(*rune_ids.values()),
+    ).values_list('pk', 'com2us_id', 'slot').order_by():
+        runes.setdefault(com2us_id, []).append((rune_pk, slot))
+
+    assigned = {}
+    for mon_id, mon_rune_ids in rune_ids.items():
+        mon = monsters.get(mon_id)
+        if mon is None or len(mon) > 1:
+            # Continue with import in case monster was not imported or doesn't exist in user profile for some reason
+            continue
+        mon = mon[0]
+
+        mon_runes = [rune for com2us_id in mon_rune_ids for rune in runes.get(com2us_id, [])]
+        slots = sorted(slot for _, slot in mon_runes)
+        if len(slots) != len(set(slots)):
+            mail_admins('Rune Build Validation Error', f'monster: {mon.id}\r\nrunes: {list(mon_rune_ids)}\r\nslots: {slots}')
+            continue
+
+        assigned[mon] = {rune_pk for rune_pk, _ in mon_runes}
+
+    # Monsters added by a deferred import don't have their builds yet
+    new_build_ids = {build.pk for build in create_missing_rune_builds(assigned, batch_size)}
+    if new_build_ids:
+        MonsterInstance.objects.bulk_update(
+            [mon for mon in assigned if new_build_ids.intersection([mon.default_build_id, mon.rta_build_id])],
+            ['default_build', 'rta_build'],
+            batch_size=batch_size,
+        )
+
+    through = RuneBuild.runes.through
+    expected = {(mon.rta_build_id, rune_pk) for mon, rune_pks in assigned.items() for rune_pk in rune_pks}
+    stored = {
+        (build_id, rune_pk): pk for pk, build_id, rune_pk in through.objects.filter(
+            runebuild_id__in=[mon.rta_build_id for mon in assigned],
+        ).values_list('pk', 'runebuild_id', 'runeinstance_id')
+    }
+
+    removed = [key for key in stored if key not in expected]
+    added = expected.difference(stored)
+    if removed:
+        through.objects.filter(pk__in=[stored[key] for key in removed]).delete()
+    through.objects.bulk_create(
+        [through(runebuild_id=build_id, runeinstance_id=rune_pk) for build_id, rune_pk in added],
+        batch_size=batch_size,
+    )
+
+    # Recompute the stats of every changed build once, at the end of the import if one is in progress
+    changed = {build_id for build_id, _ in removed}.union(build_id for build_id, _ in added)
+    with defer_rune_recompute() as recompute:
+        recompute.build_ids.update(changed)
+
+    return len(changed)
@@ -1,10 +1,13 @@
+from collections.abc import Iterator
+
 from dateutil.parser import *
 from django.utils.timezone import get_current_timezone
 from jsonschema.exceptions import best_match
 
 from bestiary.models import Monster, Building, GameItem
 from herders.models import MonsterInstance, RuneInstance, RuneCraftInstance, MonsterPiece, BuildingInstance, ArtifactInstance, ArtifactCraftInstance
-from herders.profile_schema import HubUserLoginValidator, VisitFriendValidator
+from herders.profile_schema import HubUserLoginValidator, HubUserLoginStreamedValidator, HubUserLoginItemValidators, VisitFriendValidator, STREAMED_SECTIONS
+from herders.profile_stream import JSONObjectStream
 
 # Game ID to field mappings
 inventory_enhance_monster_map = {
@@ -72,12 +75,45 @@ inventory_craft_map = {
 }
 
 
-def validate_sw_json(data, summoner):
+def _schema_error_text(schema_error, path=()):
+    return 'Error in field {}:\n{}'.format(
+        '[%s]' % ']['.join(repr(index) for index in list(path) + list(schema_error.path)),
+        schema_error.message
+    )
+
+
+def load_sw_json(fp, keep_streamed=True):
+    # Read an uploaded file without holding its whole text in memory. Elements of the large arrays are validated as
+    # they are read so an invalid file is rejected at the first bad element. With keep_streamed=False they are
+    # dropped once validated and the arrays come back empty, which is enough for validate_sw_json(streamed=True).
+    data = {}
+
+    for key, value in JSONObjectStream(fp, STREAMED_SECTIONS):
+        validator = HubUserLoginItemValidators.get(key)
+        if isinstance(value, Iterator):
+            # A streamed array
+            items = data[key] = []
+            for idx, item in enumerate(value):
+                schema_error = validator and best_match(validator.iter_errors(item))
+                if schema_error:
+                    return data, _schema_error_text(schema_error, [key, idx])
+                if keep_streamed:
+                    items.append(item)
+        else:
+            data[key] = value
+
+    return data, None
+
+
+def validate_sw_json(data, summoner, streamed=False):
     validation_errors = []
 
     # Determine if it's a friend visit or a personal data file
     if 'friend' in data:
         validator = VisitFriendValidator
+    elif streamed:
+        # Array elements were already validated by load_sw_json()
+        validator = HubUserLoginStreamedValidator
     else:
         validator = HubUserLoginValidator
 
@@ -85,10 +121,7 @@ def validate_sw_json(data, summoner):
     schema_error = best_match(validator.iter_errors(data))
 
     if schema_error:
-        schema_error = 'Error in field {}:\n{}'.format(
-            '[%s]' % ']['.join(repr(index) for index in schema_error.path),
-            schema_error.message
-        )
+        schema_error = _schema_error_text(schema_error)
     else:
         # Do some supplementary checking
         if 'friend' in data:
@@ -103,65 +136,118 @@ def validate_sw_json(data, summoner):
     return schema_error, validation_errors
 
 
-def parse_sw_json(data, owner, options):
-    wizard_id = None
-    parsed_runes = []
-    parsed_rune_crafts = []
-    parsed_artifacts = []
-    parsed_artifact_crafts = []
-    parsed_mons = []
-    parsed_inventory = {}
-    parsed_monster_pieces = []
-    parsed_buildings = []
-
-    # Grab the friend
-    if data.get('command') == 'VisitFriend':
-        data = data['friend']
-
-    if 'wizard_info' in data:
-        wizard_id = data['wizard_info'].get('wizard_id')
-
-    building_list = data['building_list']
-    deco_list = data['deco_list']
-    inventory_info = data.get('inventory_info')  # Optional
-    unit_list = data['unit_list']
-    runes_info = data.get('runes')  # Optional
-    locked_mons = data.get('unit_lock_list')  # Optional
-    craft_info = data.get('rune_craft_item_list')  # Optional
-    artifact_info = data.get('artifacts')  # Optional
-    artifact_craft_info = data.get('artifact_crafts')  # Optional
-
-    # Buildings
-    storage_building_id = None
-    for building in building_list:
-        if building:
-            # Find which one is the storage building
-            if building.get('building_master_id') == 25:
-                storage_building_id = building.get('building_id')
-                break
+def _stored_instances(model, owner, key='com2us_id'):
+    # All of the owner's instances by natural key in one query, in the same order .first() would pick from
+    instances = {}
+    for instance in model.objects.filter(owner=owner):
+        instances.setdefault(getattr(instance, key), []).append(instance)
+    return instances
+
+
+def _first_stored(stored, key):
+    instances = stored.get(key)
+    return instances[0] if instances else None
+
+
+# Array elements parsed between database lookups
+PARSE_BATCH_SIZE = 500
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
 
-    for deco in deco_list:
-        try:
-            base_building = Building.objects.get(com2us_id=deco['master_id'])
-        except Building.DoesNotExist:
-            continue
+class ProfileParser:
+    # Parses an uploaded profile into model instances one section at a time. The arrays of the upload are only iterated,
+    # never indexed, so they can be streamed from a spooled upload and each step saves what it parsed in batches
+    # without holding the whole profile in memory. The owner's stored instances are loaded once per model when first
+    # needed.
 
-        level = deco['level']
+    def __init__(self, data, owner, options):
+        # Grab the friend
+        if data.get('command') == 'VisitFriend':
+            data = data['friend']
 
-        try:
-            building_instance = BuildingInstance.objects.get(owner=owner, building=base_building)
-        except BuildingInstance.DoesNotExist:
-            building_instance = BuildingInstance(owner=owner, building=base_building)
-        except BuildingInstance.MultipleObjectsReturned:
-            # Should only be 1 ever - use the first and delete the others.
-            building_instance = BuildingInstance.objects.filter(owner=owner, building=base_building).first()
-            BuildingInstance.objects.filter(owner=owner, building=base_building).exclude(pk=building_instance.pk).delete()
+        self.data = data
+        self.owner = owner
+        self.options = options
+        self.wizard_id = data['wizard_info'].get('wizard_id') if 'wizard_info' in data else None
+        self.rta_assignments = data['world_arena_rune_equip_list']
 
-        building_instance.level = level
-        parsed_buildings.append(building_instance)
+        # Find which one is the storage building
+        self.storage_building_id = None
+        for building in data['building_list']:
+            if building and building.get('building_master_id') == 25:
+                self.storage_building_id = building.get('building_id')
+                break
+
+        self.monsters_by_id = {}
+        self.stored = {}
+        # Primary keys of the imported monsters by com2us ID, once monsters() has been read through
+        self.monster_pks = None
+
+    def load_monsters(self, com2us_ids):
+        # Bestiary monsters by com2us ID, queried in one go for the IDs not looked up yet
+        missing = {com2us_id for com2us_id in com2us_ids if com2us_id is not None} - self.monsters_by_id.keys()
+        if missing:
+            self.monsters_by_id.update(dict.fromkeys(missing))
+            self.monsters_by_id.update((mon.com2us_id, mon) for mon in Monster.objects.filter(com2us_id__in=missing))
+
+    def _stored(self, model, key='com2us_id'):
+        if model not in self.stored:
+            self.stored[model] = _stored_instances(model, self.owner, key)
+        return self.stored[model]
+
+    def buildings(self):
+        parsed_buildings = []
+        deco_list = self.data['deco_list']
+        base_buildings = {
+            bldg.com2us_id: bldg for bldg in Building.objects.filter(com2us_id__in=[deco['master_id'] for deco in deco_list])
+        }
+        stored_buildings = self._stored(BuildingInstance, key='building_id')
+
+        for deco in deco_list:
+            base_building = base_buildings.get(deco['master_id'])
+            if not base_building:
+                continue
+
+            level = deco['level']
+
+            building_instances = stored_buildings.get(base_building.pk)
+            if not building_instances:
+                building_instance = BuildingInstance(owner=self.owner, building=base_building)
+            else:
+                # Should only be 1 ever - use the first and delete the others.
+                building_instance = building_instances[0]
+                if len(building_instances) > 1:
+                    BuildingInstance.objects.filter(pk__in=[bldg.pk for bldg in building_instances[1:]]).delete()
+
+            building_instance.level = level
+            parsed_buildings.append(building_instance)
+
+        return parsed_buildings
+
+    def inventory(self):
+        # Essences, crafting materials and monster pieces
+        parsed_inventory = {}
+        parsed_monster_pieces = []
+        inventory_info = self.data.get('inventory_info')  # Optional
+        if not inventory_info:
+            return parsed_inventory, parsed_monster_pieces
+
+        self.load_monsters(
+            item['item_master_id'] for item in inventory_info
+            if item['item_master_type'] == GameItem.CATEGORY_MONSTER_PIECE
+        )
 
-    # Inventory - essences and summoning pieces
-    if inventory_info:
         for item in inventory_info:
             # Essence Inventory
             if item['item_master_type'] == GameItem.CATEGORY_ESSENCE:
@@ -179,13 +265,13 @@ def parse_sw_json(data, owner, options):
             elif item['item_master_type'] == GameItem.CATEGORY_MONSTER_PIECE:
                 quantity = item.get('item_quantity')
                 if quantity > 0:
-                    mon = get_monster_from_id(item['item_master_id'])
+                    mon = get_monster_from_id(item['item_master_id'], self.monsters_by_id)
 
                     if mon:
                         parsed_monster_pieces.append(MonsterPiece(
                             monster=mon,
                             pieces=quantity,
-                            owner=owner,
+                            owner=self.owner,
                         ))
             elif item['item_master_type'] == GameItem.CATEGORY_MATERIAL_MONSTER:
                 monster = inventory_enhance_monster_map.get(item['item_master_id'])
@@ -198,170 +284,221 @@ def parse_sw_json(data, owner, options):
                 if quantity:
                     parsed_inventory['conversion_stone'] = quantity
 
-    # Extract Rune Inventory (unequipped runes)
-    if runes_info:
-        for rune_data in runes_info:
-            rune = parse_rune_data(rune_data, owner)
+        return parsed_inventory, parsed_monster_pieces
+
+    def monsters(self):
+        # Yields the monsters to import, recording their primary keys for the runes and artifacts they have equipped
+        options = self.options
+        locked_mons = self.data.get('unit_lock_list')  # Optional
+        stored_monsters = self._stored(MonsterInstance)
+        monster_pks = {}
+
+        for batch in _batches(self.data['unit_list'], PARSE_BATCH_SIZE):
+            self.load_monsters(unit_info.get('unit_master_id') for unit_info in batch)
+
+            for unit_info in batch:
+                # Get base monster type
+                com2us_id = unit_info.get('unit_id')
+                monster_type_id = unit_info.get('unit_master_id')
+                mon = None
+
+                if not options['clear_profile']:
+                    mon = _first_stored(stored_monsters, com2us_id)
+
+                if not mon:
+                    mon = MonsterInstance()
+                    is_new = True
+                else:
+                    is_new = False
+
+                mon.com2us_id = com2us_id
+
+                # Base monster
+                base_monster = get_monster_from_id(monster_type_id, self.monsters_by_id)
+                if not base_monster:
+                    # Unable to find a matching monster in the database - either crap data or brand new monster. Don't parse it.
+                    continue
+                mon.monster = base_monster
+
+                mon.stars = unit_info.get('class')
+                mon.level = unit_info.get('unit_level')
+
+                skills = unit_info.get('skills', [])
+                if len(skills) >= 1:
+                    mon.skill_1_level = skills[0][1]
+                if len(skills) >= 2:
+                    mon.skill_2_level = skills[1][1]
+                if len(skills) >= 3:
+                    mon.skill_3_level = skills[2][1]
+                if len(skills) >= 4:
+                    mon.skill_4_level = skills[3][1]
+
+                try:
+                    created_date = get_current_timezone().localize(parse(unit_info.get('create_time')), is_dst=False)
+                    mon.created = created_date
+                except (ValueError, TypeError):
+                    mon.created = None
+
+                mon.owner = self.owner
+                mon.in_storage = unit_info.get('building_id') == self.storage_building_id
+
+                # Set priority levels
+                if options['default_priority'] and is_new:
+                    mon.priority = options['default_priority']
+
+                if mon.monster.archetype == Monster.ARCHETYPE_MATERIAL:
+                    mon.fodder = True
+                    mon.priority = MonsterInstance.PRIORITY_DONE
+
+                # Lock a monster if it's locked in game
+                if options['lock_monsters']:
+                    mon.ignore_for_fusion = locked_mons is not None and mon.com2us_id in locked_mons
+
+                # Equipped runes and artifacts
+                equipped_runes = unit_info.get('runes')
+                equipped_artifacts = unit_info.get('artifacts', [])
+
+                # Check import options to determine if monster should be saved
+                level_ignored = mon.stars < options['minimum_stars']
+                silver_ignored = options['ignore_silver'] and not mon.monster.can_awaken
+                material_ignored = options['ignore_material'] and mon.monster.archetype == Monster.ARCHETYPE_MATERIAL
+                allow_due_to_runes = options['except_with_runes'] and (len(equipped_runes) > 0 or len(equipped_artifacts) > 0)
+                allow_due_to_ld = options['except_light_and_dark'] and mon.monster.element in [Monster.ELEMENT_DARK, Monster.ELEMENT_LIGHT] and mon.monster.archetype != Monster.ARCHETYPE_MATERIAL
+                allow_due_to_fusion = options['except_fusion_ingredient'] and mon.monster.fusion_food
+
+                should_be_skipped = any([level_ignored, silver_ignored, material_ignored])
+                import_anyway = any([allow_due_to_runes, allow_due_to_ld, allow_due_to_fusion])
+
+                if should_be_skipped and not import_anyway:
+                    continue
+
+                # Set custom name if homunculus
+                custom_name = unit_info.get('homunculus_name')
+                if unit_info.get('homunculus') and custom_name:
+                    mon.custom_name = custom_name
+
+                # Stored monsters keep their primary key when saved and new ones are inserted with theirs
+                monster_pks[com2us_id] = mon.pk
+                yield mon
+
+        self.monster_pks = monster_pks
+
+    def _equipped(self, key):
+        # (monster primary key, item data) of the runes or artifacts equipped on the imported monsters
+        if self.monster_pks is None:
+            for _ in self.monsters():
+                pass
+
+        for unit_info in self.data['unit_list']:
+            com2us_id = unit_info.get('unit_id')
+            if com2us_id not in self.monster_pks:
+                continue
+
+            equipped = unit_info.get(key) or []
+            # Sometimes the runes are a dict or a list in the json. Convert to list.
+            if isinstance(equipped, dict):
+                equipped = equipped.values()
+
+            for item_data in equipped:
+                yield self.monster_pks[com2us_id], item_data
+
+    def runes(self):
+        stored_runes = self._stored(RuneInstance)
+
+        # Extract Rune Inventory (unequipped runes)
+        for rune_data in self.data.get('runes') or []:  # Optional
+            rune = parse_rune_data(rune_data, self.owner, stored_runes)
             if rune:
-                rune.owner = owner
+                rune.owner = self.owner
                 rune.assigned_to = None
-                parsed_runes.append(rune)
-
-    # Extract monsters
-    for unit_info in unit_list:
-        # Get base monster type
-        com2us_id = unit_info.get('unit_id')
-        monster_type_id = str(unit_info.get('unit_master_id'))
-        mon = None
+                yield rune
 
-        if not options['clear_profile']:
-            mon = MonsterInstance.objects.filter(com2us_id=com2us_id, owner=owner).first()
-
-        if not mon:
-            mon = MonsterInstance()
-            is_new = True
-        else:
-            is_new = False
-
-        mon.com2us_id = com2us_id
-
-        # Base monster
-        try:
-            mon.monster = Monster.objects.get(com2us_id=monster_type_id)
-        except Monster.DoesNotExist:
-            # Unable to find a matching monster in the database - either crap data or brand new monster. Don't parse it.
-            continue
-
-        mon.stars = unit_info.get('class')
-        mon.level = unit_info.get('unit_level')
-
-        skills = unit_info.get('skills', [])
-        if len(skills) >= 1:
-            mon.skill_1_level = skills[0][1]
-        if len(skills) >= 2:
-            mon.skill_2_level = skills[1][1]
-        if len(skills) >= 3:
-            mon.skill_3_level = skills[2][1]
-        if len(skills) >= 4:
-            mon.skill_4_level = skills[3][1]
-
-        try:
-            created_date = get_current_timezone().localize(parse(unit_info.get('create_time')), is_dst=False)
-            mon.created = created_date
-        except (ValueError, TypeError):
-            mon.created = None
-
-        mon.owner = owner
-        mon.in_storage = unit_info.get('building_id') == storage_building_id
-
-        # Set priority levels
-        if options['default_priority'] and is_new:
-            mon.priority = options['default_priority']
-
-        if mon.monster.archetype == Monster.ARCHETYPE_MATERIAL:
-            mon.fodder = True
-            mon.priority = MonsterInstance.PRIORITY_DONE
-
-        # Lock a monster if it's locked in game
-        if options['lock_monsters']:
-            mon.ignore_for_fusion = locked_mons is not None and mon.com2us_id in locked_mons
-
-        # Equipped runes and artifacts
-        equipped_runes = unit_info.get('runes')
-        equipped_artifacts = unit_info.get('artifacts', [])
-
-        # Check import options to determine if monster should be saved
-        level_ignored = mon.stars < options['minimum_stars']
-        silver_ignored = options['ignore_silver'] and not mon.monster.can_awaken
-        material_ignored = options['ignore_material'] and mon.monster.archetype == Monster.ARCHETYPE_MATERIAL
-        allow_due_to_runes = options['except_with_runes'] and (len(equipped_runes) > 0 or len(equipped_artifacts) > 0)
-        allow_due_to_ld = options['except_light_and_dark'] and mon.monster.element in [Monster.ELEMENT_DARK, Monster.ELEMENT_LIGHT] and mon.monster.archetype != Monster.ARCHETYPE_MATERIAL
-        allow_due_to_fusion = options['except_fusion_ingredient'] and mon.monster.fusion_food
-
-        should_be_skipped = any([level_ignored, silver_ignored, material_ignored])
-        import_anyway = any([allow_due_to_runes, allow_due_to_ld, allow_due_to_fusion])
-
-        if should_be_skipped and not import_anyway:
-            continue
-
-        # Set custom name if homunculus
-        custom_name = unit_info.get('homunculus_name')
-        if unit_info.get('homunculus') and custom_name:
-            mon.custom_name = custom_name
-
-        parsed_mons.append(mon)
-
-        # Sometimes the runes are a dict or a list in the json. Convert to list.
-        if isinstance(equipped_runes, dict):
-            equipped_runes = equipped_runes.values()
-
-        for rune_data in equipped_runes:
-            rune = parse_rune_data(rune_data, owner)
+        for mon_pk, rune_data in self._equipped('runes'):
+            rune = parse_rune_data(rune_data, self.owner, stored_runes)
             if rune:
-                rune.owner = owner
-                rune.assigned_to = mon
-                parsed_runes.append(rune)
+                rune.owner = self.owner
+                rune.assigned_to_id = mon_pk
+                yield rune
 
-        for artifact_data in equipped_artifacts:
-            artifact = parse_artifact_data(artifact_data, owner)
+    def artifacts(self):
+        stored_artifacts = self._stored(ArtifactInstance)
+
+        for mon_pk, artifact_data in self._equipped('artifacts'):
+            artifact = parse_artifact_data(artifact_data, self.owner, stored_artifacts)
             if artifact:
-                artifact.owner = owner
-                artifact.assigned_to = mon
-                parsed_artifacts.append(artifact)
-
-    # Extract grindstones/enchant gems
-    if craft_info:
-        for craft_data in craft_info:
-            craft = parse_rune_craft_data(craft_data, owner)
-            if craft:
-                craft.owner = owner
-                parsed_rune_crafts.append(craft)
+                artifact.owner = self.owner
+                artifact.assigned_to_id = mon_pk
+                yield artifact
 
-    # Extract artifact inventory
-    if artifact_info:
-        for artifact_data in artifact_info:
-            artifact = parse_artifact_data(artifact_data, owner)
+        # Extract artifact inventory
+        for artifact_data in self.data.get('artifacts') or []:  # Optional
+            artifact = parse_artifact_data(artifact_data, self.owner, stored_artifacts)
             if artifact:
-                artifact.owner = owner
+                artifact.owner = self.owner
                 artifact.assigned_to = None
-                parsed_artifacts.append(artifact)
+                yield artifact
 
-    if artifact_craft_info:
-        for craft_data in artifact_craft_info:
-            craft = parse_artifact_craft_data(craft_data, owner)
+    def rune_crafts(self):
+        # Extract grindstones/enchant gems
+        stored_rune_crafts = self._stored(RuneCraftInstance)
+
+        for craft_data in self.data.get('rune_craft_item_list') or []:  # Optional
+            craft = parse_rune_craft_data(craft_data, self.owner, stored_rune_crafts)
             if craft:
-                craft.owner = owner
-                parsed_artifact_crafts.append(craft)
-
-    import_results = {
-        'wizard_id': wizard_id,
-        'monsters': parsed_mons,
-        'monster_pieces': parsed_monster_pieces,
-        'runes': parsed_runes,
-        'rune_crafts': parsed_rune_crafts,
-        'artifacts': parsed_artifacts,
-        'artifact_crafts': parsed_artifact_crafts,
-        'inventory': parsed_inventory,
-        'buildings': parsed_buildings,
-        'rta_assignments': data['world_arena_rune_equip_list']
-    }
+                craft.owner = self.owner
+                yield craft
+
+    def artifact_crafts(self):
+        stored_artifact_crafts = self._stored(ArtifactCraftInstance)
+
+        for craft_data in self.data.get('artifact_crafts') or []:  # Optional
+            craft = parse_artifact_craft_data(craft_data, self.owner, stored_artifact_crafts)
+            if craft:
+                craft.owner = self.owner
+                yield craft
+
 
-    return import_results
+def parse_sw_json(data, owner, options):
+    # Every section parsed at once
+    parser = ProfileParser(data, owner, options)
+
+    # Load everything parsing refers to up front instead of looking it up per object
+    monster_ids = [unit_info.get('unit_master_id') for unit_info in parser.data['unit_list']]
+    monster_ids += [
+        item['item_master_id'] for item in parser.data.get('inventory_info') or []
+        if item['item_master_type'] == GameItem.CATEGORY_MONSTER_PIECE
+    ]
+    parser.load_monsters(monster_ids)
+
+    buildings = parser.buildings()
+    inventory, monster_pieces = parser.inventory()
+    monsters = list(parser.monsters())
+
+    return {
+        'wizard_id': parser.wizard_id,
+        'monsters': monsters,
+        'monster_pieces': monster_pieces,
+        'runes': list(parser.runes()),
+        'rune_crafts': list(parser.rune_crafts()),
+        'artifacts': list(parser.artifacts()),
+        'artifact_crafts': list(parser.artifact_crafts()),
+        'inventory': inventory,
+        'buildings': buildings,
+        'rta_assignments': parser.rta_assignments,
+    }
 
 
-def get_monster_from_id(com2us_id):
+def get_monster_from_id(com2us_id, monsters):
     try:
-        return Monster.objects.get(com2us_id=com2us_id)
+        return monsters.get(int(com2us_id))
     except (TypeError, ValueError):
         raise ValueError('Unable to find monster matching ID ' + str(com2us_id))
-    except Monster.DoesNotExist:
-        return None
 
 
-def parse_rune_data(rune_data, owner):
+def parse_rune_data(rune_data, owner, stored):
     com2us_id = rune_data.get('rune_id')
 
-    rune = RuneInstance.objects.filter(com2us_id=com2us_id, owner=owner).first()
+    rune = _first_stored(stored, com2us_id)
 
     if not rune:
         rune = RuneInstance()
@@ -410,7 +547,7 @@ def parse_rune_data(rune_data, owner):
     return rune
 
 
-def parse_rune_craft_data(craft_data, owner):
+def parse_rune_craft_data(craft_data, owner, stored):
     # craft_type_id = 5 digit number
     # Work backwards to figure it out
     # [-1:] = quality
@@ -418,7 +555,7 @@ def parse_rune_craft_data(craft_data, owner):
     # [:-4] = rune set
 
     com2us_id = craft_data['craft_item_id']
-    craft = RuneCraftInstance.objects.filter(com2us_id=com2us_id, owner=owner).first()
+    craft = _first_stored(stored, com2us_id)
 
     if not craft:
         craft = RuneCraftInstance(com2us_id=com2us_id, owner=owner)
@@ -439,10 +576,10 @@ def parse_rune_craft_data(craft_data, owner):
     return craft
 
 
-def parse_artifact_data(artifact_data, owner):
+def parse_artifact_data(artifact_data, owner, stored):
     com2us_id = artifact_data.get('rid')
 
-    artifact = ArtifactInstance.objects.filter(com2us_id=com2us_id, owner=owner).first()
+    artifact = _first_stored(stored, com2us_id)
 
     if not artifact:
         artifact = ArtifactInstance(com2us_id=com2us_id, owner=owner)
@@ -483,7 +620,7 @@ def parse_artifact_data(artifact_data, owner):
     return artifact
 
 
-def parse_artifact_craft_data(craft_data, owner):
+def parse_artifact_craft_data(craft_data, owner, stored):
     # master_id = 12 digit number
     # Digits:
     #   [0] = always 1, skip
@@ -494,7 +631,7 @@ def parse_artifact_craft_data(craft_data, owner):
     #   [9:] = effect
 
     com2us_id = craft_data['rid']
-    craft = ArtifactCraftInstance.objects.filter(com2us_id=com2us_id, owner=owner).first()
+    craft = _first_stored(stored, com2us_id)
 
     if not craft:
         craft = ArtifactCraftInstance(com2us_id=com2us_id, owner=owner)
@@ -1,4 +1,6 @@
-from jsonschema import Draft4Validator
+import copy
+
+from jsonschema import Draft4Validator, RefResolver
 
 HubUserLoginSchema = {
     '$schema': 'http://json-schema.org/draft-04/schema#',
@@ -246,3 +248,21 @@ VisitFriendSchema = {
 
 HubUserLoginValidator = Draft4Validator(HubUserLoginSchema)
 VisitFriendValidator = Draft4Validator(VisitFriendSchema)
+
+# Uploads are streamed, validating each element of the large arrays as it is read. The rest of the document is then
+# validated with the element schemas of those arrays removed so they aren't validated twice.
+STREAMED_SECTIONS = ['unit_list', 'runes', 'rune_craft_item_list', 'artifacts']
+
+HubUserLoginItemValidators = {
+    section: Draft4Validator(
+        HubUserLoginSchema['properties'][section]['items'],
+        resolver=RefResolver.from_schema(HubUserLoginSchema),
+    )
+    for section in STREAMED_SECTIONS if section in HubUserLoginSchema['properties']
+}
+
+HubUserLoginStreamedSchema = copy.deepcopy(HubUserLoginSchema)
+for section in HubUserLoginItemValidators:
+    HubUserLoginStreamedSchema['properties'][section] = {'type': 'array'}
+
+HubUserLoginStreamedValidator = Draft4Validator(HubUserLoginStreamedSchema)
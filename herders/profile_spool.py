@@ -0,0 +1,77 @@
+import gzip
+import hashlib
+import os
+import re
+import secrets
+import tempfile
+import time
+
+from django.conf import settings
+
+READ_SIZE = 64 * 1024
+SPOOL_SUFFIX = '.json.gz'
+
+# Uploaded profiles are stored gzipped, one file per upload, under the SHA-256 of their content and a random suffix.
+# A task only needs that reference to find its upload, and can remove the file when it is done without affecting
+# another queued import of the same file.
+
+
+def _path(ref):
+    if not re.fullmatch(r'[0-9a-f]{64}-[0-9a-f]{16}', ref):
+        raise ValueError(f'Invalid profile spool reference {ref!r}')
+    return os.path.join(settings.PROFILE_SPOOL_DIR, ref + SPOOL_SUFFIX)
+
+
+def store(fp):
+    # Returns the reference to pass to com2us_data_import
+    os.makedirs(settings.PROFILE_SPOOL_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+
+    with tempfile.NamedTemporaryFile(dir=settings.PROFILE_SPOOL_DIR, suffix='.tmp', delete=False) as tmp:
+        try:
+            with gzip.GzipFile(fileobj=tmp, mode='wb', compresslevel=6, mtime=0) as gz:
+                for chunk in iter(lambda: fp.read(READ_SIZE), b''):
+                    digest.update(chunk)
+                    gz.write(chunk)
+        except Exception:
+            os.remove(tmp.name)
+            raise
+
+    ref = f'{digest.hexdigest()}-{secrets.token_hex(8)}'
+    os.replace(tmp.name, _path(ref))
+    return ref
+
+
+def open_spooled(ref):
+    return gzip.open(_path(ref), 'rb')
+
+
+def release(ref):
+    # Remove a spooled upload once its import is done
+    try:
+        os.remove(_path(ref))
+    except FileNotFoundError:
+        pass
+
+
+def clean_expired(max_age=None):
+    if max_age is None:
+        max_age = settings.PROFILE_SPOOL_MAX_AGE
+
+    expire_before = time.time() - max_age
+    removed = 0
+
+    try:
+        entries = list(os.scandir(settings.PROFILE_SPOOL_DIR))
+    except FileNotFoundError:
+        return removed
+
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < expire_before:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+
+    return removed
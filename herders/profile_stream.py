@@ -0,0 +1,180 @@
+import codecs
+import json
+import sys
+from collections.abc import Iterator
+
+READ_SIZE = 64 * 1024
+
+
+def _interned_object(pairs):
+    # Decoding values one at a time loses the key sharing json.load() gets, which costs more memory than the
+    # raw text streaming saves
+    return {sys.intern(key): value for key, value in pairs}
+
+
+_decoder = json.JSONDecoder(object_pairs_hook=_interned_object)
+# For values that are skipped, which don't need interned keys
+_plain_decoder = json.JSONDecoder()
+_whitespace = ' \t\n\r'
+
+
+class JSONObjectStream:
+    # Reads the members of a top level JSON object from a file a chunk at a time. The values of keys in stream_keys
+    # that are arrays are returned as iterators over their elements, so only one element has to be held in memory at
+    # a time. Every other value is decoded whole. If keys is given, only those members are returned and the others are
+    # skipped an array element at a time.
+
+    def __init__(self, fp, stream_keys=(), read_size=READ_SIZE, keys=None):
+        self.fp = fp
+        self.stream_keys = stream_keys
+        self.keys = keys
+        self.read_size = read_size
+        self.text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _read(self, size):
+        if self.eof:
+            return False
+
+        # Drop what has been consumed so the buffer stays around the size of the value being decoded
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+
+        while True:
+            chunk = self.fp.read(size)
+            if not chunk:
+                if isinstance(chunk, bytes):
+                    self.buffer += self.text_decoder.decode(chunk, final=True)
+                self.eof = True
+                return False
+
+            if isinstance(chunk, bytes):
+                # May decode to nothing if the chunk ends partway through a character
+                chunk = self.text_decoder.decode(chunk)
+
+            if chunk:
+                self.buffer += chunk
+                return True
+
+    def _peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _whitespace:
+                self.pos += 1
+
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+
+            if not self._read(self.read_size):
+                raise ValueError('Unexpected end of JSON data')
+
+    def _expect(self, chars):
+        char = self._peek()
+        if char not in chars:
+            raise ValueError(f'Expecting one of {chars!r} at character {self.pos}, found {char!r}')
+        self.pos += 1
+        return char
+
+    def _decode_value(self, decoder=_decoder):
+        self._peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Incomplete value. Grow the buffer geometrically so large values are decoded in linear time.
+                if not self._read(max(self.read_size, len(self.buffer) - self.pos)):
+                    raise
+                continue
+
+            # A number or literal ending exactly at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self._read(self.read_size):
+                continue
+
+            self.pos = end
+            return value
+
+    def _iter_array(self, decoder=_decoder):
+        if self._peek() == ']':
+            self.pos += 1
+            return
+
+        while True:
+            yield self._decode_value(decoder)
+            if self._expect(',]') == ']':
+                return
+
+    def _skip_value(self):
+        if self._peek() == '[':
+            self.pos += 1
+            for _ in self._iter_array(_plain_decoder):
+                pass
+        else:
+            self._decode_value(_plain_decoder)
+
+    def __iter__(self):
+        self._expect('{')
+        if self._peek() == '}':
+            self.pos += 1
+            return
+
+        while True:
+            key = self._decode_value()
+            if not isinstance(key, str):
+                raise ValueError(f'Expecting a property name at character {self.pos}')
+            self._expect(':')
+
+            if self.keys is not None and key not in self.keys:
+                self._skip_value()
+            elif key in self.stream_keys and self._peek() == '[':
+                self.pos += 1
+                items = self._iter_array()
+                yield key, items
+
+                # Skip whatever the caller didn't consume
+                for _ in items:
+                    pass
+            else:
+                yield key, self._decode_value()
+
+            if self._expect(',}') == '}':
+                return
+
+
+class SpooledArray:
+    # A streamed array of a document that is left in its file and read again, one element at a time, each time it is
+    # iterated
+
+    def __init__(self, open_fp, key, count):
+        self.open_fp = open_fp
+        self.key = key
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        with self.open_fp() as fp:
+            for _, items in JSONObjectStream(fp, [self.key], keys=[self.key]):
+                yield from items
+                return
+
+
+def load_spooled(open_fp, stream_keys=(), on_item=None):
+    # Same result as json.load(), except that the non-empty arrays of stream_keys are returned as SpooledArray, which
+    # read the file opened by open_fp() again when iterated, so they are never held in memory whole. on_item(key, item)
+    # is called with each of their elements as the file is first read.
+    data = {}
+    with open_fp() as fp:
+        for key, value in JSONObjectStream(fp, stream_keys):
+            if isinstance(value, Iterator):
+                count = 0
+                for item in value:
+                    count += 1
+                    if on_item is not None:
+                        on_item(key, item)
+                value = SpooledArray(open_fp, key, count) if count else []
+
+            data[key] = value
+
+    return data
@@ -0,0 +1,379 @@
+import heapq
+import time
+from collections import Counter
+
+from django.db.models import Q
+
+from bestiary.models import Rune
+from . import rune_stats
+from .models import RuneInstance, RuneBuild
+
+# Stats of the finished monster, in the order of the projected stat vectors below. The last entry of each vector is
+# the rune efficiency, used as the objective when no stat weights are given.
+FINAL_STATS = [
+    Rune.STAT_HP,
+    Rune.STAT_ATK,
+    Rune.STAT_DEF,
+    Rune.STAT_SPD,
+    Rune.STAT_CRIT_RATE_PCT,
+    Rune.STAT_CRIT_DMG_PCT,
+    Rune.STAT_RESIST_PCT,
+    Rune.STAT_ACCURACY_PCT,
+]
+EFFICIENCY = len(FINAL_STATS)
+VECTOR_SIZE = EFFICIENCY + 1
+
+# Percentage stats and the flat stat they add to
+PERCENT_STATS = {**Rune.CONVERTS_TO_FLAT_STAT, Rune.STAT_SPD_PCT: Rune.STAT_SPD}
+
+
+class RuneOptimizer:
+    # Searches the owner's runes for the best rune builds for a monster.
+    #
+    # Runes are projected onto the monster's final stats at its current grade and level, so a build is scored by
+    # adding six vectors. Slots are searched depth first, fewest candidates first, and a branch is dropped as soon as
+    # the best stats still reachable by filling the remaining slots can't satisfy the minimums, complete a requested
+    # set combination or beat the worst of the best builds found so far. Finished builds are checked and scored with
+    # the same stat math as RuneBuild.update_stats().
+    NODE_CHECK_INTERVAL = 1024
+
+    def __init__(self, monster, set_combinations=(), main_stats=None, minimums=None, weights=None, limit=10,
+                 time_budget=5, runes=None, include_equipped=False):
+        # set_combinations: lists of rune set types, one entry per completed set. A build has to complete every set
+        #   of at least one combination. Any sets are allowed if there are none.
+        # main_stats: dict of slot to the allowed main stats for that slot
+        # minimums: dict of stat to the minimum value of the monster's stat with the runes equipped
+        # weights: dict of stat to a non-negative weight. The score of a build is the weighted sum of the monster's
+        #   stats, or the total efficiency of its runes if there are no weights.
+        # runes: rune pool to search instead of the owner's unequipped runes and the runes equipped on the monster
+        self.monster = monster
+        self.set_combinations = [Counter(combination) for combination in set_combinations]
+        self.main_stats = main_stats or {}
+        self.minimums = minimums or {}
+        self.weights = weights or {}
+        self.limit = limit
+        self.time_budget = time_budget
+        self.runes = runes
+        self.include_equipped = include_equipped
+
+        self.timed_out = False
+        self.nodes = 0
+
+        for combination in self.set_combinations:
+            if sum(Rune.RUNE_SET_COUNT_REQUIREMENTS[rune_set] * count for rune_set, count in combination.items()) > 6:
+                raise ValueError(f'Set combination {list(combination.elements())} needs more than 6 runes')
+
+        for stat, weight in self.weights.items():
+            if weight < 0:
+                raise ValueError(f'Weight for stat {stat} is negative')
+
+        for stat in list(self.minimums) + list(self.weights):
+            if stat not in FINAL_STATS:
+                raise ValueError(f'Unknown stat {stat}')
+
+        self.base_stats = monster.base_stats
+
+    def run(self):
+        # The best builds, best first, as unsaved RuneBuilds with the runes in candidate_runes and the score in score
+        self.timed_out = False
+        self.nodes = 0
+        self._deadline = time.monotonic() + self.time_budget if self.time_budget is not None else None
+
+        weight_vector = [0.0] * VECTOR_SIZE
+        if self.weights:
+            for stat, weight in self.weights.items():
+                weight_vector[FINAL_STATS.index(stat)] = weight
+        else:
+            weight_vector[EFFICIENCY] = 1.0
+        self._weight_vector = weight_vector
+        self._base_score = self._score([self.base_stats.get(stat, 0) for stat in FINAL_STATS] + [0])
+
+        # Stats still missing from each minimum after the monster's base stats
+        self._minimums = [
+            (FINAL_STATS.index(stat), value - self.base_stats.get(stat, 0)) for stat, value in self.minimums.items()
+        ]
+
+        self._set_bonus_vectors = {}
+        for rune_set, (_, stat, value) in rune_stats.SET_BONUSES.items():
+            vector = [0] * rune_stats.STAT_COUNT
+            vector[stat] = value
+            self._set_bonus_vectors[rune_set] = self._project(vector)
+
+        self._slots = self._candidates()
+        if any(not candidates for _, candidates in self._slots):
+            return []
+
+        self._required_runes = [
+            {rune_set: Rune.RUNE_SET_COUNT_REQUIREMENTS[rune_set] * count for rune_set, count in combination.items()}
+            for combination in self.set_combinations
+        ]
+
+        self._combination_sets = set(rune_set for required in self._required_runes for rune_set in required)
+        self._targets = {}
+        self._remaining_bounds = {}
+
+        # Bound the score and each stat with a minimum separately
+        self._score_target = tuple(self._weight_vector)
+        self._minimum_targets = [
+            (idx, value, tuple(1 if stat == idx else 0 for stat in range(VECTOR_SIZE))) for idx, value in self._minimums
+        ]
+
+        # The score bound ignores the minimums, which can leave it far above the best build that meets them. Adding
+        # the amount each stat is above its minimum, times a multiplier, to the score can't make a build that meets
+        # the minimums score less, so the best such relaxed score is a bound too. Pick the multipliers that give the
+        # lowest bound before placing any runes.
+        self._multipliers = []
+        relaxed = list(self._weight_vector)
+        for idx, value, _ in self._minimum_targets:
+            best = None
+            for multiplier in [0] + [2 ** power for power in range(-4, 13)]:
+                weights = list(relaxed)
+                weights[idx] += multiplier
+                bound = self._remaining(0, Counter(), tuple(weights))
+                if bound is None:
+                    return []
+                bound -= multiplier * value
+                if best is None or bound < best[0]:
+                    best = (bound, multiplier)
+            relaxed[idx] += best[1]
+            self._multipliers.append((idx, value, best[1]))
+        self._relaxed_target = tuple(relaxed)
+
+        # Try the runes that do best on the relaxed score first, so builds that meet the minimums are found early
+        for _, candidates in self._slots:
+            candidates.sort(key=lambda candidate: self._dot(candidate[1], self._relaxed_target), reverse=True)
+
+        self._best = []
+        self._sequence = 0
+        self._search(0, [], [0] * VECTOR_SIZE, Counter())
+
+        return [self._build(runes, score) for score, _, runes in sorted(self._best, reverse=True)]
+
+    def _pool(self):
+        if self.runes is not None:
+            return list(self.runes)
+
+        runes = RuneInstance.objects.filter(owner=self.monster.owner_id)
+        if not self.include_equipped:
+            runes = runes.filter(Q(assigned_to__isnull=True) | Q(assigned_to=self.monster))
+
+        return list(runes)
+
+    def _project(self, vector):
+        # Linear part of converting the rune's stats to the monster's stats. Percentage stats are rounded up when
+        # applied, which _remaining() allows for.
+        projected = [vector[stat] for stat in FINAL_STATS]
+        for pct_stat, stat in PERCENT_STATS.items():
+            projected[FINAL_STATS.index(stat)] += self.base_stats[stat] * vector[pct_stat] / 100
+        return projected + [0]
+
+    def _allowed_rune_sets(self):
+        # Rune set types that may appear in a build, or None for any
+        if not self.set_combinations:
+            return None
+
+        allowed = set()
+        for combination in self.set_combinations:
+            required = sum(Rune.RUNE_SET_COUNT_REQUIREMENTS[rune_set] * count for rune_set, count in combination.items())
+            if required < 6:
+                return None
+            allowed.update(combination)
+
+        return allowed
+
+    def _candidates(self):
+        allowed_sets = self._allowed_rune_sets()
+        relevant = [idx for idx, weight in enumerate(self._weight_vector) if weight]
+        relevant.extend(idx for idx, _ in self._minimums if idx not in relevant)
+
+        # Runes of sets that can't affect the score, the minimums or the set combinations compete with each other
+        relevant_sets = set(rune_set for combination in self.set_combinations for rune_set in combination)
+        relevant_sets.update(
+            rune_set for rune_set, vector in self._set_bonus_vectors.items() if any(vector[idx] for idx in relevant)
+        )
+
+        groups = {}
+        for rune in self._pool():
+            if allowed_sets is not None and rune.type not in allowed_sets:
+                continue
+            if rune.slot in self.main_stats and rune.main_stat not in self.main_stats[rune.slot]:
+                continue
+
+            vector = self._project(rune_stats.rune_vector(rune))
+            vector[EFFICIENCY] = rune.efficiency or 0
+            group = rune.type if rune.type in relevant_sets else None
+            groups.setdefault((rune.slot, group), []).append((rune, vector))
+
+        slots = {slot: [] for slot in range(1, 7)}
+        for (slot, _), group in groups.items():
+            slots[slot].extend(self._undominated(group, relevant))
+
+        return sorted(slots.items(), key=lambda item: len(item[1]))
+
+    def _undominated(self, group, relevant):
+        # A rune can be left out when at least limit runes of the same slot and group are as good in every stat that
+        # matters, because each of them would make a build at least as good as any build using it
+        kept = []
+        for idx, (rune, vector) in enumerate(group):
+            dominated_by = 0
+            for other_idx, (_, other) in enumerate(group):
+                if other_idx == idx:
+                    continue
+                if all(other[stat] >= vector[stat] for stat in relevant) and (
+                    other_idx < idx or any(other[stat] > vector[stat] for stat in relevant)
+                ):
+                    dominated_by += 1
+                    if dominated_by >= self.limit:
+                        break
+
+            if dominated_by < self.limit:
+                kept.append((rune, vector))
+
+        return kept
+
+    def _score(self, vector):
+        return self._dot(vector, self._weight_vector)
+
+    @staticmethod
+    def _dot(vector, weights):
+        return sum(weight * value for weight, value in zip(weights, vector) if weight)
+
+    def _target(self, weights):
+        # For weights over the projected stats: the sets that matter, the best value of a rune of each of those sets
+        # and of a rune of any set in each slot, and how much rounding up percentage stats can add
+        if weights not in self._targets:
+            bonuses = {
+                rune_set: self._dot(vector, weights) for rune_set, vector in self._set_bonus_vectors.items()
+                if self._dot(vector, weights) > 0
+            }
+            tracked = sorted(self._combination_sets.union(bonuses))
+
+            slot_best = []
+            for _, candidates in self._slots:
+                best_by_set = {}
+                for rune, vector in candidates:
+                    value = self._dot(vector, weights)
+                    if value > best_by_set.get(rune.type, value - 1):
+                        best_by_set[rune.type] = value
+                slot_best.append((
+                    max(best_by_set.values()),
+                    [(idx, best_by_set[rune_set]) for idx, rune_set in enumerate(tracked) if rune_set in best_by_set],
+                ))
+
+            rounding = self._dot([1 if stat in PERCENT_STATS.values() else 0 for stat in FINAL_STATS] + [0], weights)
+            self._targets[weights] = (tracked, bonuses, slot_best, rounding)
+
+        return self._targets[weights]
+
+    def _remaining(self, depth, set_counts, weights):
+        # Most the remaining slots and the set bonuses can add to the weighted stats of a build that completes a set
+        # combination, or None if no combination can be completed anymore. Each remaining slot takes the best value
+        # of either a rune of one of the sets that matter or a rune of any set, so it never underestimates.
+        tracked, _, _, rounding = self._target(weights)
+        best = self._best_remaining(weights, depth, tuple(set_counts[rune_set] for rune_set in tracked))
+        return None if best is None else best + rounding
+
+    def _best_remaining(self, weights, depth, counts):
+        key = (weights, depth, counts)
+        if key in self._remaining_bounds:
+            return self._remaining_bounds[key]
+
+        tracked, bonuses, slot_best, _ = self._target(weights)
+        remaining = len(self._slots) - depth
+        possible = not self._required_runes or any(
+            sum(max(0, needed - counts[tracked.index(rune_set)]) for rune_set, needed in required.items()) <= remaining
+            for required in self._required_runes
+        )
+
+        if not possible:
+            best = None
+        elif not remaining:
+            best = sum(
+                bonuses[rune_set] * (count // Rune.RUNE_SET_COUNT_REQUIREMENTS[rune_set])
+                for rune_set, count in zip(tracked, counts) if rune_set in bonuses
+            )
+        else:
+            best_any, best_by_set = slot_best[depth]
+            options = [(best_any, counts)]
+            for idx, value in best_by_set:
+                options.append((value, counts[:idx] + (counts[idx] + 1,) + counts[idx + 1:]))
+
+            best = None
+            for value, next_counts in options:
+                rest = self._best_remaining(weights, depth + 1, next_counts)
+                if rest is not None and (best is None or value + rest > best):
+                    best = value + rest
+
+        self._remaining_bounds[key] = best
+        return best
+
+    def _search(self, depth, runes, stats, set_counts):
+        self.nodes += 1
+        if self._deadline is not None and self.nodes % self.NODE_CHECK_INTERVAL == 0 \
+                and time.monotonic() > self._deadline:
+            self.timed_out = True
+
+        if self.timed_out:
+            return
+
+        remaining_score = self._remaining(depth, set_counts, self._score_target)
+        if remaining_score is None:
+            return
+
+        for idx, value, weights in self._minimum_targets:
+            if stats[idx] + self._remaining(depth, set_counts, weights) < value:
+                return
+
+        if len(self._best) == self.limit:
+            worst = self._best[0][0] - self._base_score - self._score(stats)
+            if remaining_score <= worst:
+                return
+
+            if self._multipliers:
+                relaxed = self._remaining(depth, set_counts, self._relaxed_target) + sum(
+                    multiplier * (stats[idx] - value) for idx, value, multiplier in self._multipliers
+                )
+                if relaxed <= worst:
+                    return
+
+        if depth == len(self._slots):
+            self._finish(runes)
+            return
+
+        for rune, vector in self._slots[depth][1]:
+            set_counts[rune.type] += 1
+            runes.append(rune)
+            self._search(depth + 1, runes, [a + b for a, b in zip(stats, vector)], set_counts)
+            runes.pop()
+            set_counts[rune.type] -= 1
+
+            if self.timed_out:
+                return
+
+    def _final_stats(self, runes):
+        bonuses = rune_stats.flat_stats(rune_stats.build_stats(runes), self.base_stats)
+        final = [self.base_stats.get(stat, 0) + bonuses[stat] for stat in FINAL_STATS]
+        for pct_stat, stat in Rune.CONVERTS_TO_FLAT_STAT.items():
+            final[FINAL_STATS.index(stat)] += bonuses[pct_stat]
+
+        return final + [sum(rune.efficiency or 0 for rune in runes)]
+
+    def _finish(self, runes):
+        final = self._final_stats(runes)
+        if any(final[FINAL_STATS.index(stat)] < value for stat, value in self.minimums.items()):
+            return
+
+        self._sequence += 1
+        entry = (self._score(final), self._sequence, list(runes))
+        if len(self._best) < self.limit:
+            heapq.heappush(self._best, entry)
+        elif entry[0] > self._best[0][0]:
+            heapq.heapreplace(self._best, entry)
+
+    def _build(self, runes, score):
+        runes = sorted(runes, key=lambda rune: rune.slot)
+        build = RuneBuild(owner_id=self.monster.owner_id, monster=self.monster, name='Optimizer')
+        build.update_stats(runes)
+        build.candidate_runes = runes
+        build.score = score
+        return build
@@ -0,0 +1,103 @@
+from collections import Counter
+from math import ceil
+
+from bestiary.models import Rune
+
+# Rune stats are summed as fixed width lists indexed by stat ID, so a build is a single addition over its runes instead
+# of a scan through every rune's substats per stat. Index 0 is unused.
+STAT_COUNT = Rune.STAT_SPD_PCT + 1
+EMPTY_STATS = (0,) * STAT_COUNT
+
+# (required rune count, stat, value) for every set with a stat bonus
+SET_BONUSES = {
+    rune_set: (Rune.RUNE_SET_COUNT_REQUIREMENTS[rune_set], bonus['stat'], int(bonus['value']))
+    for rune_set, bonus in Rune.RUNE_SET_BONUSES.items()
+    if bonus['stat'] is not None
+}
+
+
+def rune_vector(rune):
+    # Same values as rune.get_stat() for every stat. Filled from lowest to highest precedence so the main stat wins
+    # over the innate stat, which wins over the substats.
+    vector = [0] * STAT_COUNT
+    grinds = rune.substats_grind_value or []
+
+    for idx in reversed(range(len(rune.substats or []))):
+        vector[rune.substats[idx]] = rune.substat_values[idx] + (grinds[idx] if idx < len(grinds) else 0)
+
+    if rune.innate_stat:
+        vector[rune.innate_stat] = rune.innate_stat_value or 0
+    if rune.main_stat:
+        vector[rune.main_stat] = rune.main_stat_value or 0
+
+    return vector
+
+
+def build_stats(runes):
+    # Stat totals of the runes with completed set bonuses added. The Swift bonus is left as STAT_SPD_PCT.
+    runes = list(runes)
+    totals = list(map(sum, zip(EMPTY_STATS, *(rune_vector(rune) for rune in runes))))
+
+    for rune_set, count in Counter(rune.type for rune in runes).items():
+        if rune_set in SET_BONUSES:
+            required, stat, value = SET_BONUSES[rune_set]
+            totals[stat] += value * (count // required)
+
+    return totals
+
+
+def _percent_of(base_value, percent):
+    return int(ceil(round(base_value * (percent / 100.0), 3)))
+
+
+def flat_stats(totals, base_stats):
+    # Convert HP/ATK/DEF percentage totals to flat bonuses based on base_stats, a dict of flat stat to base value
+    stats = {stat: totals[stat] for stat, _ in Rune.STAT_CHOICES}
+    for stat, converts_to in Rune.CONVERTS_TO_FLAT_STAT.items():
+        stats[stat] = _percent_of(base_stats[converts_to], totals[stat])
+
+    # Swift adds a percentage to a normally flat stat
+    stats[Rune.STAT_SPD] += _percent_of(base_stats[Rune.STAT_SPD], totals[Rune.STAT_SPD_PCT])
+
+    return stats
+
+
+# Completed rune sets are stored packed two bits per rune set type, enough for the three 2-sets that six runes can
+# complete. Rune set types start at 1.
+RUNE_SET_BITS = 2
+RUNE_SET_MASK = (1 << RUNE_SET_BITS) - 1
+SUMMARY_SLOTS = (2, 4, 6)
+
+
+def rune_set_summary(runes):
+    # Values of the RuneSetSummary fields for the runes
+    runes = list(runes)
+    packed = 0
+    in_sets = 0
+
+    for rune_set, count in Counter(rune.type for rune in runes).items():
+        completed = count // Rune.RUNE_SET_COUNT_REQUIREMENTS[rune_set]
+        packed |= completed << (rune_set - 1) * RUNE_SET_BITS
+        in_sets += completed * Rune.RUNE_SET_COUNT_REQUIREMENTS[rune_set]
+
+    summary = {
+        'rune_sets': packed,
+        'rune_set_broken': len(runes) > in_sets,
+    }
+    main_stats = {rune.slot: rune.main_stat for rune in runes}
+    for slot in SUMMARY_SLOTS:
+        summary[f'slot_{slot}_main_stat'] = main_stats.get(slot)
+
+    return summary
+
+
+def unpack_rune_sets(packed):
+    # Completed rune set types, each repeated once per time it is completed
+    rune_sets = []
+    rune_set = 1
+    while packed:
+        rune_sets.extend([rune_set] * (packed & RUNE_SET_MASK))
+        packed >>= RUNE_SET_BITS
+        rune_set += 1
+
+    return rune_sets
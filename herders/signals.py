@@ -1,9 +1,13 @@
+from functools import partial
+
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.db.models import Count
-from django.db.models.signals import post_save, m2m_changed
+from django.db.models.signals import post_init, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 
-from .models import MonsterInstance, RuneInstance, RuneBuild, RuneCraftInstance
+from . import summoner_cache
+from .models import Summoner, MonsterInstance, RuneInstance, RuneBuild, RuneCraftInstance, deferred_rune_recompute
 
 
 @receiver(post_save, sender=MonsterInstance)
@@ -13,6 +17,28 @@ def update_profile_date(sender, instance, **kwargs):
     instance.owner.save()
 
 
+@receiver(post_init, sender=Summoner)
+def remember_com2us_id(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred com2us_id isn't loaded
+    instance._loaded_com2us_id = instance.__dict__.get('com2us_id')
+
+
+# Invalidated once the change commits. Before that, a concurrent lookup would cache the old row again.
+@receiver(post_save, sender=Summoner)
+def invalidate_wizard_id_cache(sender, instance, created, using, **kwargs):
+    com2us_id = instance.__dict__.get('com2us_id')
+    if created or com2us_id != instance._loaded_com2us_id:
+        transaction.on_commit(partial(summoner_cache.invalidate, instance._loaded_com2us_id, com2us_id), using=using)
+        instance._loaded_com2us_id = com2us_id
+
+
+@receiver(post_delete, sender=Summoner)
+def invalidate_deleted_wizard_id_cache(sender, instance, using, **kwargs):
+    transaction.on_commit(
+        partial(summoner_cache.invalidate, instance._loaded_com2us_id, instance.__dict__.get('com2us_id')), using=using
+    )
+
+
 @receiver(m2m_changed, sender=RuneBuild.runes.through)
 def validate_rune_build_runes(sender, instance, action, reverse, model, pk_set, **kwargs):
     if action != 'pre_add':
@@ -46,5 +72,10 @@ def update_rune_build_stats(sender, instance, action, **kwargs):
     if action not in ['post_add', 'post_clear', 'post_remove']:
         return
 
+    recompute = deferred_rune_recompute()
+    if recompute is not None:
+        recompute.build_ids.add(instance.pk)
+        return
+
     instance.update_stats()
     instance.save()
@@ -0,0 +1,69 @@
+from collections import Counter
+
+from django.core.cache import cache
+
+from .models import Summoner
+
+# Summoner IDs by wizard ID, invalidated by the Summoner save and delete signals once the change commits.
+# QuerySet.update() and bulk writes send no signals, so changing com2us_id with them leaves stale entries for up to
+# WIZARD_ID_CACHE_TIMEOUT unless invalidate() is called for the old and new wizard IDs.
+WIZARD_ID_CACHE_TIMEOUT = 60 * 60
+
+# Cached for wizard IDs that don't belong to any profile, so anonymous uploads are cached too
+NO_SUMMONER = 0
+
+# Per-process hit/miss counters
+stats = Counter()
+
+
+def _cache_key(wizard_id):
+    return f'summoner-wizard-id-{wizard_id}'
+
+
+def _summoner_from_id(summoner_id):
+    # Logs only need the foreign key, so skip loading the row
+    return Summoner(pk=summoner_id) if summoner_id else None
+
+
+def get_summoner_id(wizard_id):
+    summoner_id = cache.get(_cache_key(wizard_id))
+
+    if summoner_id is None:
+        stats['misses'] += 1
+        summoner_id = Summoner.objects.filter(com2us_id=wizard_id).values_list('pk', flat=True).first() or NO_SUMMONER
+        cache.set(_cache_key(wizard_id), summoner_id, WIZARD_ID_CACHE_TIMEOUT)
+    else:
+        stats['hits'] += 1
+
+    return summoner_id or None
+
+
+def get_summoner(wizard_id):
+    return _summoner_from_id(get_summoner_id(wizard_id))
+
+
+def get_summoners(wizard_ids):
+    # Same as get_summoner() for many wizard IDs, with one cache round trip and at most one query
+    wizard_ids = set(wizard_ids)
+    cached = cache.get_many([_cache_key(wizard_id) for wizard_id in wizard_ids])
+    summoner_ids = {
+        wizard_id: cached[_cache_key(wizard_id)] for wizard_id in wizard_ids if _cache_key(wizard_id) in cached
+    }
+    stats['hits'] += len(summoner_ids)
+
+    missing = wizard_ids - summoner_ids.keys()
+    if missing:
+        stats['misses'] += len(missing)
+        found = {}
+        for summoner_id, wizard_id in Summoner.objects.filter(com2us_id__in=missing).order_by('pk').values_list('pk', 'com2us_id'):
+            found.setdefault(wizard_id, summoner_id)
+
+        new_ids = {wizard_id: found.get(wizard_id, NO_SUMMONER) for wizard_id in missing}
+        cache.set_many({_cache_key(wizard_id): summoner_id for wizard_id, summoner_id in new_ids.items()}, WIZARD_ID_CACHE_TIMEOUT)
+        summoner_ids.update(new_ids)
+
+    return {wizard_id: _summoner_from_id(summoner_id) for wizard_id, summoner_id in summoner_ids.items()}
+
+
+def invalidate(*wizard_ids):
+    cache.delete_many([_cache_key(wizard_id) for wizard_id in wizard_ids if wizard_id is not None])
@@ -1,207 +1,275 @@
-from celery import shared_task, current_task, states
-from django.core.exceptions import ValidationError
-from django.core.mail import mail_admins
+from celery import shared_task, current_task
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from django.db.models.signals import post_save
 
-from .models import Summoner, Storage, MonsterInstance, MonsterPiece, RuneInstance, RuneCraftInstance, BuildingInstance, ArtifactCraftInstance, ArtifactInstance
-from .profile_parser import parse_sw_json
+from .models import Summoner, Storage, MonsterInstance, MonsterPiece, RuneInstance, RuneCraftInstance, BuildingInstance, ArtifactCraftInstance, ArtifactInstance, defer_rune_recompute
+from . import bulk_recompute, profile_spool, profile_stream
+from .import_progress import ImportProgress
+from .profile_import import IMPORT_STEP_SECTIONS, InstanceDiff, UploadScan, section_fingerprints, skipped_steps, \
+    stale_rune_build_ids, sync_rta_builds, unequip_replaced_runes
+from .profile_parser import ProfileParser
+from .profile_schema import STREAMED_SECTIONS
 from .signals import update_profile_date
 
 
 @shared_task
 def com2us_data_import(data, user_id, import_options):
     summoner = Summoner.objects.get(pk=user_id)
-    imported_monsters = []
-    imported_runes = []
-    imported_crafts = []
-    imported_artifacts = []
-    imported_artifact_crafts = []
-    imported_pieces = []
-
-    if not current_task.request.called_directly:
-        current_task.update_state(state=states.STARTED, meta={'step': 'preprocessing'})
-
-    # Import the new objects
-    with transaction.atomic():
-        if import_options['clear_profile']:
-            RuneInstance.objects.filter(owner=summoner).delete()
-            RuneCraftInstance.objects.filter(owner=summoner).delete()
-            MonsterInstance.objects.filter(owner=summoner).delete()
-            MonsterPiece.objects.filter(owner=summoner).delete()
-
-    results = parse_sw_json(data, summoner, import_options)
-
-    if not current_task.request.called_directly:
-        current_task.update_state(state=states.STARTED, meta={'step': 'summoner'})
-
-    # Disconnect summoner profile last update post-save signal to avoid mass spamming updates
-    post_save.disconnect(update_profile_date, sender=MonsterInstance)
-    post_save.disconnect(update_profile_date, sender=RuneInstance)
-    post_save.disconnect(update_profile_date, sender=RuneCraftInstance)
-
-    with transaction.atomic():
-        # Update summoner and inventory
-        if results['wizard_id']:
-            summoner.com2us_id = results['wizard_id']
-            summoner.save()
-
-        summoner.storage.magic_essence[Storage.ESSENCE_LOW] = results['inventory'].get('storage_magic_low', 0)
-        summoner.storage.magic_essence[Storage.ESSENCE_MID] = results['inventory'].get('storage_magic_mid', 0)
-        summoner.storage.magic_essence[Storage.ESSENCE_HIGH] = results['inventory'].get('storage_magic_high', 0)
-        summoner.storage.fire_essence[Storage.ESSENCE_LOW] = results['inventory'].get('storage_fire_low', 0)
-        summoner.storage.fire_essence[Storage.ESSENCE_MID] = results['inventory'].get('storage_fire_mid', 0)
-        summoner.storage.fire_essence[Storage.ESSENCE_HIGH] = results['inventory'].get('storage_fire_high', 0)
-        summoner.storage.water_essence[Storage.ESSENCE_LOW] = results['inventory'].get('storage_water_low', 0)
-        summoner.storage.water_essence[Storage.ESSENCE_MID] = results['inventory'].get('storage_water_mid', 0)
-        summoner.storage.water_essence[Storage.ESSENCE_HIGH] = results['inventory'].get('storage_water_high', 0)
-        summoner.storage.wind_essence[Storage.ESSENCE_LOW] = results['inventory'].get('storage_wind_low', 0)
-        summoner.storage.wind_essence[Storage.ESSENCE_MID] = results['inventory'].get('storage_wind_mid', 0)
-        summoner.storage.wind_essence[Storage.ESSENCE_HIGH] = results['inventory'].get('storage_wind_high', 0)
-        summoner.storage.light_essence[Storage.ESSENCE_LOW] = results['inventory'].get('storage_light_low', 0)
-        summoner.storage.light_essence[Storage.ESSENCE_MID] = results['inventory'].get('storage_light_mid', 0)
-        summoner.storage.light_essence[Storage.ESSENCE_HIGH] = results['inventory'].get('storage_light_high', 0)
-        summoner.storage.dark_essence[Storage.ESSENCE_LOW] = results['inventory'].get('storage_dark_low', 0)
-        summoner.storage.dark_essence[Storage.ESSENCE_MID] = results['inventory'].get('storage_dark_mid', 0)
-        summoner.storage.dark_essence[Storage.ESSENCE_HIGH] = results['inventory'].get('storage_dark_high', 0)
-
-        summoner.storage.wood = results['inventory'].get('wood', 0)
-        summoner.storage.leather = results['inventory'].get('leather', 0)
-        summoner.storage.rock = results['inventory'].get('rock', 0)
-        summoner.storage.ore = results['inventory'].get('ore', 0)
-        summoner.storage.mithril = results['inventory'].get('mithril', 0)
-        summoner.storage.cloth = results['inventory'].get('cloth', 0)
-        summoner.storage.rune_piece = results['inventory'].get('rune_piece', 0)
-        summoner.storage.dust = results['inventory'].get('powder', 0)
-        summoner.storage.symbol_harmony = results['inventory'].get('symbol_harmony', 0)
-        summoner.storage.symbol_transcendance = results['inventory'].get('symbol_transcendance', 0)
-        summoner.storage.symbol_chaos = results['inventory'].get('symbol_chaos', 0)
-        summoner.storage.crystal_water = results['inventory'].get('crystal_water', 0)
-        summoner.storage.crystal_fire = results['inventory'].get('crystal_fire', 0)
-        summoner.storage.crystal_wind = results['inventory'].get('crystal_wind', 0)
-        summoner.storage.crystal_light = results['inventory'].get('crystal_light', 0)
-        summoner.storage.crystal_dark = results['inventory'].get('crystal_dark', 0)
-        summoner.storage.crystal_magic = results['inventory'].get('crystal_magic', 0)
-        summoner.storage.crystal_pure = results['inventory'].get('crystal_pure', 0)
-        summoner.storage.conversion_stone = results['inventory'].get('conversion_stone', 0)
-
-        summoner.storage.fire_angelmon = results['inventory'].get('fire_angelmon', 0)
-        summoner.storage.water_angelmon = results['inventory'].get('water_angelmon', 0)
-        summoner.storage.wind_angelmon = results['inventory'].get('wind_angelmon', 0)
-        summoner.storage.light_angelmon = results['inventory'].get('light_angelmon', 0)
-        summoner.storage.dark_angelmon = results['inventory'].get('dark_angelmon', 0)
-        summoner.storage.fire_king_angelmon = results['inventory'].get('fire_king_angelmon', 0)
-        summoner.storage.water_king_angelmon = results['inventory'].get('water_king_angelmon', 0)
-        summoner.storage.wind_king_angelmon = results['inventory'].get('wind_king_angelmon', 0)
-        summoner.storage.light_king_angelmon = results['inventory'].get('light_king_angelmon', 0)
-        summoner.storage.dark_king_angelmon = results['inventory'].get('dark_king_angelmon', 0)
-        summoner.storage.super_angelmon = results['inventory'].get('super_angelmon', 0)
-        summoner.storage.devilmon = results['inventory'].get('devilmon', 0)
-        summoner.storage.rainbowmon_2_20 = results['inventory'].get('rainbowmon_2_20', 0)
-        summoner.storage.rainbowmon_3_1 = results['inventory'].get('rainbowmon_3_1', 0)
-        summoner.storage.rainbowmon_3_25 = results['inventory'].get('rainbowmon_3_25', 0)
-        summoner.storage.rainbowmon_4_1 = results['inventory'].get('rainbowmon_4_1', 0)
-        summoner.storage.rainbowmon_4_30 = results['inventory'].get('rainbowmon_4_30', 0)
-        summoner.storage.rainbowmon_5_1 = results['inventory'].get('rainbowmon_5_1', 0)
-
-        summoner.storage.save()
-
-        # Save imported buildings
-        for bldg in results['buildings']:
-            bldg.save()
-
-        # Set missing buildings to level 0
-        BuildingInstance.objects.filter(owner=summoner).exclude(pk__in=[bldg.pk for bldg in results['buildings']]).update(level=0)
-
-    if not current_task.request.called_directly:
-        current_task.update_state(state=states.STARTED, meta={'step': 'monsters'})
-
-    with transaction.atomic():
-        # Save the imported monsters
-        for mon in results['monsters']:
-            mon.save()
-            imported_monsters.append(mon.pk)
-
-        # Update saved monster pieces
-        for piece in results['monster_pieces']:
-            piece.save()
-            imported_pieces.append(piece.pk)
-
-    if not current_task.request.called_directly:
-        current_task.update_state(state=states.STARTED, meta={'step': 'runes'})
-
-    with transaction.atomic():
-        # Save imported runes
-        for rune in results['runes']:
-            # Refresh the internal assigned_to_id field, as the monster didn't have a PK when the
-            # relationship was previously set.
-            rune.assigned_to = rune.assigned_to
-            rune.save()
-            imported_runes.append(rune.pk)
-
-    if not current_task.request.called_directly:
-        current_task.update_state(state=states.STARTED, meta={'step': 'rta_builds'})
-
-    with transaction.atomic():
-        # Set RTA rune builds assignments
-        # Group by assignee first
-        assignments = {}
-        for assignment in results['rta_assignments']:
-            mon_com2us_id = assignment['occupied_id']
-            if mon_com2us_id not in assignments:
-                assignments[mon_com2us_id] = []
-            assignments[mon_com2us_id].append(assignment['rune_id'])
-
-        for mon_id, rune_ids in assignments.items():
-            try:
-                mon = MonsterInstance.objects.filter(owner=summoner).get(com2us_id=mon_id)
-                runes = RuneInstance.objects.filter(owner=summoner, com2us_id__in=rune_ids)
-                mon.rta_build.runes.set(runes, clear=True)
-            except (MonsterInstance.MultipleObjectsReturned, MonsterInstance.DoesNotExist):
-                # Continue with import in case monster was not imported or doesn't exist in user profile for some reason
-                continue
-            except ValidationError:
-                slots = runes.values_list('slot', flat=True)
-                mail_admins('Rune Build Validation Error', f'monster: {mon.id}\r\nrunes: {rune_ids}\r\nslots: {slots}')
-
-                # Continue with import
-                continue
-
-    if not current_task.request.called_directly:
-        current_task.update_state(state=states.STARTED, meta={'step': 'rune_crafts'})
-
-    with transaction.atomic():
-        # Save imported rune crafts
-        for craft in results['rune_crafts']:
-            craft.save()
-            imported_crafts.append(craft.pk)
-
-    if not current_task.request.called_directly:
-        current_task.update_state(state=states.STARTED, meta={'step': 'artifacts'})
-
-    with transaction.atomic():
-        # Save imported artifacts
-        for artifact in results['artifacts']:
-            artifact.save()
-            imported_artifacts.append(artifact.pk)
-
-    if not current_task.request.called_directly:
-        current_task.update_state(state=states.STARTED, meta={'step': 'artifact_crafts'})
-
-    with transaction.atomic():
-        # Save imported artifacts
-        for craft in results['artifact_crafts']:
-            craft.save()
-            imported_artifact_crafts.append(craft.pk)
-
-    with transaction.atomic():
-        # Delete objects missing from import
-        if import_options['delete_missing_monsters']:
-            MonsterInstance.objects.filter(owner=summoner).exclude(pk__in=imported_monsters).delete()
-            MonsterPiece.objects.filter(owner=summoner).exclude(pk__in=imported_pieces).delete()
 
+    # Uploads are passed as a profile_spool reference. Tasks queued before that carry the parsed data. The streamed
+    # arrays of a spooled upload are read from the spool again by each step that needs them, instead of being loaded.
+    scan = UploadScan()
+    spool_ref = None
+    if isinstance(data, str):
+        spool_ref = data
+        data = profile_stream.load_spooled(lambda: profile_spool.open_spooled(spool_ref), STREAMED_SECTIONS, scan.add)
+    else:
+        for key in STREAMED_SECTIONS:
+            for item in data.get(key) or []:
+                scan.add(key, item)
+
+    # Skip the steps whose sections are unchanged since the last successful import
+    fingerprints = section_fingerprints(data, import_options, scan.digests)
+    skipped = skipped_steps(fingerprints, {} if import_options['clear_profile'] else summoner.import_fingerprints)
+    counts = dict.fromkeys(['buildings', 'monsters', 'monster_pieces', 'runes', 'rune_crafts', 'artifacts', 'artifact_crafts'])
+
+    # Progress is published to the cache for import_status
+    progress = ImportProgress(current_task.request.id, summoner.pk, skipped)
+
+    if skipped.issuperset(IMPORT_STEP_SECTIONS):
+        progress.finish()
+        if spool_ref:
+            profile_spool.release(spool_ref)
+        return dict(counts, skipped=sorted(skipped), phases=progress.phases)
+
+    try:
+        _import_profile(data, scan, summoner, import_options, skipped, counts, progress)
+    except Exception:
+        progress.finish('FAILURE')
+        raise
+
+    Summoner.objects.filter(pk=summoner.pk).update(import_fingerprints=fingerprints)
+    progress.finish()
+
+    if spool_ref:
+        profile_spool.release(spool_ref)
+
+    return dict(counts, skipped=sorted(skipped), phases=progress.phases)
+
+
+def _import_profile(data, scan, summoner, import_options, skipped, counts, progress):
+    batch_size = InstanceDiff.BATCH_SIZE
+
+    with progress.phase('preprocessing'):
+        # Import the new objects
+        with transaction.atomic():
+            if import_options['clear_profile']:
+                RuneInstance.objects.filter(owner=summoner).delete()
+                RuneCraftInstance.objects.filter(owner=summoner).delete()
+                MonsterInstance.objects.filter(owner=summoner).delete()
+                MonsterPiece.objects.filter(owner=summoner).delete()
+
+        parser = ProfileParser(data, summoner, import_options)
+        parsed_buildings = parser.buildings()
+        inventory, monster_pieces = parser.inventory()
+
+    # Rune stats would otherwise be recomputed on every rune build change. Collect the affected monsters and rune builds
+    # and recompute each once at the end.
+    with defer_rune_recompute() as recompute:
+        # Disconnect summoner profile last update post-save signal to avoid mass spamming updates
+        post_save.disconnect(update_profile_date, sender=MonsterInstance)
+        post_save.disconnect(update_profile_date, sender=RuneInstance)
+        post_save.disconnect(update_profile_date, sender=RuneCraftInstance)
+
+        with progress.phase('storage', total=len(parsed_buildings)), transaction.atomic():
+            # Update summoner and inventory
+            if parser.wizard_id:
+                summoner.com2us_id = parser.wizard_id
+                summoner.save()
+
+                if 'storage' not in skipped:
+                    summoner.storage.magic_essence[Storage.ESSENCE_LOW] = inventory.get('storage_magic_low', 0)
+                    summoner.storage.magic_essence[Storage.ESSENCE_MID] = inventory.get('storage_magic_mid', 0)
+                    summoner.storage.magic_essence[Storage.ESSENCE_HIGH] = inventory.get('storage_magic_high', 0)
+                    summoner.storage.fire_essence[Storage.ESSENCE_LOW] = inventory.get('storage_fire_low', 0)
+                    summoner.storage.fire_essence[Storage.ESSENCE_MID] = inventory.get('storage_fire_mid', 0)
+                    summoner.storage.fire_essence[Storage.ESSENCE_HIGH] = inventory.get('storage_fire_high', 0)
+                    summoner.storage.water_essence[Storage.ESSENCE_LOW] = inventory.get('storage_water_low', 0)
+                    summoner.storage.water_essence[Storage.ESSENCE_MID] = inventory.get('storage_water_mid', 0)
+                    summoner.storage.water_essence[Storage.ESSENCE_HIGH] = inventory.get('storage_water_high', 0)
+                    summoner.storage.wind_essence[Storage.ESSENCE_LOW] = inventory.get('storage_wind_low', 0)
+                    summoner.storage.wind_essence[Storage.ESSENCE_MID] = inventory.get('storage_wind_mid', 0)
+                    summoner.storage.wind_essence[Storage.ESSENCE_HIGH] = inventory.get('storage_wind_high', 0)
+                    summoner.storage.light_essence[Storage.ESSENCE_LOW] = inventory.get('storage_light_low', 0)
+                    summoner.storage.light_essence[Storage.ESSENCE_MID] = inventory.get('storage_light_mid', 0)
+                    summoner.storage.light_essence[Storage.ESSENCE_HIGH] = inventory.get('storage_light_high', 0)
+                    summoner.storage.dark_essence[Storage.ESSENCE_LOW] = inventory.get('storage_dark_low', 0)
+                    summoner.storage.dark_essence[Storage.ESSENCE_MID] = inventory.get('storage_dark_mid', 0)
+                    summoner.storage.dark_essence[Storage.ESSENCE_HIGH] = inventory.get('storage_dark_high', 0)
+
+                    summoner.storage.wood = inventory.get('wood', 0)
+                    summoner.storage.leather = inventory.get('leather', 0)
+                    summoner.storage.rock = inventory.get('rock', 0)
+                    summoner.storage.ore = inventory.get('ore', 0)
+                    summoner.storage.mithril = inventory.get('mithril', 0)
+                    summoner.storage.cloth = inventory.get('cloth', 0)
+                    summoner.storage.rune_piece = inventory.get('rune_piece', 0)
+                    summoner.storage.dust = inventory.get('powder', 0)
+                    summoner.storage.symbol_harmony = inventory.get('symbol_harmony', 0)
+                    summoner.storage.symbol_transcendance = inventory.get('symbol_transcendance', 0)
+                    summoner.storage.symbol_chaos = inventory.get('symbol_chaos', 0)
+                    summoner.storage.crystal_water = inventory.get('crystal_water', 0)
+                    summoner.storage.crystal_fire = inventory.get('crystal_fire', 0)
+                    summoner.storage.crystal_wind = inventory.get('crystal_wind', 0)
+                    summoner.storage.crystal_light = inventory.get('crystal_light', 0)
+                    summoner.storage.crystal_dark = inventory.get('crystal_dark', 0)
+                    summoner.storage.crystal_magic = inventory.get('crystal_magic', 0)
+                    summoner.storage.crystal_pure = inventory.get('crystal_pure', 0)
+                    summoner.storage.conversion_stone = inventory.get('conversion_stone', 0)
+
+                    summoner.storage.fire_angelmon = inventory.get('fire_angelmon', 0)
+                    summoner.storage.water_angelmon = inventory.get('water_angelmon', 0)
+                    summoner.storage.wind_angelmon = inventory.get('wind_angelmon', 0)
+                    summoner.storage.light_angelmon = inventory.get('light_angelmon', 0)
+                    summoner.storage.dark_angelmon = inventory.get('dark_angelmon', 0)
+                    summoner.storage.fire_king_angelmon = inventory.get('fire_king_angelmon', 0)
+                    summoner.storage.water_king_angelmon = inventory.get('water_king_angelmon', 0)
+                    summoner.storage.wind_king_angelmon = inventory.get('wind_king_angelmon', 0)
+                    summoner.storage.light_king_angelmon = inventory.get('light_king_angelmon', 0)
+                    summoner.storage.dark_king_angelmon = inventory.get('dark_king_angelmon', 0)
+                    summoner.storage.super_angelmon = inventory.get('super_angelmon', 0)
+                    summoner.storage.devilmon = inventory.get('devilmon', 0)
+                    summoner.storage.rainbowmon_2_20 = inventory.get('rainbowmon_2_20', 0)
+                    summoner.storage.rainbowmon_3_1 = inventory.get('rainbowmon_3_1', 0)
+                    summoner.storage.rainbowmon_3_25 = inventory.get('rainbowmon_3_25', 0)
+                    summoner.storage.rainbowmon_4_1 = inventory.get('rainbowmon_4_1', 0)
+                    summoner.storage.rainbowmon_4_30 = inventory.get('rainbowmon_4_30', 0)
+                    summoner.storage.rainbowmon_5_1 = inventory.get('rainbowmon_5_1', 0)
+
+                    summoner.storage.save()
+
+            # Save imported buildings
+            if 'buildings' not in skipped:
+                buildings = InstanceDiff(BuildingInstance, summoner, key='building_id')
+                for bldg in parsed_buildings:
+                    bldg.update_fields()
+                buildings.save(parsed_buildings)
+
+                # Set missing buildings to level 0
+                buildings.counts['updated'] += buildings.missing().exclude(level=0).update(level=0)
+                counts['buildings'] = buildings.counts
+
+        # Monsters whose rune stats may have changed, including ones that lose runes deleted below
+        stale_monster_ids = set()
+
+        monsters = None
+        pieces = None
+        if not skipped.issuperset(['monsters', 'monster_pieces']):
+            total = len(parser.data['unit_list']) + len(monster_pieces)
+            with progress.phase('monsters', total=total), transaction.atomic():
+                # Save the imported monsters. Rune stats are computed once runes are saved.
+                if 'monsters' not in skipped:
+                    monsters = InstanceDiff(MonsterInstance, summoner, ignore_fields=MonsterInstance.RUNE_STAT_FIELDS)
+                    for batch in progress.chunks(parser.monsters(), batch_size):
+                        prefetch_related_objects([mon.monster for mon in batch], 'skills')
+                        for mon in batch:
+                            mon.update_fields()
+                        inserted, updated = monsters.save(batch)
+                        stale_monster_ids.update(mon.pk for mon in inserted + updated)
+                    counts['monsters'] = monsters.counts
+
+                # Update saved monster pieces
+                if 'monster_pieces' not in skipped:
+                    pieces = InstanceDiff(MonsterPiece, summoner, key='monster_id')
+                    pieces.save(monster_pieces)
+                    counts['monster_pieces'] = pieces.counts
+
+        runes = None
+        if 'runes' not in skipped:
+            total = len(parser.data.get('runes') or []) + scan.equipped['runes']
+            with progress.phase('runes', total=total), transaction.atomic():
+                # Save imported runes
+                runes = InstanceDiff(RuneInstance, summoner)
+                for batch in progress.chunks(parser.runes(), batch_size):
+                    for rune in batch:
+                        rune.update_fields()
+                    inserted, updated = runes.save(batch)
+                    unequip_replaced_runes(runes, batch)
+                    stale_monster_ids.update(rune.assigned_to_id for rune in inserted + updated)
+                    stale_monster_ids.update(runes.rows[rune.pk]['assigned_to_id'] for rune in updated)
+                    recompute.build_ids.update(stale_rune_build_ids(runes, updated))
+                counts['runes'] = runes.counts
+
+        if 'rta_builds' not in skipped:
+            with progress.phase('rta_builds', total=len(parser.rta_assignments)), transaction.atomic():
+                # Set RTA rune builds assignments
+                sync_rta_builds(summoner, parser.rta_assignments)
+
+        rune_crafts = None
+        if 'rune_crafts' not in skipped:
+            total = len(parser.data.get('rune_craft_item_list') or [])
+            with progress.phase('rune_crafts', total=total), transaction.atomic():
+                # Save imported rune crafts
+                rune_crafts = InstanceDiff(RuneCraftInstance, summoner)
+                for batch in progress.chunks(parser.rune_crafts(), batch_size):
+                    rune_crafts.save(batch)
+                counts['rune_crafts'] = rune_crafts.counts
+
+        artifacts = None
+        if 'artifacts' not in skipped:
+            total = len(parser.data.get('artifacts') or []) + scan.equipped['artifacts']
+            with progress.phase('artifacts', total=total), transaction.atomic():
+                # Save imported artifacts
+                artifacts = InstanceDiff(ArtifactInstance, summoner)
+                for batch in progress.chunks(parser.artifacts(), batch_size):
+                    for artifact in batch:
+                        artifact._update_values()
+                    artifacts.save(batch)
+                counts['artifacts'] = artifacts.counts
+
+        artifact_crafts = None
+        if 'artifact_crafts' not in skipped:
+            total = len(parser.data.get('artifact_crafts') or [])
+            with progress.phase('artifact_crafts', total=total), transaction.atomic():
+                # Save imported artifact crafts
+                artifact_crafts = InstanceDiff(ArtifactCraftInstance, summoner)
+                for batch in progress.chunks(parser.artifact_crafts(), batch_size):
+                    artifact_crafts.save(batch)
+                counts['artifact_crafts'] = artifact_crafts.counts
+
+        # Delete objects missing from import. Skipped steps have nothing missing since the last import.
+        deleted = []
+        if import_options['delete_missing_monsters']:
+            deleted += [monsters, pieces]
         if import_options['delete_missing_runes']:
-            RuneInstance.objects.filter(owner=summoner).exclude(pk__in=imported_runes).delete()
-            RuneCraftInstance.objects.filter(owner=summoner).exclude(pk__in=imported_crafts).delete()
-            ArtifactInstance.objects.filter(owner=summoner).exclude(pk__in=imported_artifacts).delete()
-            ArtifactCraftInstance.objects.filter(owner=summoner).exclude(pk__in=imported_artifact_crafts).delete()
+            deleted += [runes, rune_crafts, artifacts, artifact_crafts]
+        deleted = [diff for diff in deleted if diff]
+
+        with progress.phase('delete_missing', total=sum(len(diff.unmatched) for diff in deleted)), transaction.atomic():
+            if runes in deleted:
+                stale_monster_ids.update(row['assigned_to_id'] for row in runes.missing_rows())
+
+            for diff in deleted:
+                for pks in diff.missing_batches():
+                    diff.delete(pks)
+                    progress.advance(len(pks))
+
+            # Rune stats and the equipped rune build of these are recomputed below
+            stale_monster_ids.discard(None)
+            recompute.monster_ids.update(stale_monster_ids)
+
+        with progress.phase('rune_stats', total=len(recompute.monster_ids) + len(recompute.build_ids)):
+            recompute.run()
+
+
+@shared_task
+def clean_profile_spool():
+    # Removes uploads whose import failed or was never queued
+    return profile_spool.clean_expired()
+
+
+@shared_task
+def recompute_profile(summoner_id):
+    # Recomputes derived fields of the profile's runes and artifacts, e.g. after the efficiency formula changed
+    return bulk_recompute.recompute_profile(Summoner.objects.get(pk=summoner_id))
@@ -0,0 +1,117 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from bestiary.models import Monster
+from herders.bulk_recompute import BulkRecompute, recompute_profile
+from herders.models import Summoner, MonsterInstance, RuneInstance, ArtifactInstance
+
+
+class BulkRecomputeTests(TestCase):
+    fixtures = ['test_summon_monsters']
+
+    def setUp(self):
+        self.summoner = Summoner.objects.create(user=User.objects.create(username='bulkrecompute'))
+        self.monster = MonsterInstance.objects.create(
+            owner=self.summoner, monster=Monster.objects.get(com2us_id=14102), stars=5, level=35,
+        )
+        for slot in range(1, 7):
+            RuneInstance.objects.create(
+                owner=self.summoner,
+                assigned_to=self.monster if slot <= 3 else None,
+                type=RuneInstance.TYPE_ENERGY,
+                stars=6,
+                level=12,
+                slot=slot,
+                main_stat=RuneInstance.MAIN_STATS_BY_SLOT[slot][0],
+                main_stat_value=0,
+                substats=[RuneInstance.STAT_SPD, RuneInstance.STAT_CRIT_RATE_PCT],
+                substat_values=[10, 5],
+                substats_enchanted=[False, False],
+                substats_grind_value=[0, 0],
+            )
+
+        self.expected = {
+            rune.pk: (rune.efficiency, rune.speed) for rune in RuneInstance.objects.filter(owner=self.summoner)
+        }
+        self.monster.refresh_from_db()
+        self.expected_monster = (self.monster.avg_rune_efficiency, self.monster.rune_speed)
+
+    def _make_stale(self):
+        RuneInstance.objects.update(efficiency=0, speed=0)
+        MonsterInstance.objects.update(avg_rune_efficiency=0, rune_speed=0)
+
+    def _assert_recomputed(self, runes):
+        for rune in runes:
+            rune.refresh_from_db()
+            self.assertEqual((rune.efficiency, rune.speed), self.expected[rune.pk])
+
+    def test_recompute(self):
+        self._make_stale()
+
+        recompute = BulkRecompute(RuneInstance.objects.filter(owner=self.summoner), chunk_size=4)
+        recompute.run()
+        self.assertEqual((recompute.checked, recompute.changed), (6, 6))
+        self._assert_recomputed(RuneInstance.objects.filter(owner=self.summoner))
+
+        # Equipped runes are not saved one at a time, so the monster and its build are recomputed too
+        self.monster.refresh_from_db()
+        self.assertEqual((self.monster.avg_rune_efficiency, self.monster.rune_speed), self.expected_monster)
+        self.assertEqual(self.monster.default_build.speed, 30)
+
+        recompute = BulkRecompute(RuneInstance.objects.filter(owner=self.summoner))
+        recompute.run()
+        self.assertEqual((recompute.checked, recompute.changed), (6, 0))
+
+    def test_resume(self):
+        self._make_stale()
+
+        class Interrupted(Exception):
+            pass
+
+        def interrupt(recompute):
+            raise Interrupted
+
+        recompute = BulkRecompute(RuneInstance.objects.filter(owner=self.summoner), chunk_size=2)
+        with self.assertRaises(Interrupted):
+            recompute.run(on_chunk=interrupt)
+
+        runes = list(RuneInstance.objects.order_by('pk'))
+        self._assert_recomputed(runes[:2])
+        self.assertEqual(runes[2].efficiency, 0)
+
+        recompute = BulkRecompute(RuneInstance.objects.filter(owner=self.summoner), chunk_size=2)
+        recompute.run(after=runes[1].pk)
+        self.assertEqual(recompute.checked, 4)
+        self._assert_recomputed(runes)
+
+    def test_profile_and_command(self):
+        artifact = ArtifactInstance.objects.create(
+            owner=self.summoner,
+            slot=ArtifactInstance.SLOT_ELEMENTAL,
+            element=ArtifactInstance.ELEMENT_FIRE,
+            level=6,
+            original_quality=ArtifactInstance.QUALITY_RARE,
+            main_stat=ArtifactInstance.STAT_HP,
+            effects=[ArtifactInstance.EFFECT_ATK_LOST_HP],
+            effects_value=[10],
+            effects_upgrade_count=[1],
+            effects_reroll_count=[0],
+        )
+        expected_efficiency = artifact.efficiency
+        ArtifactInstance.objects.update(efficiency=0)
+        self._make_stale()
+
+        counts = recompute_profile(self.summoner)
+        self.assertEqual(counts['runeinstance'], {'checked': 6, 'changed': 6})
+        self.assertEqual(counts['artifactinstance'], {'checked': 1, 'changed': 1})
+        artifact.refresh_from_db()
+        self.assertEqual(artifact.efficiency, expected_efficiency)
+
+        self._make_stale()
+        out = StringIO()
+        call_command('recompute_derived_fields', 'herders.runeinstance', stdout=out)
+        self.assertIn('herders.runeinstance: done, 6 checked, 6 changed', out.getvalue())
+        self._assert_recomputed(RuneInstance.objects.all())
@@ -0,0 +1,89 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from bestiary.models import Building
+from herders import import_progress, tasks
+from herders.import_progress import ImportProgress
+from herders.models import Summoner
+from .test_profile_import import IMPORT_OPTIONS, profile_data
+
+
+class ImportProgressTests(TestCase):
+    fixtures = ['test_summon_monsters']
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='progress', password='password')
+        self.summoner = Summoner.objects.create(user=self.user)
+
+    def test_phases_published(self):
+        progress = ImportProgress('task-1', self.summoner.pk, skipped=['runes'])
+
+        with self.assertLogs('herders.import_progress') as logs:
+            with progress.phase('monsters', total=5):
+                self.assertEqual(import_progress.get('task-1')['step'], 'monsters')
+
+                batches = progress.batches(list(range(5)), 2)
+                self.assertEqual(next(batches), [0, 1])
+                self.assertEqual(progress.phases['monsters']['processed'], 0)
+                self.assertEqual(next(batches), [2, 3])
+                self.assertEqual(progress.phases['monsters']['processed'], 2)
+
+                Summoner.objects.count()
+                Summoner.objects.count()
+
+            progress.finish()
+
+        published = import_progress.get('task-1')
+        self.assertEqual(published['status'], 'SUCCESS')
+        self.assertEqual(published['skipped'], ['runes'])
+        self.assertEqual(published['phases']['monsters']['processed'], 5)
+        self.assertEqual(published['phases']['monsters']['queries'], 2)
+
+        metrics = [json.loads(record.split(':', 2)[2]) for record in logs.output]
+        self.assertEqual([metric['event'] for metric in metrics], ['profile_import.phase', 'profile_import.finished'])
+        self.assertEqual(metrics[0]['phase'], 'monsters')
+        self.assertEqual(metrics[0]['summoner_id'], self.summoner.pk)
+        self.assertEqual(metrics[1]['queries'], 2)
+
+    def test_failed_phase(self):
+        progress = ImportProgress('task-2', self.summoner.pk)
+
+        with self.assertRaises(ValueError):
+            with progress.phase('runes', total=10):
+                raise ValueError
+
+        progress.finish('FAILURE')
+        published = import_progress.get('task-2')
+        self.assertEqual(published['status'], 'FAILURE')
+        self.assertEqual(published['step'], 'runes')
+
+    def test_import_reports_phases(self):
+        Building.objects.create(com2us_id=4, name='Fairy Tree', max_level=10, stat_bonus=[], upgrade_cost=[])
+
+        results = tasks.com2us_data_import(profile_data(), self.summoner.pk, IMPORT_OPTIONS)
+
+        self.assertEqual(
+            list(results['phases']),
+            ['preprocessing', 'storage', 'monsters', 'runes', 'rta_builds', 'rune_crafts', 'artifacts', 'artifact_crafts', 'delete_missing', 'rune_stats']
+        )
+        self.assertEqual(results['phases']['runes']['processed'], 3)
+        self.assertEqual(results['phases']['runes']['total'], 3)
+        self.assertGreater(results['phases']['runes']['queries'], 0)
+
+    def test_status_from_cache(self):
+        progress = ImportProgress('task-3', self.summoner.pk)
+        with progress.phase('runes', total=10):
+            pass
+
+        self.client.login(username='progress', password='password')
+        response = self.client.get(
+            reverse('herders:import_status_data', kwargs={'profile_name': 'progress'}), {'id': 'task-3'}, secure=True
+        )
+
+        self.assertEqual(response.json()['status'], 'STARTED')
+        self.assertEqual(response.json()['result']['phases']['runes']['processed'], 10)
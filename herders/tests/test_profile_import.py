@@ -0,0 +1,328 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from bestiary.models import Building, GameItem
+from herders import tasks
+from herders.models import Summoner, MonsterInstance, RuneBuild, MonsterPiece, RuneInstance, RuneCraftInstance, ArtifactInstance, BuildingInstance
+from herders.profile_import import IMPORT_STEP_SECTIONS, InstanceDiff, sync_rta_builds
+from herders.profile_parser import parse_sw_json
+
+IMPORT_OPTIONS = {
+    'clear_profile': False,
+    'default_priority': None,
+    'lock_monsters': True,
+    'minimum_stars': 1,
+    'ignore_silver': False,
+    'ignore_material': False,
+    'except_with_runes': True,
+    'except_light_and_dark': True,
+    'except_fusion_ingredient': True,
+    'delete_missing_monsters': True,
+    'delete_missing_runes': True,
+    'ignore_validation_errors': False,
+}
+
+
+def rune_data(rune_id, slot, occupied_id=0, level=0):
+    return {
+        'rune_id': rune_id,
+        'occupied_id': occupied_id,
+        'slot_no': slot,
+        'set_id': 1,
+        'class': 6,
+        'upgrade_curr': level,
+        'sell_value': 1000,
+        'extra': 4,
+        'pri_eff': [2, 11],
+        'prefix_eff': [0, 0],
+        'sec_eff': [[8, 4, 0, 0], [9, 5, 0, 0], [3, 15, 0, 0]],
+    }
+
+
+def profile_data():
+    return {
+        'wizard_info': {'wizard_id': 1234},
+        'building_list': [{'building_id': 1, 'building_master_id': 25}],
+        'deco_list': [{'deco_id': 1, 'master_id': 4, 'level': 5}],
+        'inventory_info': [
+            {'item_master_type': GameItem.CATEGORY_MONSTER_PIECE, 'item_master_id': 13103, 'item_quantity': 12},
+        ],
+        'unit_list': [
+            {
+                'unit_id': 1001,
+                'unit_master_id': 14102,
+                'class': 5,
+                'unit_level': 35,
+                'building_id': 2,
+                'create_time': '2020-01-01 12:00:00',
+                'skills': [[1, 1], [2, 1], [3, 1]],
+                'runes': [rune_data(2001, 1, 1001), rune_data(2002, 2, 1001)],
+                'artifacts': [],
+            },
+            {
+                'unit_id': 1002,
+                'unit_master_id': 13103,
+                'class': 3,
+                'unit_level': 1,
+                'building_id': 1,
+                'create_time': '2020-01-02 12:00:00',
+                'skills': [[1, 1], [2, 1]],
+                'runes': [],
+                'artifacts': [],
+            },
+        ],
+        'runes': [rune_data(2003, 3)],
+        'rune_craft_item_list': [{'craft_item_id': 3001, 'craft_type': 2, 'craft_type_id': 10402, 'sell_value': 100}],
+        'artifacts': [{
+            'rid': 4001,
+            'type': 2,
+            'unit_style': 1,
+            'rank': 3,
+            'natural_rank': 3,
+            'level': 3,
+            'pri_effect': [101, 18],
+            'sec_effects': [[200, 4, 1, 0, 0]],
+        }],
+        'world_arena_rune_equip_list': [],
+    }
+
+
+class ProfileImportTests(TestCase):
+    fixtures = ['test_summon_monsters']
+
+    def setUp(self):
+        self.summoner = Summoner.objects.create(user=User.objects.create(username='importer'))
+        Building.objects.create(com2us_id=4, name='Fairy Tree', max_level=10, stat_bonus=[], upgrade_cost=[])
+
+    def _import(self, data, **options):
+        return tasks.com2us_data_import(data, self.summoner.pk, dict(IMPORT_OPTIONS, **options))
+
+    def test_first_import_inserts_everything(self):
+        results = self._import(profile_data())
+
+        self.assertEqual(results['monsters'], {'inserted': 2, 'updated': 0, 'deleted': 0, 'unchanged': 0})
+        self.assertEqual(results['runes'], {'inserted': 3, 'updated': 0, 'deleted': 0, 'unchanged': 0})
+        self.assertEqual(results['rune_crafts']['inserted'], 1)
+        self.assertEqual(results['artifacts']['inserted'], 1)
+        self.assertEqual(results['monster_pieces']['inserted'], 1)
+        self.assertEqual(results['buildings']['inserted'], 1)
+        self.assertEqual(BuildingInstance.objects.get(owner=self.summoner).level, 5)
+
+        mon = MonsterInstance.objects.get(owner=self.summoner, com2us_id=1001)
+        self.assertEqual(mon.rune_speed, 8)
+        self.assertEqual(mon.rune_crit_rate, 10)
+        self.assertEqual(mon.default_build.runes.count(), 2)
+        self.assertIsNotNone(mon.rta_build)
+        self.assertEqual(ArtifactInstance.objects.get(owner=self.summoner).main_stat_value, 22)
+
+    def test_reimport_unchanged_skipped(self):
+        self._import(profile_data())
+
+        with CaptureQueriesContext(connection) as queries:
+            results = self._import(profile_data())
+
+        self.assertEqual(results['skipped'], sorted(IMPORT_STEP_SECTIONS))
+        self.assertIsNone(results['runes'])
+        self.assertEqual(
+            [query['sql'] for query in queries.captured_queries if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))],
+            []
+        )
+
+    def test_reimport_unchanged_section_writes_nothing(self):
+        self._import(profile_data())
+        data = profile_data()
+        data['building_list'].append({'building_id': 2, 'building_master_id': 1})
+
+        with CaptureQueriesContext(connection) as queries:
+            results = self._import(data)
+
+        # Only the sections containing the building list are imported again
+        self.assertEqual(results['skipped'], ['artifact_crafts', 'monster_pieces', 'rune_crafts', 'storage'])
+        for model in ['monsters', 'runes', 'artifacts', 'buildings']:
+            self.assertEqual(results[model]['inserted'], 0, model)
+            self.assertEqual(results[model]['updated'], 0, model)
+            self.assertEqual(results[model]['deleted'], 0, model)
+
+        # The summoner is always saved
+        writes = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+            and not query['sql'].startswith('UPDATE "herders_summoner"')
+        ]
+        self.assertEqual(writes, [])
+        self.assertEqual(MonsterPiece.objects.filter(owner=self.summoner).count(), 1)
+
+    def test_changed_options_not_skipped(self):
+        self._import(profile_data())
+
+        self.assertEqual(self._import(profile_data(), lock_monsters=False)['skipped'], [])
+        self.assertEqual(self._import(profile_data(), clear_profile=True)['skipped'], [])
+        self.assertEqual(MonsterInstance.objects.filter(owner=self.summoner).count(), 2)
+
+    def test_reimport_updates_changed_rows(self):
+        self._import(profile_data())
+        data = profile_data()
+        data['unit_list'][0]['runes'][0] = rune_data(2001, 1, 1001, level=3)
+        data['rune_craft_item_list'][0]['amount'] = 2
+
+        results = self._import(data)
+
+        self.assertEqual(results['runes'], {'inserted': 0, 'updated': 1, 'deleted': 0, 'unchanged': 2})
+        self.assertEqual(results['rune_crafts'], {'inserted': 0, 'updated': 1, 'deleted': 0, 'unchanged': 0})
+        self.assertEqual(results['monsters']['unchanged'], 2)
+        self.assertEqual(RuneInstance.objects.get(owner=self.summoner, com2us_id=2001).level, 3)
+        self.assertEqual(RuneCraftInstance.objects.get(owner=self.summoner).quantity, 2)
+
+    def test_delete_missing_updates_monster(self):
+        self._import(profile_data())
+        data = profile_data()
+        del data['unit_list'][0]['runes'][1]
+        del data['unit_list'][1]
+
+        results = self._import(data)
+
+        self.assertEqual(results['runes']['deleted'], 1)
+        self.assertEqual(results['monsters']['deleted'], 1)
+        mon = MonsterInstance.objects.get(owner=self.summoner, com2us_id=1001)
+        self.assertEqual(mon.rune_speed, 4)
+        self.assertEqual(mon.default_build.runes.count(), 1)
+
+    def test_delete_missing_in_batches(self):
+        data = profile_data()
+        data['runes'] += [rune_data(6000 + idx, idx % 6 + 1) for idx in range(120)]
+        self._import(data)
+
+        with mock.patch.object(InstanceDiff, 'BATCH_SIZE', 50), CaptureQueriesContext(connection) as queries:
+            results = self._import(profile_data())
+
+        self.assertEqual(results['runes']['deleted'], 120)
+        self.assertEqual(RuneInstance.objects.filter(owner=self.summoner).count(), 3)
+
+        # No statement lists more than a batch of keys
+        deletes = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('DELETE')]
+        self.assertGreaterEqual(len(deletes), 3)
+        self.assertLessEqual(max(sql.count('::uuid') for sql in deletes), 50)
+
+    def test_keep_missing(self):
+        self._import(profile_data())
+        data = profile_data()
+        data['runes'] = []
+
+        results = self._import(data, delete_missing_runes=False)
+
+        self.assertEqual(results['runes']['deleted'], 0)
+        self.assertTrue(RuneInstance.objects.filter(owner=self.summoner, com2us_id=2003).exists())
+
+    def test_parse_queries_independent_of_profile_size(self):
+        self._import(profile_data())
+
+        # Bestiary monsters and buildings, then one query per owned model
+        with self.assertNumQueries(8):
+            parse_sw_json(profile_data(), self.summoner, IMPORT_OPTIONS)
+
+        data = profile_data()
+        data['unit_list'] += [dict(data['unit_list'][1], unit_id=5000 + idx) for idx in range(50)]
+        data['runes'] += [rune_data(6000 + idx, idx % 6 + 1) for idx in range(100)]
+        self._import(data)
+        data['unit_list'] += [dict(data['unit_list'][1], unit_id=7000 + idx) for idx in range(50)]
+
+        with self.assertNumQueries(8):
+            results = parse_sw_json(data, self.summoner, IMPORT_OPTIONS)
+
+        self.assertEqual(len(results['monsters']), 102)
+        self.assertEqual(len(results['runes']), 103)
+        self.assertEqual(sum(mon._state.adding for mon in results['monsters']), 50)
+
+    def test_keep_missing_replaced_rune_unequipped(self):
+        self._import(profile_data())
+        data = profile_data()
+        data['unit_list'][0]['runes'][0] = rune_data(2004, 1, 1001)
+
+        self._import(data, delete_missing_runes=False)
+
+        mon = MonsterInstance.objects.get(owner=self.summoner, com2us_id=1001)
+        self.assertEqual(
+            sorted(mon.runeinstance_set.values_list('com2us_id', 'slot')),
+            [(2002, 2), (2004, 1)]
+        )
+        self.assertIsNone(RuneInstance.objects.get(owner=self.summoner, com2us_id=2001).assigned_to)
+        self.assertEqual(
+            sorted(mon.default_build.runes.values_list('com2us_id', flat=True)),
+            [2002, 2004]
+        )
+
+    def test_rta_builds(self):
+        data = profile_data()
+        data['world_arena_rune_equip_list'] = [
+            {'occupied_id': 1001, 'rune_id': 2001},
+            {'occupied_id': 1001, 'rune_id': 2003},
+            {'occupied_id': 9999, 'rune_id': 2002},
+        ]
+        self._import(data)
+
+        mon = MonsterInstance.objects.get(owner=self.summoner, com2us_id=1001)
+        self.assertEqual(
+            set(mon.rta_build.runes.values_list('com2us_id', flat=True)),
+            {2001, 2003}
+        )
+        self.assertEqual(mon.rta_build.speed, 8)
+
+        # Replaces the previous assignment. Two runes in one slot are rejected.
+        data['world_arena_rune_equip_list'] = [{'occupied_id': 1001, 'rune_id': 2002}]
+        data['runes'].append(rune_data(2004, 2))
+        data['unit_list'][1]['runes'] = [rune_data(2005, 1, 1002), rune_data(2006, 2, 1002)]
+        data['world_arena_rune_equip_list'] += [
+            {'occupied_id': 1002, 'rune_id': 2005},
+            {'occupied_id': 1002, 'rune_id': 2006},
+            {'occupied_id': 1002, 'rune_id': 2004},
+        ]
+        self._import(data)
+
+        mon.rta_build.refresh_from_db()
+        self.assertEqual(list(mon.rta_build.runes.values_list('com2us_id', flat=True)), [2002])
+        self.assertEqual(mon.rta_build.speed, 4)
+        self.assertFalse(MonsterInstance.objects.get(owner=self.summoner, com2us_id=1002).rta_build.runes.exists())
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_rune_set_change_updates_rta_build(self):
+        data = profile_data()
+        data['world_arena_rune_equip_list'] = [
+            {'occupied_id': 1001, 'rune_id': 2001},
+            {'occupied_id': 1001, 'rune_id': 2003},
+        ]
+        self._import(data)
+
+        mon = MonsterInstance.objects.get(owner=self.summoner, com2us_id=1001)
+        self.assertEqual(mon.rta_build.rune_sets, 1)
+        self.assertFalse(mon.rta_build.rune_set_broken)
+
+        # The build's runes are unchanged, only the set of one of them
+        data['runes'][0]['set_id'] = RuneInstance.TYPE_SWIFT
+        self._import(data)
+
+        mon.rta_build.refresh_from_db()
+        self.assertEqual(mon.rta_build.rune_sets, 0)
+        self.assertTrue(mon.rta_build.rune_set_broken)
+
+    def test_rta_build_queries_independent_of_monster_count(self):
+        data = profile_data()
+        data['unit_list'] += [dict(data['unit_list'][1], unit_id=5000 + idx) for idx in range(20)]
+        data['runes'] += [rune_data(6000 + idx, 1) for idx in range(20)]
+        self._import(data)
+
+        # Monsters, runes, stored build runes and the insert, then builds, their runes and the update in a savepoint
+        with self.assertNumQueries(9):
+            self.assertEqual(sync_rta_builds(self.summoner, [{'occupied_id': 1002, 'rune_id': 6000}]), 1)
+
+        with self.assertNumQueries(9):
+            changed = sync_rta_builds(self.summoner, [
+                {'occupied_id': 5000 + idx, 'rune_id': 6000 + idx} for idx in range(20)
+            ])
+        self.assertEqual(changed, 20)
+        # Monsters missing from the assignments keep their RTA build
+        self.assertEqual(RuneBuild.objects.filter(owner=self.summoner, name='Real-Time Arena', speed=4).count(), 21)
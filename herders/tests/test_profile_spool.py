@@ -0,0 +1,115 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from bestiary.models import Building
+from herders import profile_spool, tasks
+from herders.models import Summoner, MonsterInstance
+from herders.profile_import import IMPORT_STEP_SECTIONS
+from .test_profile_import import IMPORT_OPTIONS, profile_data
+
+
+class ProfileSpoolTests(TestCase):
+    fixtures = ['test_summon_monsters']
+
+    def setUp(self):
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir)
+        settings_override = override_settings(PROFILE_SPOOL_DIR=spool_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.spool_dir = spool_dir
+
+    def _store(self, data):
+        return profile_spool.store(io.BytesIO(json.dumps(data).encode()))
+
+    def test_store_and_open(self):
+        data = {'wizard_info': {'wizard_id': 1234}, 'runes': list(range(20000))}
+        ref = self._store(data)
+
+        with profile_spool.open_spooled(ref) as f:
+            self.assertEqual(json.load(f), data)
+
+        # Stored compressed
+        self.assertLess(os.path.getsize(os.path.join(self.spool_dir, ref + '.json.gz')), len(json.dumps(data)))
+
+    def test_identical_uploads_spooled_separately(self):
+        ref = self._store({'a': 1})
+        other_ref = self._store({'a': 1})
+        self.assertNotEqual(other_ref, ref)
+        self.assertEqual(other_ref[:64], ref[:64])
+        self.assertEqual(len(os.listdir(self.spool_dir)), 2)
+
+    def test_invalid_reference(self):
+        for ref in ['', '../settings', 'A' * 64, '0' * 64, '0' * 64 + '-../x']:
+            with self.assertRaises(ValueError, msg=ref):
+                profile_spool.open_spooled(ref)
+
+    def test_release(self):
+        ref = self._store({'a': 1})
+        other_ref = self._store({'a': 1})
+
+        profile_spool.release(ref)
+        self.assertEqual(os.listdir(self.spool_dir), [other_ref + '.json.gz'])
+
+        # Already gone
+        profile_spool.release(ref)
+
+    def test_clean_expired(self):
+        old_ref = self._store({'a': 1})
+        new_ref = self._store({'a': 2})
+        old_path = os.path.join(self.spool_dir, old_ref + '.json.gz')
+        expired = time.time() - 2 * 24 * 60 * 60
+        os.utime(old_path, (expired, expired))
+
+        self.assertEqual(profile_spool.clean_expired(max_age=24 * 60 * 60), 1)
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(os.path.join(self.spool_dir, new_ref + '.json.gz')))
+
+    def test_import_by_reference(self):
+        summoner = Summoner.objects.create(user=User.objects.create(username='spooled'))
+        Building.objects.create(com2us_id=4, name='Fairy Tree', max_level=10, stat_bonus=[], upgrade_cost=[])
+        ref = self._store(profile_data())
+
+        results = tasks.com2us_data_import(ref, summoner.pk, IMPORT_OPTIONS)
+
+        self.assertEqual(results['monsters']['inserted'], 2)
+        self.assertEqual(MonsterInstance.objects.filter(owner=summoner).count(), 2)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+    def test_import_identical_uploads(self):
+        # Both uploads are queued before either import runs
+        summoner = Summoner.objects.create(user=User.objects.create(username='spooled'))
+        Building.objects.create(com2us_id=4, name='Fairy Tree', max_level=10, stat_bonus=[], upgrade_cost=[])
+        refs = [self._store(profile_data()), self._store(profile_data())]
+
+        first = tasks.com2us_data_import(refs[0], summoner.pk, IMPORT_OPTIONS)
+        self.assertEqual(first['monsters']['inserted'], 2)
+        self.assertEqual(os.listdir(self.spool_dir), [refs[1] + '.json.gz'])
+
+        # Every section is unchanged since the first import
+        second = tasks.com2us_data_import(refs[1], summoner.pk, IMPORT_OPTIONS)
+        self.assertIsNone(second['monsters'])
+        self.assertEqual(MonsterInstance.objects.filter(owner=summoner).count(), 2)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+    def test_fingerprints_match_parsed_data(self):
+        # An upload imported from the spool is unchanged from the same data passed parsed, and the reverse
+        summoner = Summoner.objects.create(user=User.objects.create(username='spooled'))
+        Building.objects.create(com2us_id=4, name='Fairy Tree', max_level=10, stat_bonus=[], upgrade_cost=[])
+        tasks.com2us_data_import(profile_data(), summoner.pk, IMPORT_OPTIONS)
+
+        results = tasks.com2us_data_import(self._store(profile_data()), summoner.pk, IMPORT_OPTIONS)
+        self.assertEqual(len(results['skipped']), len(IMPORT_STEP_SECTIONS))
+
+        data = profile_data()
+        data['runes'] = []
+        self.assertEqual(tasks.com2us_data_import(self._store(data), summoner.pk, IMPORT_OPTIONS)['runes']['deleted'], 1)
+        results = tasks.com2us_data_import(data, summoner.pk, IMPORT_OPTIONS)
+        self.assertEqual(len(results['skipped']), len(IMPORT_STEP_SECTIONS))
@@ -0,0 +1,113 @@
+import io
+import json
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from herders.models import Summoner
+from herders.profile_parser import load_sw_json, validate_sw_json
+from herders.profile_stream import JSONObjectStream, SpooledArray, load_spooled
+from .test_profile_import import profile_data, rune_data
+
+DOCUMENT = {
+    'runes': [{'id': 12345, 'name': 'spéed "rune" ]}', 'values': [1.5, -20, 3e5, True, None]}, [], {}],
+    'unit_list': [],
+    'wizard_info': {'wizard_id': 123456789, 'nested': [[1, 2], {'a': 'b'}]},
+    'artifacts': None,
+    'unit_lock_list': [1, 22, 333, 4444],
+}
+
+
+class JSONObjectStreamTests(TestCase):
+    def _read(self, text, read_size):
+        return {
+            key: list(value) if key in ['runes', 'unit_list'] else value
+            for key, value in JSONObjectStream(io.BytesIO(text.encode('utf-8-sig')), ['runes', 'unit_list', 'artifacts'], read_size)
+        }
+
+    def test_same_as_json_load(self):
+        for text in [json.dumps(DOCUMENT), json.dumps(DOCUMENT, indent=4), json.dumps(DOCUMENT, ensure_ascii=False)]:
+            for read_size in [1, 3, 7, 64, 65536]:
+                self.assertEqual(self._read(text, read_size), DOCUMENT, read_size)
+
+    def test_unconsumed_arrays_skipped(self):
+        stream = JSONObjectStream(io.StringIO(json.dumps(DOCUMENT)), ['runes'], read_size=5)
+        self.assertEqual([key for key, _ in stream], list(DOCUMENT))
+
+    def test_selected_keys(self):
+        stream = JSONObjectStream(io.StringIO(json.dumps(DOCUMENT)), ['runes'], read_size=5, keys=['runes', 'artifacts'])
+        self.assertEqual(
+            [(key, list(value) if key == 'runes' else value) for key, value in stream],
+            [('runes', DOCUMENT['runes']), ('artifacts', None)]
+        )
+
+    def test_load_spooled(self):
+        text = json.dumps(DOCUMENT).encode()
+        opened = []
+
+        def open_fp():
+            opened.append(True)
+            return io.BytesIO(text)
+
+        items = []
+        data = load_spooled(open_fp, ['runes', 'unit_list', 'artifacts'], lambda key, item: items.append((key, item)))
+
+        self.assertIsInstance(data['runes'], SpooledArray)
+        self.assertEqual(len(data['runes']), 3)
+        self.assertEqual(data['unit_list'], [])
+        self.assertEqual(items, [('runes', item) for item in DOCUMENT['runes']])
+        self.assertEqual(len(opened), 1)
+
+        # Read from the file again each time
+        self.assertEqual(list(data['runes']), DOCUMENT['runes'])
+        self.assertEqual(list(data['runes']), DOCUMENT['runes'])
+        self.assertEqual(len(opened), 3)
+        self.assertEqual(dict(data, runes=DOCUMENT['runes']), DOCUMENT)
+
+    def test_invalid_json(self):
+        for text in ['', '[]', '{"runes": [1, 2', '{"runes": [1 2]}', '{"a": 1,}', '{"a": tru}']:
+            with self.assertRaises(ValueError, msg=text):
+                self._read(text, 4)
+
+
+class LoadSWJsonTests(TestCase):
+    def setUp(self):
+        self.summoner = Summoner.objects.create(user=User.objects.create(username='uploader'))
+
+    def _load(self, data):
+        return load_sw_json(io.BytesIO(json.dumps(data).encode()))
+
+    def _profile_data(self):
+        # Fill in the fields the schema requires but the parser doesn't use
+        data = profile_data()
+        for rune in data['runes']:
+            rune.update({'rank': 5, 'base_value': 1000, 'upgrade_limit': 15})
+        for unit in data['unit_list']:
+            unit.update({'wizard_id': 1234, 'homunculus': 0, 'homunculus_name': '', 'runes': []})
+        return data
+
+    def test_valid_upload(self):
+        data = self._profile_data()
+        loaded, schema_error = self._load(data)
+
+        self.assertIsNone(schema_error)
+        self.assertEqual(loaded, data)
+        self.assertEqual(validate_sw_json(loaded, self.summoner, streamed=True), (None, []))
+
+    def test_invalid_element(self):
+        data = self._profile_data()
+        data['runes'].append(dict(rune_data(2004, 7), rank=5, base_value=1000, upgrade_limit=15))
+
+        _, schema_error = self._load(data)
+
+        self.assertEqual(schema_error, "Error in field ['runes'][1]['slot_no']:\n7 is greater than the maximum of 6")
+
+    def test_missing_section(self):
+        data = self._profile_data()
+        del data['deco_list']
+
+        loaded, schema_error = self._load(data)
+        self.assertIsNone(schema_error)
+
+        schema_error, _ = validate_sw_json(loaded, self.summoner, streamed=True)
+        self.assertIn('deco_list', schema_error)
@@ -0,0 +1,99 @@
+import importlib
+import random
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+
+from herders.filters import RuneInstanceFilter
+from herders.forms import FilterRuneForm
+from herders.models import Summoner, RuneInstance
+
+rune_stat_values = importlib.import_module('herders.migrations.0020_rune_stat_values')
+
+
+def random_rune(rng, owner):
+    slot = rng.randint(1, 6)
+    main_stat = rng.choice(RuneInstance.MAIN_STATS_BY_SLOT[slot])
+    innate_stat, *substats = rng.sample([stat for stat, _ in RuneInstance.STAT_CHOICES if stat != main_stat], 5)
+    return RuneInstance(
+        owner=owner,
+        type=RuneInstance.TYPE_ENERGY,
+        stars=6,
+        level=12,
+        slot=slot,
+        main_stat=main_stat,
+        main_stat_value=0,
+        innate_stat=rng.choice([innate_stat, None]),
+        innate_stat_value=rng.randint(1, 4),
+        substats=substats,
+        substat_values=[rng.randint(1, 20) for _ in substats],
+        substats_enchanted=[False for _ in substats],
+        substats_grind_value=[rng.randint(0, 5) for _ in substats],
+    )
+
+
+class RuneStatValueTests(TestCase):
+    def test_stat_value_fields(self):
+        rune = RuneInstance(
+            type=RuneInstance.TYPE_ENERGY,
+            stars=6,
+            level=12,
+            slot=2,
+            main_stat=RuneInstance.STAT_HP_PCT,
+            innate_stat=RuneInstance.STAT_SPD,
+            innate_stat_value=5,
+            substats=[RuneInstance.STAT_ATK, RuneInstance.STAT_CRIT_RATE_PCT],
+            substat_values=[10, 6],
+            substats_enchanted=[False, False],
+            substats_grind_value=[4, 0],
+        )
+        rune.update_fields()
+
+        self.assertEqual(rune.hp_pct, rune.main_stat_value)
+        self.assertEqual(rune.speed, 5)
+        self.assertEqual(rune.attack, 14)
+        self.assertEqual(rune.crit_rate, 6)
+        self.assertEqual(rune.accuracy, 0)
+
+        for stat, field in RuneInstance.STAT_VALUE_FIELDS.items():
+            self.assertEqual(getattr(rune, field), rune.get_stat(stat))
+
+
+class RuneStatFilterTests(TestCase):
+    def setUp(self):
+        self.summoner = Summoner.objects.create(user=User.objects.create(username='runefilters'))
+        rng = random.Random(0)
+        for _ in range(50):
+            random_rune(rng, self.summoner).save()
+
+    def _filter(self, data):
+        form = FilterRuneForm(data)
+        self.assertTrue(form.is_valid(), form.errors)
+        return RuneInstanceFilter(form.cleaned_data, queryset=RuneInstance.objects.filter(owner=self.summoner)).qs
+
+    def test_stat_thresholds(self):
+        runes = list(RuneInstance.objects.filter(owner=self.summoner))
+
+        filtered = self._filter({'speed__gte': 10, 'crit_rate__gte': 5})
+        expected = [
+            rune.pk for rune in runes
+            if rune.get_stat(RuneInstance.STAT_SPD) >= 10 and rune.get_stat(RuneInstance.STAT_CRIT_RATE_PCT) >= 5
+        ]
+        self.assertTrue(expected)
+        self.assertCountEqual(filtered.values_list('pk', flat=True), expected)
+
+        self.assertEqual(self._filter({}).count(), len(runes))
+
+    def test_backfill_matches_update_fields(self):
+        expected = {
+            rune.pk: [getattr(rune, field) for field in RuneInstance.STAT_VALUE_FIELDS.values()]
+            for rune in RuneInstance.objects.filter(owner=self.summoner)
+        }
+        RuneInstance.objects.update(**{field: 0 for field in RuneInstance.STAT_VALUE_FIELDS.values()})
+
+        with connection.cursor() as cursor:
+            cursor.execute(rune_stat_values.fill_stat_values_sql(RuneInstance._meta.db_table))
+
+        for rune in RuneInstance.objects.filter(owner=self.summoner):
+            self.assertEqual([getattr(rune, field) for field in RuneInstance.STAT_VALUE_FIELDS.values()], expected[rune.pk])
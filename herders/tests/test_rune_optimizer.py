@@ -0,0 +1,150 @@
+import itertools
+import random
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from bestiary.models import Monster
+from herders import rune_stats
+from herders.models import Summoner, MonsterInstance, RuneInstance
+from herders.rune_optimizer import RuneOptimizer
+
+RUNE_SETS = [RuneInstance.TYPE_SWIFT, RuneInstance.TYPE_ENERGY, RuneInstance.TYPE_BLADE, RuneInstance.TYPE_VIOLENT]
+SLOT_MAIN_STATS = {
+    1: [RuneInstance.STAT_ATK],
+    2: [RuneInstance.STAT_SPD, RuneInstance.STAT_HP_PCT, RuneInstance.STAT_ATK_PCT],
+    3: [RuneInstance.STAT_DEF],
+    4: [RuneInstance.STAT_CRIT_RATE_PCT, RuneInstance.STAT_HP_PCT, RuneInstance.STAT_CRIT_DMG_PCT],
+    5: [RuneInstance.STAT_HP],
+    6: [RuneInstance.STAT_HP_PCT, RuneInstance.STAT_ACCURACY_PCT, RuneInstance.STAT_DEF_PCT],
+}
+
+
+def random_rune(rng, slot, **kwargs):
+    main_stat = rng.choice(SLOT_MAIN_STATS[slot])
+    substats = rng.sample([stat for stat, _ in RuneInstance.STAT_CHOICES if stat != main_stat], 4)
+    return RuneInstance(
+        type=rng.choice(RUNE_SETS),
+        stars=6,
+        level=15,
+        slot=slot,
+        main_stat=main_stat,
+        main_stat_value=rng.randint(20, 60),
+        substats=substats,
+        substat_values=[rng.randint(1, 15) for _ in substats],
+        substats_enchanted=[False] * 4,
+        substats_grind_value=[0] * 4,
+        efficiency=rng.uniform(50, 110),
+        **kwargs
+    )
+
+
+class RuneOptimizerTests(TestCase):
+    fixtures = ['test_summon_monsters']
+
+    def setUp(self):
+        self.summoner = Summoner.objects.create(user=User.objects.create(username='optimizer'))
+        self.monster = MonsterInstance(
+            owner=self.summoner, monster=Monster.objects.get(com2us_id=14102), stars=6, level=40,
+        )
+
+    def _final_stats(self, runes):
+        bonuses = rune_stats.flat_stats(rune_stats.build_stats(runes), self.monster.base_stats)
+        return {
+            RuneInstance.STAT_HP: self.monster.base_hp + bonuses[RuneInstance.STAT_HP] + bonuses[RuneInstance.STAT_HP_PCT],
+            RuneInstance.STAT_SPD: self.monster.base_speed + bonuses[RuneInstance.STAT_SPD],
+            RuneInstance.STAT_CRIT_RATE_PCT: self.monster.base_crit_rate + bonuses[RuneInstance.STAT_CRIT_RATE_PCT],
+        }
+
+    def _brute_force(self, pool, score, valid, limit):
+        by_slot = [[rune for rune in pool if rune.slot == slot] for slot in range(1, 7)]
+        scores = [score(runes) for runes in itertools.product(*by_slot) if valid(runes)]
+        return sorted(scores, reverse=True)[:limit]
+
+    def test_same_as_brute_force(self):
+        rng = random.Random(0)
+        pool = [random_rune(rng, slot) for slot in range(1, 7) for _ in range(4)]
+        weights = {RuneInstance.STAT_SPD: 1, RuneInstance.STAT_HP: 0.01}
+
+        def score(runes):
+            stats = self._final_stats(runes)
+            return stats[RuneInstance.STAT_SPD] + stats[RuneInstance.STAT_HP] * 0.01
+
+        def valid(runes):
+            return rune_stats.build_stats(runes)[RuneInstance.STAT_SPD_PCT] > 0 \
+                and self._final_stats(runes)[RuneInstance.STAT_CRIT_RATE_PCT] >= 40
+
+        optimizer = RuneOptimizer(
+            self.monster,
+            set_combinations=[[RuneInstance.TYPE_SWIFT]],
+            minimums={RuneInstance.STAT_CRIT_RATE_PCT: 40},
+            weights=weights,
+            limit=5,
+            runes=pool,
+        )
+        builds = optimizer.run()
+
+        expected = self._brute_force(pool, score, valid, 5)
+        self.assertTrue(expected)
+        self.assertEqual([round(build.score, 6) for build in builds], [round(value, 6) for value in expected])
+        self.assertFalse(optimizer.timed_out)
+
+        best = builds[0]
+        self.assertEqual([rune.slot for rune in best.candidate_runes], [1, 2, 3, 4, 5, 6])
+        self.assertIn(RuneInstance.TYPE_SWIFT, best.active_rune_sets)
+        self.assertEqual(best.speed_pct, 25)
+        self.assertTrue(best._state.adding)
+
+    def test_efficiency_and_main_stats(self):
+        rng = random.Random(1)
+        pool = [random_rune(rng, slot) for slot in range(1, 7) for _ in range(4)]
+        main_stats = {2: [RuneInstance.STAT_SPD, RuneInstance.STAT_ATK_PCT]}
+
+        builds = RuneOptimizer(self.monster, main_stats=main_stats, limit=3, runes=pool).run()
+
+        expected = self._brute_force(
+            pool,
+            lambda runes: sum(rune.efficiency for rune in runes),
+            lambda runes: runes[1].main_stat in main_stats[2],
+            3,
+        )
+        self.assertEqual([round(build.score, 6) for build in builds], [round(value, 6) for value in expected])
+        self.assertAlmostEqual(builds[0].avg_efficiency, builds[0].score / 6)
+
+    def test_time_budget(self):
+        rng = random.Random(2)
+        pool = [random_rune(rng, slot) for slot in range(1, 7) for _ in range(40)]
+        RuneOptimizer.NODE_CHECK_INTERVAL = 1
+        self.addCleanup(setattr, RuneOptimizer, 'NODE_CHECK_INTERVAL', 1024)
+
+        optimizer = RuneOptimizer(self.monster, weights={RuneInstance.STAT_SPD: 1}, runes=pool, time_budget=0)
+        self.assertEqual(optimizer.run(), [])
+        self.assertTrue(optimizer.timed_out)
+
+    def test_invalid_options(self):
+        with self.assertRaises(ValueError):
+            RuneOptimizer(self.monster, set_combinations=[[RuneInstance.TYPE_SWIFT, RuneInstance.TYPE_VIOLENT]])
+        with self.assertRaises(ValueError):
+            RuneOptimizer(self.monster, weights={RuneInstance.STAT_SPD: -1})
+        with self.assertRaises(ValueError):
+            RuneOptimizer(self.monster, minimums={RuneInstance.STAT_HP_PCT: 10})
+
+    def test_owner_rune_pool(self):
+        self.monster.save()
+        other = MonsterInstance.objects.create(
+            owner=self.summoner, monster=Monster.objects.get(com2us_id=14102), stars=6, level=40,
+        )
+        rng = random.Random(3)
+        for slot in range(1, 7):
+            random_rune(rng, slot, owner=self.summoner).save()
+            random_rune(rng, slot, owner=self.summoner, assigned_to=self.monster).save()
+        equipped_elsewhere = random_rune(rng, 1, owner=self.summoner, assigned_to=other)
+        equipped_elsewhere.save()
+
+        builds = RuneOptimizer(self.monster, limit=64).run()
+        self.assertEqual(len(builds), 64)
+        self.assertFalse(any(equipped_elsewhere in build.candidate_runes for build in builds))
+
+        builds = RuneOptimizer(self.monster, limit=100, include_equipped=True).run()
+        self.assertEqual(len(builds), 96)
+        self.assertTrue(any(equipped_elsewhere in build.candidate_runes for build in builds))
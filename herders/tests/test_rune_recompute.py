@@ -0,0 +1,127 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from bestiary.models import Monster
+from herders.models import Summoner, MonsterInstance, RuneInstance, RuneBuild, defer_rune_recompute
+from herders.rune_stats import rune_set_summary
+
+
+class DeferredRuneRecomputeTests(TestCase):
+    fixtures = ['test_summon_monsters']
+
+    def setUp(self):
+        self.summoner = Summoner.objects.create(user=User.objects.create(username='recompute'))
+
+    def _monster(self):
+        return MonsterInstance.objects.create(
+            owner=self.summoner,
+            monster=Monster.objects.get(com2us_id=14102),
+            stars=5,
+            level=35,
+        )
+
+    def _equip_runes(self, mon):
+        for slot in range(1, 7):
+            RuneInstance.objects.create(
+                owner=self.summoner,
+                assigned_to=mon,
+                type=RuneInstance.TYPE_SWIFT if slot <= 4 else RuneInstance.TYPE_ENERGY,
+                stars=6,
+                level=12,
+                slot=slot,
+                main_stat=RuneInstance.STAT_SPD if slot == 2 else RuneInstance.STAT_HP_PCT,
+                main_stat_value=30,
+                substats=[RuneInstance.STAT_CRIT_RATE_PCT, RuneInstance.STAT_ATK],
+                substat_values=[5, 10],
+                substats_enchanted=[False, False],
+                substats_grind_value=[0, 0],
+            )
+
+    def test_same_result_as_saving_each_rune(self):
+        expected = self._monster()
+        self._equip_runes(expected)
+        expected.refresh_from_db()
+
+        mon = self._monster()
+        with defer_rune_recompute():
+            self._equip_runes(mon)
+            mon.refresh_from_db()
+            self.assertEqual(mon.rune_speed, 0)
+            self.assertEqual(mon.default_build.runes.count(), 0)
+
+        mon.refresh_from_db()
+        for field in MonsterInstance.RUNE_STAT_FIELDS:
+            self.assertEqual(getattr(mon, field), getattr(expected, field), field)
+
+        self.assertEqual(mon.default_build.runes.count(), 6)
+        self.assertEqual(mon.default_build.speed, expected.default_build.speed)
+        self.assertEqual(mon.default_build.avg_efficiency, expected.default_build.avg_efficiency)
+
+    def test_recompute_queries_independent_of_monster_count(self):
+        for _ in range(2):
+            self._equip_runes(self._monster())
+
+        with defer_rune_recompute() as recompute:
+            recompute.monster_ids.update(MonsterInstance.objects.values_list('pk', flat=True))
+            with self.assertNumQueries(7):
+                recompute.run()
+
+        for _ in range(5):
+            self._equip_runes(self._monster())
+
+        with defer_rune_recompute() as recompute:
+            recompute.monster_ids.update(MonsterInstance.objects.values_list('pk', flat=True))
+            with self.assertNumQueries(7):
+                recompute.run()
+
+    def test_rune_build_changes_deferred(self):
+        mon = self._monster()
+        self._equip_runes(mon)
+        runes = RuneInstance.objects.filter(assigned_to=mon)
+
+        with defer_rune_recompute():
+            mon.rta_build.runes.set(runes, clear=True)
+            mon.rta_build.refresh_from_db()
+            self.assertEqual(mon.rta_build.speed, 0)
+
+        mon.rta_build.refresh_from_db()
+        mon.default_build.refresh_from_db()
+        self.assertEqual(mon.rta_build.speed, mon.default_build.speed)
+        self.assertEqual(mon.rta_build.speed_pct, 25)
+
+    def test_rune_set_change_updates_builds(self):
+        mon = self._monster()
+        self._equip_runes(mon)
+        runes = RuneInstance.objects.filter(assigned_to=mon)
+        mon.rta_build.runes.set(runes)
+        custom = RuneBuild.objects.create(owner=self.summoner, monster=mon, name='Custom')
+        custom.runes.set(runes)
+        custom.refresh_from_db()
+        before = custom.rune_sets
+
+        rune = runes.get(slot=5)
+        rune.type = RuneInstance.TYPE_SWIFT
+        rune.save()
+
+        rune = runes.get(slot=6)
+        with defer_rune_recompute():
+            rune.type = RuneInstance.TYPE_SWIFT
+            rune.main_stat = RuneInstance.STAT_DEF_PCT
+            rune.save()
+
+        for build in [mon.default_build, mon.rta_build, custom]:
+            build.refresh_from_db()
+            self.assertEqual(build.rune_sets, rune_set_summary(runes.all())['rune_sets'], build.name)
+            self.assertNotEqual(build.rune_sets, before, build.name)
+            self.assertEqual(build.slot_6_main_stat, RuneInstance.STAT_DEF_PCT, build.name)
+
+    def test_error_skips_recompute(self):
+        mon = self._monster()
+
+        with self.assertRaises(ValueError):
+            with defer_rune_recompute():
+                self._equip_runes(mon)
+                raise ValueError
+
+        mon.refresh_from_db()
+        self.assertEqual(mon.rune_speed, 0)
@@ -0,0 +1,129 @@
+import random
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+
+from bestiary.models import Monster
+from herders import rune_stats
+from herders.models import Summoner, MonsterInstance, RuneInstance
+
+
+def random_rune(rng, slot):
+    stats = [stat for stat, _ in RuneInstance.STAT_CHOICES]
+    main_stat, innate_stat, *substats = rng.sample(stats, 6)
+    return RuneInstance(
+        type=rng.choice([rune_type for rune_type, _ in RuneInstance.TYPE_CHOICES]),
+        stars=6,
+        level=15,
+        slot=slot,
+        main_stat=main_stat,
+        main_stat_value=rng.randint(10, 60),
+        innate_stat=rng.choice([innate_stat, None]),
+        innate_stat_value=rng.randint(1, 8),
+        substats=substats,
+        substat_values=[rng.randint(1, 20) for _ in substats],
+        substats_enchanted=[False for _ in substats],
+        # Older runes may not have a grind value for every substat
+        substats_grind_value=[rng.randint(0, 5) for _ in substats[:rng.randint(0, 4)]],
+    )
+
+
+class RuneStatsTests(SimpleTestCase):
+    def test_rune_vector_matches_get_stat(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            rune = random_rune(rng, rng.randint(1, 6))
+            vector = rune_stats.rune_vector(rune)
+            for stat, _ in RuneInstance.STAT_CHOICES:
+                self.assertEqual(vector[stat], rune.get_stat(stat))
+
+    def test_build_stats(self):
+        rng = random.Random(1)
+        for _ in range(200):
+            runes = [random_rune(rng, slot) for slot in range(1, 7)]
+            totals = rune_stats.build_stats(runes)
+
+            for stat, _ in RuneInstance.STAT_CHOICES:
+                expected = sum(rune.get_stat(stat) for rune in runes)
+                for rune_set in set(rune.type for rune in runes):
+                    bonus = RuneInstance.RUNE_SET_BONUSES[rune_set]
+                    if bonus['stat'] == stat:
+                        expected += bonus['value'] * ([rune.type for rune in runes].count(rune_set) // bonus['count'])
+                self.assertEqual(totals[stat], expected)
+
+    def test_swift_bonus(self):
+        runes = [RuneInstance(type=RuneInstance.TYPE_SWIFT, substats=[], substat_values=[]) for _ in range(4)]
+        totals = rune_stats.build_stats(runes)
+        self.assertEqual(totals[RuneInstance.STAT_SPD_PCT], 25)
+        self.assertEqual(totals[RuneInstance.STAT_SPD], 0)
+
+        base_stats = {RuneInstance.STAT_HP: 1000, RuneInstance.STAT_ATK: 500, RuneInstance.STAT_DEF: 500, RuneInstance.STAT_SPD: 101}
+        self.assertEqual(rune_stats.flat_stats(totals, base_stats)[RuneInstance.STAT_SPD], 26)
+
+    def test_no_runes(self):
+        self.assertEqual(rune_stats.build_stats([]), [0] * rune_stats.STAT_COUNT)
+
+    def test_rune_set_summary(self):
+        runes = [
+            RuneInstance(type=rune_type, slot=slot, main_stat=RuneInstance.STAT_HP_PCT)
+            for slot, rune_type in enumerate([
+                RuneInstance.TYPE_ENERGY, RuneInstance.TYPE_ENERGY, RuneInstance.TYPE_ENERGY,
+                RuneInstance.TYPE_ENERGY, RuneInstance.TYPE_TOLERANCE, RuneInstance.TYPE_TOLERANCE,
+            ], start=1)
+        ]
+        runes[3].main_stat = RuneInstance.STAT_SPD
+
+        summary = rune_stats.rune_set_summary(runes)
+        self.assertEqual(
+            rune_stats.unpack_rune_sets(summary['rune_sets']),
+            [RuneInstance.TYPE_ENERGY, RuneInstance.TYPE_ENERGY, RuneInstance.TYPE_TOLERANCE],
+        )
+        self.assertFalse(summary['rune_set_broken'])
+        self.assertEqual(summary['slot_4_main_stat'], RuneInstance.STAT_SPD)
+
+        summary = rune_stats.rune_set_summary(runes[:5])
+        self.assertEqual(rune_stats.unpack_rune_sets(summary['rune_sets']), [RuneInstance.TYPE_ENERGY] * 2)
+        self.assertTrue(summary['rune_set_broken'])
+        self.assertIsNone(summary['slot_6_main_stat'])
+
+
+class MonsterRuneStatsTests(TestCase):
+    fixtures = ['test_summon_monsters']
+
+    def test_monster_and_build_agree(self):
+        summoner = Summoner.objects.create(user=User.objects.create(username='runestats'))
+        mon = MonsterInstance.objects.create(
+            owner=summoner, monster=Monster.objects.get(com2us_id=14102), stars=5, level=35,
+        )
+        for slot in range(1, 7):
+            RuneInstance.objects.create(
+                owner=summoner,
+                assigned_to=mon,
+                type=RuneInstance.TYPE_SWIFT if slot <= 4 else RuneInstance.TYPE_ENERGY,
+                stars=6,
+                level=12,
+                slot=slot,
+                main_stat=RuneInstance.STAT_SPD if slot == 2 else RuneInstance.STAT_HP_PCT,
+                main_stat_value=30,
+                substats=[RuneInstance.STAT_CRIT_RATE_PCT, RuneInstance.STAT_ATK],
+                substat_values=[5, 10],
+                substats_enchanted=[False, False],
+                substats_grind_value=[0, 2],
+            )
+
+        mon = MonsterInstance.objects.select_related('default_build', 'rta_build').get(pk=mon.pk)
+        build = mon.default_build
+        self.assertEqual(build.speed, 30)
+        self.assertEqual(build.speed_pct, 25)
+        self.assertEqual(build.hp_pct, 5 * 30 + 15)
+        self.assertEqual(build.attack, 6 * 12)
+        self.assertEqual(mon.rune_speed, build.speed + -(-mon.base_speed * 25 // 100))
+        self.assertEqual(mon.rune_hp, -(-mon.base_hp * build.hp_pct // 100))
+        self.assertEqual(mon.rune_attack, build.attack)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(mon.get_rune_set_summary(), 'Energy/Swift - SPD/HP %/HP %')
+            self.assertEqual(build.rune_set_summary, 'Energy/Swift - SPD/HP %/HP %')
+            self.assertEqual(mon.get_rune_set_bonuses(), build.rune_set_bonus_text)
+            self.assertEqual(len(build.rune_set_bonus_text), 2)
+            self.assertEqual(mon.rta_build.rune_set_summary, 'Empty')
@@ -2,8 +2,6 @@
 Profile CRUD, import/export, storage, and buildings
 """
 
-import json
-
 from celery.result import AsyncResult
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
@@ -22,7 +20,8 @@ from herders.decorators import username_case_redirect
 from herders.forms import RegisterUserForm, CrispyChangeUsernameForm, DeleteProfileForm, EditUserForm, \
     EditSummonerForm, EditBuildingForm, ImportSWParserJSONForm
 from herders.models import Summoner, Storage, Building, BuildingInstance
-from herders.profile_parser import validate_sw_json
+from herders import import_progress, profile_spool
+from herders.profile_parser import load_sw_json, validate_sw_json
 from herders.rune_optimizer_parser import export_win10
 from herders.tasks import com2us_data_import
 
@@ -553,13 +552,18 @@ def import_sw_json(request, profile_name):
                 summoner.save()
 
             try:
-                data = json.load(uploaded_file)
+                # The import task gets a reference to the spooled file rather than the parsed data through the broker
+                spool_ref = profile_spool.store(uploaded_file)
+                with profile_spool.open_spooled(spool_ref) as spooled_file:
+                    data, schema_errors = load_sw_json(spooled_file, keep_streamed=False)
             except ValueError as e:
                 errors.append('Unable to parse file: ' + str(e))
             except AttributeError:
                 errors.append('Issue opening uploaded file. Please try again.')
             else:
-                schema_errors, validation_errors = validate_sw_json(data, request.user.summoner)
+                validation_errors = []
+                if not schema_errors:
+                    schema_errors, validation_errors = validate_sw_json(data, request.user.summoner, streamed=True)
 
                 if schema_errors:
                     errors.append(schema_errors)
@@ -569,7 +573,7 @@ def import_sw_json(request, profile_name):
 
                 if not errors and (not validation_failures or import_options['ignore_validation_errors']):
                     # Queue the import
-                    task = com2us_data_import.delay(data, summoner.pk, import_options)
+                    task = com2us_data_import.delay(spool_ref, summoner.pk, import_options)
                     request.session['import_task_id'] = task.task_id
 
                     return render(
@@ -597,6 +601,15 @@ def import_sw_json(request, profile_name):
 @login_required
 def import_status(request, profile_name):
     task_id = request.GET.get('id', request.session.get('import_task_id'))
+
+    # Running imports publish their progress to the cache. Fall back to the result backend for queued tasks.
+    progress = import_progress.get(task_id) if task_id else None
+    if progress:
+        return JsonResponse({
+            'status': progress['status'],
+            'result': progress,
+        })
+
     task = AsyncResult(task_id)
 
     if task:
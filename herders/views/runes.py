@@ -8,6 +8,7 @@ from django.template import loader
 from django.template.context_processors import csrf
 from django.urls import reverse
 
+from herders.bulk_recompute import BulkRecompute
 from herders.decorators import username_case_redirect
 from herders.filters import RuneInstanceFilter
 from herders.forms import FilterRuneForm, \
@@ -528,8 +529,7 @@ def rune_resave_all(request, profile_name):
     is_owner = (request.user.is_authenticated and summoner.user == request.user)
 
     if is_owner:
-        for r in RuneInstance.objects.filter(owner=summoner, substats__isnull=True):
-            r.save()
+        BulkRecompute(RuneInstance.objects.filter(owner=summoner, substats__isnull=True)).run()
 
         response_data = {
             'code': 'success',
@@ -1,5 +1,6 @@
 import datetime
 import os
+import tempfile
 
 import environ
 
@@ -24,6 +25,9 @@ env = environ.Env(
     JOKER_CONTAINER_KEY=(str, '0' * 64),
     JOKER_CONTAINER_IV=(str, '0' * 32),
     BUGSNAG_API_KEY=(str, None),
+    LOG_INGESTION_ASYNC=(bool, False),
+    PROFILE_SPOOL_DIR=(str, os.path.join(tempfile.gettempdir(), 'swarfarm_profile_spool')),
+    PROFILE_SPOOL_MAX_AGE=(int, 24 * 60 * 60),
 )
 environ.Env.read_env(os.path.join(BASE_DIR, '.env'))
 
@@ -215,6 +219,15 @@ CELERY_RESULT_BACKEND = 'django-db'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_TRACK_STARTED = True
 
+# Data log
+# Queue uploaded logs and parse them in data_log.tasks.process_log_queue instead of during the request
+LOG_INGESTION_ASYNC = env('LOG_INGESTION_ASYNC')
+
+# Profile import
+# Uploaded profiles are spooled here for com2us_data_import. Must be shared by the web and Celery workers.
+PROFILE_SPOOL_DIR = env('PROFILE_SPOOL_DIR')
+PROFILE_SPOOL_MAX_AGE = env('PROFILE_SPOOL_MAX_AGE')
+
 # Session config
 SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 